@@ -0,0 +1,89 @@
+#Checkpoint journal for the dumper, so an interrupted dump resumes where it stopped.
+#Every finished bundle appends a record with the EBX GUID and RES table entries it produced, every finished superbundle appends one more.
+#On restart the journal is replayed into the tables, and finished bundles and superbundles are skipped without looking at the output.
+#Payload files are written under a temporary name and renamed into place, so a file that exists is always complete.
+import os
+import pickle
+import ebx
+import res
+import writer
+
+journalName="dumpJournal.bin"
+
+journal=None
+journalPath=""
+doneBundles=set() #(toc path, bundle id)
+doneSuperbundles=set() #toc path
+ebxEntries=list() #(path, fileGUID, name) added by the bundle in progress
+resEntries=list() #addToResTable arguments of the bundle in progress
+
+def start(ctx,dumpFolder):
+    #Replay the journal of an interrupted run into the tables of the context, then keep appending to it.
+    global journal, journalPath
+    journalPath=os.path.join(dumpFolder,journalName)
+    doneBundles.clear()
+    doneSuperbundles.clear()
+    validSize=0
+    if os.path.isfile(journalPath):
+        f=open(journalPath,"rb")
+        while 1:
+            try: record=pickle.load(f)
+            except Exception: break #end of file or a record cut short by the crash
+            replay(ctx,record)
+            validSize=f.tell()
+        f.close()
+        print("Resuming: %d superbundles and %d bundles were finished before" % (len(doneSuperbundles),len(doneBundles)))
+
+    os.makedirs(dumpFolder,exist_ok=True)
+    journal=open(journalPath,"ab")
+    journal.truncate(validSize)
+
+def replay(ctx,record):
+    if record[0]=="bundle":
+        kind, tocPath, bundleId, ebxList, resList = record
+        for path, fileGUID, name in ebxList:
+            ctx.guidTable[fileGUID]=name
+            ctx.parsedEbx.add(path)
+        for args in resList:
+            res.addToResTable(ctx,*args)
+        doneBundles.add((tocPath,bundleId))
+    else:
+        doneSuperbundles.add(record[1])
+
+def addEbxGuid(ctx,path,ebxRoot):
+    result=ebx.addEbxGuid(ctx,path,ebxRoot)
+    if result: ebxEntries.append((path,)+result)
+
+def addToResTable(ctx,*args):
+    res.addToResTable(ctx,*args)
+    resEntries.append(args)
+
+def isBundleDone(tocPath,bundleId):
+    return (tocPath,bundleId) in doneBundles
+
+def isSuperbundleDone(tocPath):
+    return tocPath in doneSuperbundles
+
+def endBundle(tocPath,bundleId):
+    #All payloads of the bundle are in place. Flushing is enough to survive the process being killed.
+    writer.flush()
+    pickle.dump(("bundle",tocPath,bundleId,ebxEntries,resEntries),journal,2)
+    journal.flush()
+    doneBundles.add((tocPath,bundleId))
+    del ebxEntries[:]
+    del resEntries[:]
+
+def endSuperbundle(tocPath):
+    #Once per superbundle the files and then the journal are synced to disk, so the superbundles the journal lists as finished
+    #survive a power loss. The bundle records in between are only flushed: they survive the process being killed, but after
+    #a power loss the finished bundles of the superbundle in progress may have files that never reached the disk.
+    writer.sync()
+    pickle.dump(("superbundle",tocPath),journal,2)
+    journal.flush()
+    os.fsync(journal.fileno())
+    doneSuperbundles.add(tocPath)
+
+def finish():
+    #The dump is complete and the tables are written, the journal isn't needed anymore.
+    journal.close()
+    os.remove(journalPath)
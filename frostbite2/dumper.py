@@ -5,13 +5,21 @@ import dbo
 import noncas
 import ebx
 import os
-from struct import pack,unpack
+from struct import pack,unpack,unpack_from
 import io
 import sys
 import zlib
-import subprocess
-import shutil
 import res
+import stats
+import profiler
+import spill
+import checkpoint
+import writer
+import pipeline
+import sbcache
+import mapped
+import iohints
+import context
 
 #Adjust paths here.
 #do yourself a favor and don't dump into the Users folder (or it might complain about permission)
@@ -19,6 +27,41 @@ import res
 gameDirectory   = r"D:\Games\OriginGames\Need for Speed The Run"
 targetDirectory = r"E:\GameRips\NFS\NFSTR\pc\dump"
 
+#Keep the cat, EBX GUID and RES tables in an on-disk store inside the target directory instead of in memory.
+#Memory use then stays flat no matter how big the game is, at the cost of some speed.
+spillTables = False
+
+#Where the extracted files go: "directory" for the usual folder tree, "pack" for a single dump.pack file with an index (dump.idx)
+#that ebxtotext and ebxtoasset read directly, or "null" to throw everything away and only measure how fast the dumper decodes.
+outputSink = "directory"
+
+#Store the extracted files recompressed with zstd at this level (1-19, 3 is a good start) instead of decompressed.
+#The dump gets several times smaller and ebxtotext/ebxtoasset read it as usual, 0 turns it off.
+compressLevel = 0
+
+#Create the files of each bundle grouped by output folder, which helps filesystems that lay out a folder's files together.
+#Noncas bundles are then no longer read front to back, so this is mostly worth it on slow target drives.
+sortByDirectory = False
+
+#Number of threads that read and decompress payloads while the main thread goes through the manifests and a writer thread writes the files.
+#Set it to 0 to do everything on the main thread, one payload after the other. At most one thread less than there are cores is used.
+workerThreads = 4
+
+#Tell the kernel how the cas and sb files are read (Linux and other unixes): read each payload ahead when it's queued and drop it
+#from the page cache once it's extracted. Otherwise a long dump fills the cache with archive data that's never read again
+#and pushes out everything else on the machine. Has no effect on Windows.
+pageCacheHints = True
+
+#X360 superbundles are compressed. They're decompressed with xbdecompress.exe once and kept in this folder for later tocs and runs,
+#whatever the target directory. It's next to the tools folder by default and must not be inside the dump, or the decompressed sbs
+#end up next to the extracted files. The entries used longest ago are removed when the folder grows beyond sbCacheSize bytes.
+sbCacheDirectory = r"..\sbcache"
+sbCacheSize = 16<<30
+
+#Command that decompresses an X360 sb, the compressed and the decompressed path are appended.
+#For test installs written by tools/geninstall.py --x360, use ["python",r"..\tools\xbstandin.py"].
+xbdecompressCommand = [r"..\thirdparty\xbdecompress.exe","/T","/Y"]
+
 #####################################
 #####################################
 
@@ -37,12 +80,21 @@ def lp(path): #long pathnames
 
 
 
-def dump(tocPath,outPath,baseTocPath=None,commonDatPath=None):
-    toc=dbo.readToc(tocPath)
+def addEbxGuid(ctx,path,ebxPath):
+    #Called through the pipeline once the ebx is written. The null sink keeps nothing to read back.
+    if writer.sinkName=="null": return
+    with stats.phase("ebxGuid"): checkpoint.addEbxGuid(ctx,path,ebxPath)
+
+def dump(ctx,tocPath,outPath,baseTocPath=None,commonDatPath=None):
+    if checkpoint.isSuperbundleDone(tocPath): return #finished by an earlier run
+
+    with stats.phase("tocDecrypt"): tocData=dbo.unXor(tocPath)
+    with stats.phase("tocParse"): toc=dbo.DbObject(tocData)
     if not (toc.get("bundles") or toc.get("chunks")): return #there's nothing to extract (the sb might not even exist)
 
     sbPath=tocPath[:-3]+"sb"
     sb=openSbFile(sbPath)
+    stats.beginSuperbundle(tocPath)
 
     chunkPathToc=os.path.join(outPath,"chunks")
     bundlePath=os.path.join(outPath,"bundles")
@@ -54,46 +106,50 @@ def dump(tocPath,outPath,baseTocPath=None,commonDatPath=None):
     if toc.get("cas"):
         #deal with cas bundles => ebx, dbx, res, chunks.
         for tocEntry in toc.get("bundles"): #id offset size, size is redundant
+            if checkpoint.isBundleDone(tocPath,tocEntry.get("id")): continue
+
             sb.seek(tocEntry.get("offset"))
-            bundle=dbo.DbObject(sb)
+            with stats.phase("manifest"): bundle=dbo.DbObject(sb)
 
-            for entry in bundle.get("ebx",list()): #name sha1 size originalSize
+            for entry in writer.inDirectoryOrder(bundle.get("ebx",list()),lambda entry: entry.get("name")): #name sha1 size originalSize
                 compressed=(entry.get("size")!=entry.get("originalSize"))
                 path=os.path.join(ebxPath,entry.get("name")+".ebx")
-                casBundlePayload(entry,path,compressed)
-                ebx.addEbxGuid(path,ebxPath)
+                casBundlePayload(ctx,entry,path,compressed)
+                pipeline.then(addEbxGuid,ctx,path,ebxPath)
 
             for entry in bundle.get("dbx",list()): #name sha1 size originalSize
                 if entry.get("idata"): #dbx appear only idata if at all, they are probably deprecated and were not meant to be shipped at all.
                     path=os.path.join(dbxPath,entry.get("name")+".dbx")
-                    out=open2(path,"wb")
-                    out.write(zlibIdata(entry.get("idata")))
-                    out.close()
+                    pipeline.submit(path,None,writeIdata,entry.get("idata"))
 
-            for entry in bundle.get("res",list()): #name sha1 size originalSize resType resMeta
-                res.addToResTable(entry.get("name"),entry.get("resType"),entry.get("resMeta"))
+            for entry in writer.inDirectoryOrder(bundle.get("res",list()),lambda entry: entry.get("name")): #name sha1 size originalSize resType resMeta
+                pipeline.then(checkpoint.addToResTable,ctx,entry.get("name"),entry.get("resType"),entry.get("resMeta"))
                 path=os.path.join(resPath,entry.get("name")+res.getResExt(entry.get("resType")))
-                casBundlePayload(entry,path,True)
+                casBundlePayload(ctx,entry,path,True)
 
             for entry in bundle.get("chunks",list()): #id sha1 size chunkMeta::h32 chunkMeta::meta
                 path=os.path.join(chunkPath,entry.get("id").format()+".chunk")
-                casBundlePayload(entry,path,entry.get("id").isChunkCompressed())
+                casBundlePayload(ctx,entry,path,entry.get("id").isChunkCompressed())
+
+            pipeline.then(checkpoint.endBundle,tocPath,tocEntry.get("id"))
 
         #deal with cas chunks defined in the toc.
         for entry in toc.get("chunks"): #id sha1
             path=os.path.join(chunkPathToc,entry.get("id").format()+".chunk")
-            casChunkPayload(entry,path)
+            casChunkPayload(ctx,entry,path)
 
     else:
         #deal with noncas bundles
         for tocEntry in toc.get("bundles"): #id offset size, size is redundant
             if tocEntry.get("base"): continue #Patched noncas bundle. However, use the unpatched bundle because no file was patched at all.
+            if checkpoint.isBundleDone(tocPath,tocEntry.get("id")): continue
 
             sb.seek(tocEntry.get("offset"))
 
             if tocEntry.get("delta"):
                 #Patched noncas bundle. Here goes the hilarious part. Take the patched data and glue parts from the unpatched data in between.
-                #When that is done (in memory of course) the result is a new valid bundle file that can be read like an unpatched one.
+                #The result is a new valid bundle file that can be read like an unpatched one. It's never put together in memory,
+                #the splice just records where each part comes from and the reads go straight to the sources.
 
                 deltaSize,deltaMagic,padding=unpack(">IIQ",sb.read(16))
 
@@ -105,41 +161,38 @@ def dump(tocPath,outPath,baseTocPath=None,commonDatPath=None):
                 for deltaEntry in range(deltaSize//16):
                     deltas.append(Delta(sb))
 
-                bundleStream=io.BytesIO() #here be the new bundle data
-                unpatchedSb=openSbFile(baseTocPath[:-3]+"sb")
-                commonDat=open(commonDatPath,"rb") if os.path.isfile(commonDatPath) else None
+                unpatchedSb=openSbFile(baseTocPath[:-3]+"sb") #the decompressed one for X360
+                unpatchedSb.close()
+                sb2=noncas.Splice("%s at 0x%08x" % (sb.name,tocEntry.get("offset")))
+                patchOffset=sb.tell() #the patched parts follow the delta list in order
 
                 for delta in deltas:
                     if delta.typ==1:
-                        unpatchedSb.seek(delta.offset)
-                        bundleStream.write(unpatchedSb.read(delta.size))
+                        sb2.add(unpatchedSb.name,delta.offset,delta.size)
                     elif delta.typ==0:
-                        bundleStream.write(sb.read(delta.size))
+                        sb2.add(sb.name,patchOffset,delta.size)
+                        patchOffset+=delta.size
                     elif delta.typ==-1:
-                        if not commonDat: raise Exception("Found delta type -1 without common.dat present.")
-                        commonDat.seek(delta.offset)
-                        bundleStream.write(commonDat.read(delta.size))
+                        if not os.path.isfile(commonDatPath): raise Exception("Found delta type -1 without common.dat present.")
+                        sb2.add(commonDatPath,delta.offset,delta.size)
                     else:
                         raise Exception("Unknown delta type %d in patched bundle at 0x%08x" % (delta.typ,tocEntry.get("offset")))
 
-                unpatchedSb.close()
-                if commonDat: commonDat.close()
-                bundleStream.seek(0)
-
-                bundle=noncas.Bundle(bundleStream)
-                sb2=bundleStream
+                bundleStream=sb2.open()
+                with stats.phase("manifest"): bundle=noncas.Bundle(bundleStream)
+                bundleStream.close()
             else:
-                bundle=noncas.Bundle(sb)
-                sb2=sb
+                with stats.phase("manifest"): bundle=noncas.Bundle(sb)
+                sb2=sb.name
 
-            for entry in bundle.ebxEntries:
+            for entry in writer.inDirectoryOrder(bundle.ebxEntries,lambda entry: entry.name):
                 compressed=(entry.size!=entry.originalSize)
                 path=os.path.join(ebxPath,entry.name+".ebx")
                 noncasBundlePayload(sb2,entry,path,compressed)
-                ebx.addEbxGuid(path,ebxPath)
+                pipeline.then(addEbxGuid,ctx,path,ebxPath)
 
-            for entry in bundle.resEntries:
-                res.addToResTable(entry.name,entry.resType,entry.resMeta)
+            for entry in writer.inDirectoryOrder(bundle.resEntries,lambda entry: entry.name):
+                pipeline.then(checkpoint.addToResTable,ctx,entry.name,entry.resType,entry.resMeta)
                 path=os.path.join(resPath,entry.name+res.getResExt(entry.resType))
                 noncasBundlePayload(sb2,entry,path,True)
 
@@ -147,65 +200,85 @@ def dump(tocPath,outPath,baseTocPath=None,commonDatPath=None):
                 path=os.path.join(chunkPath,entry.id.format()+".chunk")
                 noncasBundlePayload(sb2,entry,path,entry.id.isChunkCompressed())
 
+            if tocEntry.get("delta"): pipeline.then(sbcache.release,unpatchedSb.name) #the workers read from it until here
+            pipeline.then(checkpoint.endBundle,tocPath,tocEntry.get("id"))
+
         #deal with noncas chunks defined in the toc
         for entry in toc.get("chunks"): #id offset size
             path=os.path.join(chunkPathToc,entry.get("id").format()+".chunk")
-            noncasChunkPayload(sb,entry,path)
+            noncasChunkPayload(sb.name,entry,path)
 
     #Clean up.
     sb.close()
-    if os.path.isdir(tempDirectory):
-        shutil.rmtree(tempDirectory)
-
-
-
-def casBundlePayload(entry,outPath,compressed):
-    if os.path.isfile(lp(outPath)): return
-
-    out=open2(outPath,"wb")
-    catEntry=cat[entry.get("sha1")]
-    cas=open(catEntry.path,"rb")
-    cas.seek(catEntry.offset)
-    if compressed: out.write(zlibb(cas,catEntry.size))
-    else:          out.write(cas.read(catEntry.size))
-    cas.close()
-    out.close()
-
-def casChunkPayload(entry,outPath):
-    if os.path.isfile(lp(outPath)): return
-
-    catEntry=cat[entry.get("sha1")]
-    out=open2(outPath,"wb")
-    cas=open(catEntry.path,"rb")
-    cas.seek(catEntry.offset)
-    if entry.get("id").isChunkCompressed():
-        out.write(zlibb(cas,catEntry.size))
-    else:
-        out.write(cas.read(catEntry.size))
-    cas.close()
-    out.close()
-
-def noncasBundlePayload(sb,entry,outPath,compressed):
-    if os.path.isfile(lp(outPath)): return
-
-    sb.seek(entry.offset)
-    out=open2(outPath,"wb")
+    pipeline.then(iohints.dropFile,sb.name) #the manifests, and the payloads of noncas bundles once the workers are done with them
+    pipeline.then(stats.endSuperbundle,stats.currentSb)
+    pipeline.then(checkpoint.endSuperbundle,tocPath)
+    pipeline.then(sbcache.release,sb.name) #the workers may still be reading the decompressed sb
+
+
+
+def casBundlePayload(ctx,entry,outPath,compressed):
+    if alreadyDumped(outPath): return
+
+    catEntry=ctx.catDict[entry.get("sha1")]
+    writePayload(catEntry.path,catEntry.offset,catEntry.size,compressed,outPath,entry.get("originalSize"))
+
+def casChunkPayload(ctx,entry,outPath):
+    if alreadyDumped(outPath): return
+
+    catEntry=ctx.catDict[entry.get("sha1")]
+    writePayload(catEntry.path,catEntry.offset,catEntry.size,entry.get("id").isChunkCompressed(),outPath)
+
+def noncasBundlePayload(src,entry,outPath,compressed):
+    if alreadyDumped(outPath): return
+    writePayload(src,entry.offset,entry.size,compressed,outPath,getattr(entry,"originalSize",None)) #chunks don't know their size
+
+def noncasChunkPayload(src,entry,outPath):
+    if alreadyDumped(outPath): return
+    writePayload(src,entry.get("offset"),entry.get("size"),entry.get("id").isChunkCompressed(),outPath)
+
+def alreadyDumped(outPath):
+    if pipeline.isPending(outPath) or writer.exists(outPath):
+        stats.skipEntry()
+        return True
+    return False
+
+def writePayload(src,offset,size,compressed,outPath,originalSize=None):
+    #src is the path of the cas or sb file, or the splice of a patched bundle.
+    if type(src) is str: iohints.willNeed(src,offset,size)
+    pipeline.submit(outPath,originalSize if compressed else size,readPayload,src,offset,size,compressed)
+
+def readPayload(out,src,offset,size,compressed):
+    data=mapped.mapFile(src) if type(src) is str else None
+    if data is not None:
+        #Straight from the mapped cas or sb, see mapped.py.
+        if compressed:
+            zlibbMapped(data,offset,size,out,src)
+        else:
+            if offset+size>len(data): raise Exception("Payload cut short at the end of %s" % src)
+            t1=stats.clock()
+            out.write(memoryview(data)[offset:offset+size])
+            stats.addBlock("stored",size,size,0.0,0.0,stats.clock()-t1)
+        pipeline.afterWrite(iohints.dontNeed,src,offset,size,data)
+        stats.addEntry()
+        return
+
+    f=open(src,"rb") if type(src) is str else src.open()
+    f.seek(offset)
     if compressed:
-        out.write(zlibb(sb,entry.size))
+        zlibb(f,size,out)
     else:
-        out.write(sb.read(entry.size))
-    out.close()
-
-def noncasChunkPayload(sb,entry,outPath):
-    if os.path.isfile(lp(outPath)): return
-
-    sb.seek(entry.get("offset"))
-    out=open2(outPath,"wb")
-    if entry.get("id").isChunkCompressed():
-        out.write(zlibb(sb,entry.get("size")))
-    else:
-        out.write(sb.read(entry.get("size")))
-    out.close()
+        t0=stats.clock()
+        data=f.read(size)
+        t1=stats.clock()
+        out.write(data)
+        stats.addBlock("stored",size,size,t1-t0,0.0,stats.clock()-t1)
+    f.close()
+    if type(src) is str: iohints.dontNeed(src,offset,size)
+    stats.addEntry()
+
+def writeIdata(out,idata):
+    zlibb(io.BytesIO(idata),len(idata),out)
 
 #zlib:
 #Compressed files are split into blocks which are then zlibbed individually (prefixed with compressed and uncompressed size)
@@ -215,25 +288,94 @@ def noncasChunkPayload(sb,entry,outPath):
 #RES are always compressed.
 #For chunks, the last bit in GUID is set for compressed payload.
 
-def zlibb(f,size):
-    outStream=io.BytesIO()
+def zlibb(f,size,out):
+    #Decompress the blocks straight into out.
+    if size>=pipeline.parallelSize and pipeline.blockPool:
+        zlibbParallel(f,size,out)
+        return
     startOffset=f.tell()
     while f.tell()<startOffset+size-8:
+        t0=stats.clock()
         uncompressedSize,compressedSize=unpack(">II",f.read(8)) #big endian
         data=f.read(compressedSize)
-
-        #TODO: Some blocks in BF3 are apparently uncompressed? Not sure what's going on here.
-        try:
-            outStream.write(zlib.decompress(data))
-        except:
-            outStream.write(data)
-
-    data=outStream.getvalue()
-    outStream.close()
-    return data
-
-def zlibIdata(bytestring):
-    return zlibb(io.BytesIO(bytestring),len(bytestring))
+        t1=stats.clock()
+        block,codec=decodeBlock(data)
+        t2=stats.clock()
+        out.write(block)
+        stats.addBlock(codec,compressedSize,len(block),t1-t0,t2-t1,stats.clock()-t2)
+
+def decodeBlock(data):
+    #TODO: Some blocks in BF3 are apparently uncompressed? Not sure what's going on here.
+    try:
+        return zlib.decompress(data), "zlib"
+    except:
+        return data, "stored"
+
+def timedDecodeBlock(data):
+    t0=stats.clock()
+    block,codec=decodeBlock(data)
+    return block, codec, stats.clock()-t0
+
+def zlibbParallel(f,size,out):
+    #Large payloads: read the blocks a window at a time, cut the window at the block headers
+    #and decompress its blocks on the block pool. The results come back in order, so they're written one after the other.
+    remaining=size
+    data=b""
+    while 1:
+        t0=stats.clock()
+        window=f.read(min(pipeline.parallelWindow,remaining))
+        readTime=stats.clock()-t0
+        remaining-=len(window)
+        data=data+window if data else window
+
+        blocks=list()
+        pos=0
+        #Like above, anything shorter than a block header at the end of the payload is ignored.
+        while pos+8<=len(data) and remaining+len(data)-pos>8:
+            uncompressedSize,compressedSize=unpack_from(">II",data,pos)
+            if pos+8+compressedSize>len(data): break
+            blocks.append(data[pos+8:pos+8+compressedSize])
+            pos+=8+compressedSize
+        data=data[pos:]
+
+        for compressed, (block, codec, decompressTime) in zip(blocks,pipeline.mapBlocks(timedDecodeBlock,blocks)):
+            t2=stats.clock()
+            out.write(block)
+            stats.addBlock(codec,len(compressed),len(block),readTime*len(compressed)/len(window) if window else 0.0,decompressTime,stats.clock()-t2)
+
+        if not remaining:
+            if len(data)>8: raise Exception("Block cut short at the end of a payload in %s" % f.name)
+            return
+
+def zlibbMapped(data,offset,size,out,src):
+    #zlibb on a mapped file. The blocks are handed to zlib as views into the mapping, large payloads go to the block pool a window at a time.
+    view=memoryview(data)
+    parallel=size>=pipeline.parallelSize and pipeline.blockPool
+    end=offset+size
+    pos=offset
+    blocks=list()
+    windowSize=0
+    while pos<end-8:
+        uncompressedSize,compressedSize=unpack_from(">II",data,pos)
+        if pos+8+compressedSize>len(data): raise Exception("Block cut short at the end of %s" % src)
+        block=view[pos+8:pos+8+compressedSize]
+        pos+=8+compressedSize
+        if not parallel:
+            t1=stats.clock()
+            block,codec=decodeBlock(block)
+            t2=stats.clock()
+            out.write(block)
+            stats.addBlock(codec,compressedSize,len(block),0.0,t2-t1,stats.clock()-t2)
+            continue
+        blocks.append(block)
+        windowSize+=compressedSize
+        if windowSize>=pipeline.parallelWindow or pos>=end-8:
+            for compressed, (block, codec, decompressTime) in zip(blocks,pipeline.mapBlocks(timedDecodeBlock,blocks)):
+                t2=stats.clock()
+                out.write(block)
+                stats.addBlock(codec,len(compressed),len(block),0.0,decompressTime,stats.clock()-t2)
+            blocks=list()
+            windowSize=0
 
 
 
@@ -241,12 +383,9 @@ def openSbFile(sbPath):
     sb=open(sbPath,"rb")
     magic=sb.read(4)
     if magic==b"\x0F\xF5\x12\xED":
-        #X360 compressed file.
-        #Decompress it into a temporary file with the tool, we'll clean it up once we're done.
+        #X360 compressed file, get the decompressed version from the cache.
         sb.close()
-        decSbPath=os.path.join(tempDirectory,os.path.relpath(sbPath,gameDirectory))
-        subprocess.run([r"..\thirdparty\xbdecompress.exe","/T","/Y",sbPath,decSbPath])
-        return open(decSbPath,"rb")
+        return sbcache.openSb(sbPath)
 
     #Normal SB file.
     sb.seek(0)
@@ -254,7 +393,7 @@ def openSbFile(sbPath):
 
 
 
-#Take a dict and fill it using a cat file: sha1 vs (offset, size, cas path)
+#Fill the catDict of an ExtractionContext using a cat file: sha1 vs (offset, size, cas path)
 #Cat files are always little endian.
 class CatEntry:
     def __init__(self,f,casDirectory):
@@ -262,7 +401,7 @@ class CatEntry:
         self.offset, self.size, casNum = unpack("<III",f.read(12))
         self.path=os.path.join(casDirectory,"cas_%02d.cas" % casNum)
 
-def readCat(catDict, catPath):
+def readCat(ctx,catPath):
     cat=dbo.unXor(catPath)
     cat.seek(0,2) #get eof
     catSize=cat.tell()
@@ -270,9 +409,9 @@ def readCat(catDict, catPath):
     casDirectory=os.path.dirname(catPath)
     while cat.tell()!=catSize:
         catEntry=CatEntry(cat,casDirectory)
-        catDict[catEntry.sha1]=catEntry
+        ctx.catDict[catEntry.sha1]=catEntry
 
-def dumpRoot(dataDir,patchDir,outPath):
+def dumpRoot(ctx,dataDir,patchDir,outPath):
     os.makedirs(outPath,exist_ok=True)
     commonDatPath=os.path.join(patchDir,"common.dat")
 
@@ -281,21 +420,32 @@ def dumpRoot(dataDir,patchDir,outPath):
             if fname[-4:]==".toc":
                 fname=os.path.join(dir0,fname)
                 localPath=os.path.relpath(fname,dataDir)
-                print(localPath)
 
                 #Check if there's a patched version and extract it first.
                 patchedName=os.path.join(patchDir,localPath)
-                if os.path.isfile(patchedName):
-                    dump(patchedName,outPath,fname,commonDatPath)
+                with profiler.phase("dump"):
+                    if os.path.isfile(patchedName):
+                        dump(ctx,patchedName,outPath,fname,commonDatPath)
 
-                dump(fname,outPath)
+                    dump(ctx,fname,outPath)
 
 
+#Paths can also be passed on the command line: dumper.py [gameDirectory [targetDirectory [workerThreads]]]
+if len(sys.argv)>1: gameDirectory=sys.argv[1]
+if len(sys.argv)>2: targetDirectory=sys.argv[2]
+if len(sys.argv)>3: workerThreads=int(sys.argv[3])
+
 #make the paths absolute and normalize the slashes
 gameDirectory=os.path.normpath(gameDirectory)
 targetDirectory=os.path.normpath(targetDirectory) #it's an absolute path already
 
-tempDirectory=os.path.join(targetDirectory,"temp")
+profiler.start(os.path.join(targetDirectory,"profile"),"dumper")
+writer.sortByDirectory=sortByDirectory
+writer.compressLevel=compressLevel
+iohints.enabled=pageCacheHints
+
+if spillTables: spill.openStore(os.path.join(targetDirectory,"tables.db"))
+ctx=context.ExtractionContext(spillTables)
 
 dataDir=os.path.join(gameDirectory,"Data")
 updateDir=os.path.join(gameDirectory,"Update")
@@ -304,18 +454,23 @@ patchDir=os.path.join(updateDir,"Patch","Data")
 print("Loading RES names...")
 res.loadResNames()
 
+#Pick up where an interrupted run stopped.
+checkpoint.start(ctx,targetDirectory)
+writer.start(targetDirectory,outputSink)
+pipeline.start(workerThreads)
+sbcache.start(sbCacheDirectory,sbCacheSize,xbdecompressCommand)
+
 #read cat file
-cat=dict()
 catPath=os.path.join(dataDir,"cas.cat") #Seems to always be in the same place.
 if os.path.isfile(catPath):
     print("Reading cat entries...")
-    readCat(cat,catPath)
+    with stats.phase("cat"), profiler.phase("cats"): readCat(ctx,catPath)
 
     #Check if there's a patched version.
     patchedCat=os.path.join(patchDir,os.path.relpath(catPath,dataDir))
     if os.path.isfile(patchedCat):
         print("Reading patched cat entries...")
-        readCat(cat,patchedCat)
+        with stats.phase("cat"), profiler.phase("cats"): readCat(ctx,patchedCat)
 
 if os.path.isdir(updateDir):
     #First, extract all DLCs.
@@ -324,21 +479,28 @@ if os.path.isdir(updateDir):
             continue
 
         print("Extracting DLC %s..." % dir)
-        dumpRoot(os.path.join(updateDir,dir,"Data"),patchDir,targetDirectory)
+        dumpRoot(ctx,os.path.join(updateDir,dir,"Data"),patchDir,targetDirectory)
 
 #Now extract the base game.
 print("Extracting main game...")
-dumpRoot(dataDir,patchDir,targetDirectory)
+dumpRoot(ctx,dataDir,patchDir,targetDirectory)
 
-if not os.path.isdir(targetDirectory):
+pipeline.wait()
+if not stats.totalEntries and not stats.skippedEntries and not checkpoint.doneBundles:
     print("Nothing was extracted, did you set input path correctly?")
     sys.exit(1)
 
-print("Writing EBX GUID table...")
-ebx.writeGuidTable(targetDirectory)
+#The null sink keeps no files for the tables to point to.
+if writer.sinkName!="null":
+    print("Writing EBX GUID table...")
+    with stats.phase("tables"), profiler.phase("tables"): ebx.writeGuidTable(ctx,targetDirectory)
+
+    print ("Writing RES table...")
+    with stats.phase("tables"), profiler.phase("tables"): res.writeResTable(ctx,targetDirectory)
 
-print ("Writing RES table...")
-res.writeResTable(targetDirectory)
+print("Writing dump statistics...")
+stats.writeReport(targetDirectory)
+checkpoint.finish()
 
 #MOH:WF hack: extract driving levels assets.
 if os.path.isdir(os.path.join(gameDirectory,"game","Speed")):
@@ -348,13 +510,26 @@ if os.path.isdir(os.path.join(gameDirectory,"game","Speed")):
     dataDir=os.path.join(gameDirectory,"Speed")
     updateDir=os.path.join(gameDirectory,"Update")
     patchDir=os.path.join(updateDir,"Patch","Speed")
-    ebx.guidTable.clear()
-    res.resTable.clear()
-    res.unkResTypes.clear()
-    dumpRoot(dataDir,patchDir,targetDirectory)
-
-    print("Writing EBX GUID table...")
-    ebx.writeGuidTable(targetDirectory)
-
-    print ("Writing RES table...")
-    res.writeResTable(targetDirectory)
+    ctx.guidTable.clear()
+    ctx.resTable.clear()
+    ctx.unkResTypes.clear()
+    checkpoint.start(ctx,targetDirectory)
+    dumpRoot(ctx,dataDir,patchDir,targetDirectory)
+    pipeline.wait()
+
+    if writer.sinkName!="null":
+        print("Writing EBX GUID table...")
+        ebx.writeGuidTable(ctx,targetDirectory)
+
+        print ("Writing RES table...")
+        res.writeResTable(ctx,targetDirectory)
+
+    print("Writing dump statistics...")
+    stats.writeReport(targetDirectory)
+    checkpoint.finish()
+
+writer.finish()
+profiler.finish()
+spill.closeStore()
+mapped.closeFiles()
+iohints.closeFiles()
@@ -4,41 +4,39 @@
 import os
 import copy
 from struct import unpack,pack
-import shutil
 import pickle
 from dbo import Guid
-import res
+import spill
+import packfile
+import locator
 import dds
 
 def unpackLE(typ,data): return unpack("<"+typ,data)
 def unpackBE(typ,data): return unpack(">"+typ,data)
 
-guidTable=dict()
-parsedEbx=list()
-
-def addEbxGuid(path,ebxRoot):
-    if path in parsedEbx:
+def addEbxGuid(ctx,path,ebxRoot):
+    if path in ctx.parsedEbx:
         return
 
     #Add EBX GUID and name to the database.
-    dbx=Dbx(path,ebxRoot)
-    guidTable[dbx.fileGUID]=dbx.trueFilename
-    parsedEbx.append(path)
+    dbx=Dbx(None,path,ebxRoot)
+    ctx.guidTable[dbx.fileGUID]=dbx.trueFilename
+    ctx.parsedEbx.add(path)
+    return dbx.fileGUID, dbx.trueFilename
 
-def writeGuidTable(dumpFolder):
+def writeGuidTable(ctx,dumpFolder):
     f=open(os.path.join(dumpFolder,"guidTable.bin"),"wb")
-    pickle.dump(guidTable,f)
+    spill.dump(ctx.guidTable,f)
     f.close()
 
-def loadGuidTable(dumpFolder):
-    global guidTable
+def loadGuidTable(ctx,dumpFolder):
     path=os.path.join(dumpFolder,"guidTable.bin")
     if not os.path.isfile(path):
         print("WARNING: EBX GUID table is missing, it is required to properly parse links between different EBX files!")
         return
 
     f=open(path,"rb")
-    guidTable=pickle.load(f)
+    ctx.guidTable=pickle.load(f)
     f.close()
 
 def makeLongDirs(path):
@@ -148,7 +146,7 @@ class Field:
             extguid=dbx.externalGUIDs[self.value&0x7fffffff]
 
 ##            print guidTable[extguid[0]]
-            extDbx=Dbx(os.path.join(dbx.ebxRoot,guidTable[extguid[0]]+".ebx").lower(),dbx.ebxRoot)
+            extDbx=Dbx(dbx.ctx,os.path.join(dbx.ebxRoot,dbx.ctx.guidTable[extguid[0]]+".ebx").lower(),dbx.ebxRoot)
             for guid, instance in extDbx.instances:
                 if guid==extguid[1]:
                     return instance
@@ -196,8 +194,10 @@ class Stub:
 
 
 class Dbx:
-    def __init__(self,path,ebxRoot):
-        f=open2(path,"rb")
+    def __init__(self,ctx,path,ebxRoot):
+        #ctx is the DumpContext with the tables of the dump the ebx belongs to, None while the dumper reads the GUID.
+        self.ctx=ctx
+        f=packfile.openFile(path)
 
         #metadata
         magic=f.read(4)
@@ -427,7 +427,7 @@ class Dbx:
                 towrite=""
                 if field.value>>31:
                     extguid=self.externalGUIDs[field.value&0x7fffffff]
-                    try: towrite=guidTable[extguid[0]]+"/"+extguid[1].format()
+                    try: towrite=self.ctx.guidTable[extguid[0]]+"/"+extguid[1].format()
                     except: towrite=extguid[0].format()+"/"+extguid[1].format()
                 elif field.value==0:
                     towrite="*nullGuid*"
@@ -489,14 +489,14 @@ class Dbx:
 
     def findRes(self,name):
         name=name.lower()
-        if name not in res.resTable:
+        if name not in self.ctx.resTable:
             print("Res not found in RES table: "+name)
             return None
 
-        resInfo=res.resTable[name]
+        resInfo=self.ctx.resTable[name]
         ext=resInfo.getResExt()
-        path=os.path.join(self.resFolder,name+ext)
-        if not os.path.isfile(lp(path)):
+        path=locator.find(self.resFolder,name+ext)
+        if not path:
             print("Res does not exist: "+name)
             return None
 
@@ -509,18 +509,15 @@ class Dbx:
 
         target=os.path.join(self.outputFolder,self.trueFilename)+ext
         makeLongDirs(target)
-        shutil.copyfile(lp(resName),lp(target))
+        packfile.copyFile(resName,target)
 
     def findChunk(self,chnk):
         if chnk.isNull():
             return None
 
         ChunkId=chnk.format()
-        chnkPath=os.path.join(self.chunkFolder,ChunkId+".chunk")
-        if os.path.isfile(chnkPath):
-            return chnkPath
-        chnkPath=os.path.join(self.chunkFolder2,ChunkId+".chunk")
-        if os.path.isfile(chnkPath):
+        chnkPath=locator.findChunk(self.chunkFolder,self.chunkFolder2,ChunkId)
+        if chnkPath:
             return chnkPath
 
         print("Chunk does not exist: "+ChunkId)
@@ -535,7 +532,7 @@ class Dbx:
         if totalChunks>1: target+=" "+str(idx)
         target+=ext
         makeLongDirs(target)
-        shutil.copyfile(currentChunkName,lp(target))
+        packfile.copyFile(currentChunkName,target)
 
     def extractSPS(self,f,offset,target):
         f.seek(offset)
@@ -622,7 +619,7 @@ class Dbx:
                 if not currentChunkName:
                     continue
 
-                f=open(currentChunkName,"rb")
+                f=packfile.openFile(currentChunkName)
                 ChunkHandles[Variation.ChunkId]=f
                 #print("Chunk found: "+currentChunkName)
 
@@ -688,7 +685,7 @@ class Dbx:
                 self.nameHash=hdr[28]
                 self.texGroup=hdr[29].decode().split("\0",1)[0]
 
-        f=open2(resName,"rb")
+        f=packfile.openFile(resName)
         tex=Texture(self,f)
         f.close()
 
@@ -710,7 +707,7 @@ class Dbx:
         if not chnkPath:
             return
 
-        f=open(chnkPath,"rb")
+        f=packfile.openFile(chnkPath)
         texData=f.read()
         f.close()
 
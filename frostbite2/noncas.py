@@ -1,6 +1,7 @@
 #Non-cas bundles are handled here.
 #Unlike toc files these are always big endian.
 from struct import unpack,pack
+import bisect
 import dbo
 
 def readNullTerminatedString(f):
@@ -96,3 +97,67 @@ class Chunk:
         #However for noncas, rangeStart and rangeEnd work in absolutely crazy ways. Their individual values easily exceed the actual size of the file.
         #Adding the same number to both of them does NOT cause the game to crash when loading, so really only the difference matters.
         #Additionally the sha1 for these texture chunks does not match the payload. The non-texture chunks that come AFTER such a chunk have the correct sha1 again.
+
+
+
+#Patched bundles are glued together from pieces of the unpatched sb, the patch sb and common.dat.
+#Rather than copying the pieces into memory, a Splice lists where they are and SplicedFile reads them when they're needed.
+class Splice:
+    def __init__(self,name):
+        self.name=name #for error messages
+        self.starts=list() #offset of every segment in the patched bundle, for bisect
+        self.segments=list() #(source path, offset in the source, size)
+        self.size=0
+
+    def add(self,path,offset,size):
+        if not size: return
+        self.starts.append(self.size)
+        self.segments.append((path,offset,size))
+        self.size+=size
+
+    def open(self):
+        #Every reader gets its own file handles, so the pipeline workers can read the same bundle at once.
+        return SplicedFile(self)
+
+class SplicedFile:
+    #Read-only file object on a Splice.
+    def __init__(self,splice):
+        self.splice=splice
+        self.name=splice.name
+        self.pos=0
+        self.files=dict() #source path -> open file
+        self.segment=-1 #segment of the last read, most reads continue in it
+
+    def read(self,size=-1):
+        splice=self.splice
+        end=splice.size if size is None or size<0 else min(self.pos+size,splice.size)
+        chunks=list()
+        while self.pos<end:
+            i=self.segment
+            if i<0 or not splice.starts[i]<=self.pos<splice.starts[i]+splice.segments[i][2]:
+                i=self.segment=bisect.bisect_right(splice.starts,self.pos)-1
+            path, offset, segmentSize = splice.segments[i]
+            start=self.pos-splice.starts[i]
+            length=min(segmentSize-start,end-self.pos)
+            f=self.files.get(path)
+            if not f: f=self.files[path]=open(path,"rb")
+            f.seek(offset+start)
+            data=f.read(length)
+            if len(data)!=length: raise Exception("%s ends before a segment of the patched bundle %s." % (path,splice.name))
+            chunks.append(data)
+            self.pos+=length
+        if len(chunks)==1: return chunks[0]
+        return b"".join(chunks)
+
+    def seek(self,offset,whence=0):
+        if whence==1: offset+=self.pos
+        elif whence==2: offset+=self.splice.size
+        self.pos=max(offset,0)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        for f in self.files.values(): f.close()
+        self.files.clear()
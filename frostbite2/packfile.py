@@ -0,0 +1,224 @@
+#Pack output of the dumper: all extracted files go into a single append-only dump.pack instead of millions of loose files.
+#Every record carries its name and size, so an interrupted dump rebuilds the index by scanning the pack.
+#When the dump is finished, a sorted index dump.idx is written, which lets ebxtotext and ebxtoasset find files with a binary search.
+#
+#dump.pack: "FBPK" version(u32), then one record per file: "FBRC" nameLength(u32) size(u64) name data
+#dump.idx:  "FBPI" version(u32) count(u64) namesOffset(u64),
+#           then count entries of dataOffset(u64) size(u64) nameOffset(u32) nameLength(u32) sorted by lowercase name,
+#           then the names.
+#Names are utf-8 paths relative to the dump folder with forward slashes. Lookups ignore case like Windows does.
+import bisect
+import io
+import mmap
+import os
+import shutil
+import threading
+import zstdfile
+from struct import pack,unpack,unpack_from
+
+packName="dump.pack"
+indexName="dump.idx"
+version=1
+recordSize=16 #"<4sIQ"
+entrySize=24 #"<QQII"
+
+mounted=None #PackWriter or PackReader the functions at the bottom look in before they go to the disk
+
+def lp(path): #long pathnames
+    if path[:4]=='\\\\?\\' or path=="" or len(path)<=247: return path
+    return '\\\\?\\' + os.path.normpath(path)
+
+def nameOf(root,path):
+    #Name of a path in a pack stored in the root folder, or None if the path is outside of it.
+    if path[:len(root)]!=root and path[:len(root)].lower()!=root.lower(): return None
+    if len(path)==len(root): return ""
+    if path[len(root)] not in "\\/": return None
+    return path[len(root)+1:].replace("\\","/")
+
+class PackWriter:
+    def __init__(self,dumpFolder):
+        self.root=dumpFolder
+        self.path=os.path.join(dumpFolder,packName)
+        self.index=dict() #name -> (data offset, size)
+        self.lock=threading.Lock() #the writer thread appends while the main thread reads ebx back
+        self.dirty=False
+
+        if os.path.isfile(self.path):
+            self.recover()
+        else:
+            f=open(self.path,"wb")
+            f.write(b"FBPK"+pack("<I",version))
+            f.close()
+        self.f=open(self.path,"ab",buffering=1<<20)
+        self.reader=open(self.path,"rb")
+
+    def recover(self):
+        #Left over from an interrupted dump. Index the complete records and cut off the one that was being written.
+        f=open(self.path,"rb")
+        fileSize=os.fstat(f.fileno()).st_size
+        if f.read(8)!=b"FBPK"+pack("<I",version):
+            raise Exception("%s is not a pack of this version, remove it or choose another target directory." % self.path)
+        offset=8
+        while offset+recordSize<=fileSize:
+            f.seek(offset)
+            magic, nameLength, size = unpack("<4sIQ",f.read(recordSize))
+            dataOffset=offset+recordSize+nameLength
+            if magic!=b"FBRC" or dataOffset+size>fileSize: break
+            self.index[f.read(nameLength).decode("utf-8")]=(dataOffset,size)
+            offset=dataOffset+size
+        f.close()
+        os.truncate(self.path,offset)
+        print("Found %d files in the existing pack" % len(self.index))
+
+    def add(self,path,blocks,size):
+        #blocks is an iterable with the data of the file, size bytes in total.
+        name=nameOf(self.root,path)
+        encodedName=name.encode("utf-8")
+        with self.lock:
+            dataOffset=self.f.tell()+recordSize+len(encodedName)
+            self.f.write(b"FBRC"+pack("<IQ",len(encodedName),size)+encodedName)
+            self.f.writelines(blocks)
+            self.index[name]=(dataOffset,size)
+            self.dirty=True
+
+    def find(self,path):
+        name=nameOf(self.root,path)
+        return self.index.get(name)
+
+    def read(self,offset,size):
+        with self.lock:
+            if self.dirty:
+                self.f.flush()
+                self.dirty=False
+            self.reader.seek(offset)
+            return self.reader.read(size)
+
+    def flush(self):
+        with self.lock:
+            self.f.flush()
+            self.dirty=False
+
+    def sync(self):
+        with self.lock:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.dirty=False
+
+    def finish(self):
+        self.f.close()
+        self.reader.close()
+
+        #Write the sorted index next to the pack, under a temporary name so there's never a partial one.
+        names=sorted(self.index,key=str.lower)
+        entries=io.BytesIO()
+        blob=io.BytesIO()
+        for name in names:
+            encodedName=name.encode("utf-8")
+            offset, size = self.index[name]
+            entries.write(pack("<QQII",offset,size,blob.tell(),len(encodedName)))
+            blob.write(encodedName)
+
+        indexPath=os.path.join(self.root,indexName)
+        f=open(indexPath+".tmp","wb")
+        f.write(b"FBPI"+pack("<IQQ",version,len(names),24+len(names)*entrySize))
+        f.write(entries.getvalue())
+        f.write(blob.getvalue())
+        f.close()
+        os.replace(indexPath+".tmp",indexPath)
+
+class Keys:
+    #Lowercase names of a PackReader as a sequence, for bisect.
+    def __init__(self,reader):
+        self.reader=reader
+    def __len__(self):
+        return self.reader.count
+    def __getitem__(self,i):
+        return self.reader.name(i).lower()
+
+class PackReader:
+    def __init__(self,dumpFolder):
+        self.root=dumpFolder
+        f=open(os.path.join(dumpFolder,indexName),"rb")
+        self.map=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        f.close()
+        magic, ver, self.count, self.namesOffset = unpack_from("<4sIQQ",self.map,0)
+        if magic!=b"FBPI" or ver!=version: raise Exception("Unsupported pack index in "+dumpFolder)
+        self.keys=Keys(self)
+        self.pack=open(os.path.join(dumpFolder,packName),"rb")
+
+    def name(self,i):
+        offset, size, nameOffset, nameLength = unpack_from("<QQII",self.map,24+i*entrySize)
+        start=self.namesOffset+nameOffset
+        return self.map[start:start+nameLength].decode("utf-8")
+
+    def find(self,path):
+        name=nameOf(self.root,path)
+        if name is None: return None
+        key=name.lower()
+        i=bisect.bisect_left(self.keys,key)
+        if i==self.count or self.keys[i]!=key: return None
+        return unpack_from("<QQ",self.map,24+i*entrySize)
+
+    def read(self,offset,size):
+        self.pack.seek(offset)
+        return self.pack.read(size)
+
+    def names(self,prefix):
+        #All names that start with prefix, in index order.
+        key=prefix.lower()
+        i=bisect.bisect_left(self.keys,key)
+        while i<self.count:
+            name=self.name(i)
+            if not name.lower().startswith(key): break
+            yield name
+            i+=1
+
+
+
+def mount(dumpFolder):
+    #Look in the pack of a dump before going to the disk, if the dump was written to one.
+    #The pack may also belong to a folder above, e.g. the MOH:WF driving assets are dumped into a subfolder.
+    global mounted
+    folder=os.path.abspath(dumpFolder)
+    while not os.path.isfile(os.path.join(folder,indexName)):
+        parent=os.path.dirname(folder)
+        if parent==folder: return None
+        folder=parent
+    mounted=PackReader(folder)
+    return mounted
+
+def locate(path):
+    if not mounted: return None
+    return mounted.find(path)
+
+def openFile(path):
+    #Open a dumped file for reading, wherever it is. Compressed files are decompressed as they're read.
+    location=locate(path)
+    if location:
+        f=io.BytesIO(mounted.read(*location))
+        f.name=path
+    else:
+        f=open(lp(path),"rb")
+    return zstdfile.openFile(f)
+
+def isFile(path):
+    return locate(path) is not None or os.path.isfile(lp(path))
+
+def copyFile(path,target):
+    src=openFile(path)
+    f=open(lp(target),"wb")
+    shutil.copyfileobj(src,f,1<<20)
+    f.close()
+    src.close()
+
+def walk(folder):
+    #Paths of all dumped files below a folder.
+    if mounted and hasattr(mounted,"names"):
+        prefix=nameOf(mounted.root,os.path.abspath(folder))
+        if prefix is not None:
+            for name in mounted.names(prefix+"/" if prefix else ""):
+                yield os.path.join(mounted.root,name.replace("/",os.sep))
+            return
+    for dir0, dirs, ff in os.walk(folder):
+        for fname in ff:
+            yield os.path.join(dir0,fname)
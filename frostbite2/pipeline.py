@@ -0,0 +1,149 @@
+#Pipelined payload extraction. The main thread is the reader: it walks the tocs and bundle manifests and submits every payload.
+#A pool of worker threads reads and decompresses the payloads into memory (see writer.Buffer) and a single writer thread puts them on disk.
+#The stages are connected by bounded queues, so the main thread runs ahead into the next manifests only as far as the queues allow.
+#The codecs are ctypes or zlib calls that release the GIL, so reading, decompressing and writing really overlap.
+#Everything that touches the tables (EBX GUIDs, RES, checkpoint journal) is passed to then() and runs on the main thread in submission order.
+#Large payloads don't have to wait for a single thread to get through them either, their blocks are decompressed on a separate block pool.
+import collections
+import concurrent.futures
+import os
+import queue
+import threading
+import stats
+import writer
+import profiler
+
+queueSize=16 #payloads waiting for a worker, and decompressed payloads waiting for the writer
+parallelSize=8<<20 #payloads of at least this many stored bytes have their blocks decompressed on the block pool
+parallelWindow=4<<20 #stored bytes of a large payload that are read and handed to the block pool at once
+
+jobQueue=None
+writeQueue=None
+threads=list()
+blockPool=None
+pending=collections.deque() #jobs and callbacks in the order they were submitted
+pendingPaths=set() #targets of the jobs in flight
+local=threading.local() #afterWrite callbacks of the payload the thread is filling
+
+class Job:
+    __slots__=("path","size","fill","args","sb","out","error","done","after")
+    def __init__(self,path,size,fill,args):
+        self.path=path
+        self.size=size
+        self.fill=fill
+        self.args=args
+        self.sb=stats.currentSb
+        self.out=None
+        self.error=None
+        self.done=threading.Event()
+        self.after=list()
+
+def start(numWorkers):
+    #Without workers, submit() does everything right away like before.
+    global jobQueue, writeQueue, blockPool
+    #The main thread and the writer need a core as well. With a single core, the threads only get in each other's way.
+    numWorkers=min(numWorkers,(os.cpu_count() or 1)-1)
+    if numWorkers<1: return
+    #Threads of their own, so workers waiting on their blocks can't hold up the blocks of another worker.
+    blockPool=concurrent.futures.ThreadPoolExecutor(numWorkers,initializer=profiler.profileThread,initargs=("blocks",))
+    jobQueue=queue.Queue(queueSize)
+    writeQueue=queue.Queue(queueSize)
+    for i in range(numWorkers): startThread(work,"worker")
+    startThread(write,"writer")
+
+def startThread(target,role):
+    #Daemon threads, so an exception on the main thread doesn't leave the dumper hanging.
+    thread=threading.Thread(target=runThread,args=(target,role),daemon=True)
+    thread.start()
+    threads.append(thread)
+
+def runThread(target,role):
+    profiler.profileThread(role)
+    target()
+
+def work():
+    while 1:
+        job=jobQueue.get()
+        stats.local.sb=job.sb
+        local.after=job.after
+        try:
+            job.out=writer.openBuffer(job.path,job.size)
+            job.fill(job.out,*job.args)
+            writer.finishTarget(job.out)
+        except Exception as e:
+            job.error=e
+            job.done.set()
+            continue
+        writeQueue.put(job)
+
+def write():
+    while 1:
+        job=writeQueue.get()
+        try:
+            with stats.phase("write"): writer.closeTarget(job.out,job.path)
+        except Exception as e:
+            job.error=e
+        job.out=None
+        runAfter(job.after)
+        job.done.set()
+
+def submit(path,size,fill,*args):
+    #Write the file at path. fill(f,*args) writes the payload into f, size is the final size of the file if it's known.
+    if not jobQueue:
+        local.after=list()
+        with stats.phase("write"): f=writer.openTarget(path,size)
+        fill(f,*args)
+        with stats.phase("write"): writer.closeTarget(f,path)
+        runAfter(local.after)
+        local.after=None
+        return
+
+    job=Job(path,size,fill,args)
+    pending.append(job)
+    pendingPaths.add(path)
+    jobQueue.put(job) #blocks while the workers are busy
+    poll()
+
+def afterWrite(function,*args):
+    #Called by a fill function: call function once the payload is written. The buffer of the payload may still point
+    #into the mapped source (see writer.Buffer), so e.g. the page cache hints that drop the source have to wait until then.
+    after=getattr(local,"after",None)
+    if after is None: function(*args) #filled outside the pipeline
+    else: after.append((function,args))
+
+def runAfter(after):
+    for function, args in after: function(*args)
+    del after[:]
+
+def then(function,*args):
+    #Call function on the main thread once everything that was submitted before is on disk.
+    if not pending:
+        function(*args)
+        return
+    pending.append((function,args))
+
+def poll(block=False):
+    #Retire finished jobs and run the callbacks behind them, in order.
+    while pending:
+        item=pending[0]
+        if type(item) is Job:
+            if not item.done.is_set():
+                if not block: return
+                item.done.wait()
+            pending.popleft()
+            pendingPaths.discard(item.path)
+            if item.error: raise item.error
+        else:
+            pending.popleft()
+            item[0](*item[1])
+
+def wait():
+    #Block until all payloads are written and all callbacks have run.
+    poll(True)
+
+def isPending(path):
+    return path in pendingPaths
+
+def mapBlocks(function,blocks):
+    #function applied to every block on the block pool, the results are in the order of the blocks.
+    return blockPool.map(function,blocks)
@@ -0,0 +1,123 @@
+#Built-in profiling for the entry scripts, enabled by passing --profile on the command line.
+#Every phase runs under its own cProfile instance and is saved as <script>_<phase>.pstats (open with pstats, snakeviz, ...).
+#On top of that a sampling thread records the main thread's call stack every few milliseconds and saves
+#collapsed stacks as <script>_<phase>.folded which flamegraph.pl, inferno or speedscope read directly.
+#The threads of the pipeline (see pipeline.py) do the reading and decompressing, so they're profiled as well: each role
+#(worker, writer, blocks) is saved as <script>_<role>.pstats for the whole run, and their stacks are sampled into the .folded file
+#of the phase the main thread is in, under the name of the role. Threads that are waiting for work aren't sampled.
+import cProfile
+import pstats
+import os
+import sys
+import threading
+
+enabled="--profile" in sys.argv
+if enabled: sys.argv.remove("--profile") #so the scripts don't mistake it for an input file
+
+sampleInterval=0.005 #seconds between two stack samples
+
+profiles=dict() #phase name -> cProfile.Profile
+samples=dict() #phase name -> {collapsed stack: count}
+phaseStack=list()
+outputFolder=""
+scriptName=""
+sampler=None
+mainThreadId=threading.main_thread().ident
+threadProfiles=dict() #role -> cProfile.Profile of every pipeline thread with that role
+threadRoles=dict() #thread id -> role of the pipeline threads
+idleFiles=("threading.py","queue.py") #a thread whose innermost frame is in there is waiting
+
+class Phase:
+    #Use with the "with" statement. Nested phases pause the outer one so each function is only counted once.
+    def __init__(self,name):
+        self.name=name
+    def __enter__(self):
+        if not enabled: return
+        if phaseStack: profiles[phaseStack[-1]].disable()
+        if self.name not in profiles:
+            profiles[self.name]=cProfile.Profile()
+        phaseStack.append(self.name)
+        profiles[self.name].enable()
+    def __exit__(self,*args):
+        if not enabled: return
+        profiles[phaseStack.pop()].disable()
+        if phaseStack: profiles[phaseStack[-1]].enable()
+
+def phase(name):
+    return Phase(name)
+
+def start(folder,script):
+    #Remember where to put the results and start sampling.
+    global outputFolder, scriptName, sampler
+    if not enabled: return
+    outputFolder=folder
+    scriptName=script
+    if hasattr(sys,"_current_frames"):
+        sampler=Sampler()
+        sampler.start()
+
+def profileThread(role):
+    #Called first thing on a pipeline thread.
+    if not enabled: return
+    threadRoles[threading.get_ident()]=role
+    prof=cProfile.Profile()
+    try: prof.enable()
+    except ValueError: return #Python 3.12 and later allow a single active profiler, which sees every thread anyway
+    threadProfiles.setdefault(role,list()).append(prof)
+
+def frameName(frame):
+    code=frame.f_code
+    return "%s (%s:%d)" % (code.co_name,os.path.basename(code.co_filename),code.co_firstlineno)
+
+class Sampler(threading.Thread):
+    def __init__(self):
+        threading.Thread.__init__(self,daemon=True)
+        self.stopEvent=threading.Event()
+
+    def run(self):
+        while not self.stopEvent.wait(sampleInterval):
+            try: currentPhase=phaseStack[-1]
+            except IndexError: continue #no phase running
+            frames=sys._current_frames()
+            phaseSamples=samples.setdefault(currentPhase,dict())
+            self.sample(phaseSamples,frames.get(mainThreadId),None)
+            for threadId, role in list(threadRoles.items()):
+                self.sample(phaseSamples,frames.get(threadId),role)
+
+    def sample(self,phaseSamples,frame,role):
+        if not frame: return
+        if role and os.path.basename(frame.f_code.co_filename) in idleFiles: return
+        stack=list()
+        while frame:
+            stack.append(frameName(frame))
+            frame=frame.f_back
+        if role: stack.append(role)
+        stack.reverse()
+        key=";".join(stack)
+        phaseSamples[key]=phaseSamples.get(key,0)+1
+
+    def stop(self):
+        self.stopEvent.set()
+        self.join()
+
+def finish():
+    #Stop profiling and write .pstats and .folded files for every phase.
+    if not enabled: return
+    while phaseStack:
+        profiles[phaseStack.pop()].disable()
+    if sampler: sampler.stop()
+
+    os.makedirs(outputFolder,exist_ok=True)
+    for name, prof in profiles.items():
+        prof.dump_stats(os.path.join(outputFolder,"%s_%s.pstats" % (scriptName,name)))
+    for role, profs in threadProfiles.items():
+        #The threads are idle by now, waiting for work that won't come.
+        pstats.Stats(*profs).dump_stats(os.path.join(outputFolder,"%s_%s.pstats" % (scriptName,role)))
+
+    for name, phaseSamples in samples.items():
+        f=open(os.path.join(outputFolder,"%s_%s.folded" % (scriptName,name)),"w")
+        for stack, count in phaseSamples.items():
+            f.write("%s %d\n" % (stack,count))
+        f.close()
+
+    print("Profiling results written to %s" % outputFolder)
@@ -1,12 +1,11 @@
 #Res names and res lookup table are handled here.
-#Frostbite 2 looks up res files by name.
+#Frostbite 2 looks up res files by name. The RES table itself is part of the context (see context.py), the type names are shared.
 import os
 import pickle
 import re
+import spill
 
 resTypes=dict()
-resTable=dict()
-unkResTypes=list()
 
 def loadResNames():
     #Load known res type names from the list into types table.
@@ -45,32 +44,31 @@ class ResInfo:
     def getResExt(self):
         return getResExt(self.resType)
 
-def addToResTable(name,resType,resMeta):
-    if resType not in resTypes and resType not in unkResTypes:
-        unkResTypes.append(resType)
-    resTable[name]=ResInfo(resType,resMeta)
+def addToResTable(ctx,name,resType,resMeta):
+    if resType not in resTypes and resType not in ctx.unkResTypes:
+        ctx.unkResTypes.append(resType)
+    ctx.resTable[name]=ResInfo(resType,resMeta)
 
-def writeResTable(dumpFolder):
+def writeResTable(ctx,dumpFolder):
     f=open(os.path.join(dumpFolder,"resTable.bin"),"wb")
-    pickle.dump(resTable,f)
+    spill.dump(ctx.resTable,f)
     f.close()
 
     #Log any res types we don't know names for yet.
-    if len(unkResTypes)!=0:
+    if len(ctx.unkResTypes)!=0:
         f=open(os.path.join(dumpFolder,"unknownResTypes.txt"),"w")
-        for typ in unkResTypes:
+        for typ in ctx.unkResTypes:
             f.write("0x%08x\n" % typ)
         f.close()
 
-def loadResTable(dumpFolder):
-    global resTable
+def loadResTable(ctx,dumpFolder):
     path=os.path.join(dumpFolder,"resTable.bin")
     if not os.path.isfile(path):
         print("WARNING: RES table is missing, it is required to link to RES files!")
         return
 
     f=open(path,"rb")
-    resTable=pickle.load(f)
+    ctx.resTable=pickle.load(f)
     f.close()
 
     #Load res names, too.
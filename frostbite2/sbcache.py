@@ -0,0 +1,114 @@
+#Cache of decompressed X360 superbundles. xbdecompress.exe is slow and a patched toc needs its unpatched sb as well,
+#so every sb is only decompressed once and the result is kept for later tocs and later runs.
+#Entries are keyed by the size and modification time of the compressed sb plus a hash of its start and end.
+#The cache folder holds one <key>.sb per entry and index.json with the source path, size and last use of each entry.
+#Once the cache grows beyond maxSize, the entries that were used longest ago are removed, except for those still being read.
+import hashlib
+import json
+import os
+import subprocess
+import time
+import stats
+import mapped
+import iohints
+
+decompressCommand=None #xbdecompressCommand of the dumper, the compressed and the decompressed path are appended
+sampleSize=1<<16 #bytes at the start and at the end of the compressed sb that go into the key
+indexName="index.json"
+
+cacheDirectory=""
+maxSize=0
+loaded=False
+entries=dict() #key -> {"source": path, "size": bytes, "used": time}
+openKeys=dict() #decompressed path -> key, for the entries that are in use
+pins=dict() #key -> number of users
+
+def start(folder,size,command):
+    #The cache is only loaded once the first compressed sb comes along, PC games never create it.
+    global cacheDirectory, maxSize, loaded, decompressCommand
+    cacheDirectory=folder
+    maxSize=size
+    decompressCommand=command
+    loaded=False
+
+def load():
+    #Load the index and throw away whatever it doesn't know about, like a file the tool was writing when the dumper got killed.
+    global loaded
+    loaded=True
+    folder=cacheDirectory
+    os.makedirs(folder,exist_ok=True)
+    entries.clear()
+    indexPath=os.path.join(folder,indexName)
+    if os.path.isfile(indexPath):
+        f=open(indexPath,"r")
+        try: entries.update(json.load(f))
+        except ValueError: pass #broken index, start over
+        f.close()
+    for key in list(entries):
+        if not os.path.isfile(entryPath(key)): del entries[key]
+    for fname in os.listdir(folder):
+        #Only touch files the cache creates itself, the folder may be shared with other things.
+        key=fname.split(".")[0]
+        if len(key)==40 and fname in (key+".sb",key+".sb.tmp") and (fname.endswith(".tmp") or key not in entries):
+            os.remove(os.path.join(folder,fname))
+    writeIndex()
+
+def entryPath(key):
+    return os.path.join(cacheDirectory,key+".sb")
+
+def writeIndex():
+    indexPath=os.path.join(cacheDirectory,indexName)
+    f=open(indexPath+".tmp","w")
+    json.dump(entries,f,indent=1)
+    f.close()
+    os.replace(indexPath+".tmp",indexPath)
+
+def sourceKey(path):
+    st=os.stat(path)
+    h=hashlib.sha1(b"%d:%d:" % (st.st_size,st.st_mtime_ns))
+    f=open(path,"rb")
+    h.update(f.read(sampleSize))
+    f.seek(max(st.st_size-sampleSize,0))
+    h.update(f.read(sampleSize))
+    f.close()
+    return h.hexdigest()
+
+def openSb(sbPath):
+    #Return the decompressed version of a compressed sb, decompressing it if it's not in the cache. Call release with the name when done.
+    if not loaded: load()
+    key=sourceKey(sbPath)
+    path=entryPath(key)
+    if key not in entries:
+        with stats.phase("xbdecompress"):
+            subprocess.run(decompressCommand+[sbPath,path+".tmp"])
+        if not os.path.isfile(path+".tmp"): raise Exception("Could not decompress %s." % sbPath)
+        os.replace(path+".tmp",path)
+        entries[key]={"source": sbPath, "size": os.path.getsize(path)}
+    entries[key]["used"]=time.time()
+    pins[key]=pins.get(key,0)+1
+    openKeys[path]=key
+    evict()
+    writeIndex()
+    return open(path,"rb")
+
+def release(path):
+    #The entry at path isn't read anymore and may be evicted. Does nothing for paths outside of the cache.
+    key=openKeys.get(path)
+    if key is None: return
+    pins[key]-=1
+    if not pins[key]:
+        del pins[key]
+        del openKeys[path]
+        mapped.closeFile(path)
+        iohints.closeFile(path)
+        evict()
+        writeIndex()
+
+def evict():
+    totalSize=sum(entry["size"] for entry in entries.values())
+    for key in sorted(entries,key=lambda key: entries[key]["used"]):
+        if totalSize<=maxSize: break
+        if key in pins: continue
+        totalSize-=entries[key]["size"]
+        os.remove(entryPath(key))
+        del entries[key]
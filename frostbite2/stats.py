@@ -0,0 +1,157 @@
+#Throughput metrics for the dumper are collected here.
+#Everything is kept in plain counters so the overhead is low enough to leave it on all the time:
+#a block costs a few clock reads and attribute updates, a phase costs two clock reads.
+#The counters are shared by the pipeline threads, so updates take a lock.
+import json
+import os
+import threading
+import time
+
+clock=time.perf_counter
+
+progressInterval=2.0 #minimum number of seconds between two progress lines
+
+phases=dict() #phase name -> seconds
+codecs=dict() #codec name -> CodecStats
+superbundles=list()
+currentSb=None
+
+startTime=clock()
+lastProgress=0.0
+totalEntries=0
+totalBytesIn=0
+totalBytesOut=0
+skippedEntries=0
+
+lock=threading.Lock()
+local=threading.local() #pipeline workers set local.sb to the superbundle of the payload they're working on
+
+class CodecStats:
+    __slots__=("blocks","bytesIn","bytesOut","readTime","decompressTime","writeTime")
+    def __init__(self):
+        self.blocks=0
+        self.bytesIn=0
+        self.bytesOut=0
+        self.readTime=0.0
+        self.decompressTime=0.0
+        self.writeTime=0.0
+
+class SbStats:
+    def __init__(self,path):
+        self.path=path
+        self.bytesIn=0
+        self.bytesOut=0
+        self.entries=0
+        self.start=clock()
+        self.seconds=0.0
+
+class Phase:
+    #Use with the "with" statement to add the time spent inside the block to a phase.
+    __slots__=("name","start")
+    def __init__(self,name):
+        self.name=name
+    def __enter__(self):
+        self.start=clock()
+    def __exit__(self,*args):
+        addTime(self.name,clock()-self.start)
+
+def phase(name):
+    return Phase(name)
+
+def addTime(name,seconds):
+    with lock:
+        phases[name]=phases.get(name,0.0)+seconds
+
+def activeSb():
+    return getattr(local,"sb",currentSb)
+
+def addBlock(codec,bytesIn,bytesOut,readTime,decompressTime,writeTime):
+    global totalBytesIn, totalBytesOut
+    sb=activeSb()
+    with lock:
+        c=codecs.get(codec)
+        if c is None:
+            c=codecs[codec]=CodecStats()
+        c.blocks+=1
+        c.bytesIn+=bytesIn
+        c.bytesOut+=bytesOut
+        c.readTime+=readTime
+        c.decompressTime+=decompressTime
+        c.writeTime+=writeTime
+        totalBytesIn+=bytesIn
+        totalBytesOut+=bytesOut
+        if sb:
+            sb.bytesIn+=bytesIn
+            sb.bytesOut+=bytesOut
+
+def addEntry():
+    global totalEntries
+    sb=activeSb()
+    with lock:
+        totalEntries+=1
+        if sb: sb.entries+=1
+        if clock()-lastProgress>=progressInterval: progress()
+
+def skipEntry():
+    global skippedEntries
+    with lock:
+        skippedEntries+=1
+
+def beginSuperbundle(path):
+    global currentSb
+    currentSb=SbStats(path)
+    superbundles.append(currentSb)
+    if clock()-lastProgress>=progressInterval: progress()
+
+def endSuperbundle(sb=None):
+    #With the pipeline, the last payloads of a superbundle can finish after the next one has begun, so sb may be passed explicitly.
+    global currentSb
+    if sb is None: sb=currentSb
+    if not sb: return
+    sb.seconds=clock()-sb.start
+    if sb is currentSb: currentSb=None
+
+def mbps(numBytes,seconds):
+    return numBytes/1048576/seconds if seconds>0 else 0.0
+
+def progress():
+    #Print a single status line. Called often, so it's rate-limited by the caller.
+    global lastProgress
+    now=clock()
+    lastProgress=now
+    elapsed=now-startTime
+    line="[%7.1fs] %d superbundles, %d entries, %.1f MB in, %.1f MB out (%.1f MB/s)" % (elapsed,len(superbundles),totalEntries,
+        totalBytesIn/1048576,totalBytesOut/1048576,mbps(totalBytesOut,elapsed))
+    if currentSb: line+=" | "+currentSb.path
+    print(line)
+
+def report():
+    elapsed=clock()-startTime
+    result=dict()
+    result["elapsed"]=elapsed
+    result["entries"]=totalEntries
+    result["skippedEntries"]=skippedEntries
+    result["bytesIn"]=totalBytesIn
+    result["bytesOut"]=totalBytesOut
+    result["mbpsOut"]=mbps(totalBytesOut,elapsed)
+    result["phases"]=dict(phases)
+
+    #Block timings are only kept per codec, fold them into the phases too. Not the block writes though,
+    #the write phase (see pipeline.py) covers getting the files on disk already.
+    result["codecs"]=dict()
+    for name, c in codecs.items():
+        result["phases"]["payloadRead"]=result["phases"].get("payloadRead",0.0)+c.readTime
+        result["phases"]["decompress:"+name]=c.decompressTime
+        result["codecs"][name]={"blocks":c.blocks,"bytesIn":c.bytesIn,"bytesOut":c.bytesOut,
+                                "readTime":c.readTime,"decompressTime":c.decompressTime,"writeTime":c.writeTime,
+                                "mbpsDecompress":mbps(c.bytesOut,c.decompressTime)}
+
+    result["superbundles"]=[{"path":sb.path,"bytesIn":sb.bytesIn,"bytesOut":sb.bytesOut,"entries":sb.entries,
+                             "seconds":sb.seconds,"mbpsOut":mbps(sb.bytesOut,sb.seconds)} for sb in superbundles]
+    return result
+
+def writeReport(dumpFolder):
+    progress()
+    f=open(os.path.join(dumpFolder,"dumpStats.json"),"w")
+    json.dump(report(),f,indent=1)
+    f.close()
@@ -0,0 +1,164 @@
+#Capacity planning for a dump without extracting anything. Goes through layout.toc, the cats and all toc/sb manifests like the dumper
+#(see manifest.py), but only reads the block headers of the payloads (payload.readBlockHeader) and never decompresses them, so it's done in minutes.
+#The report (analysis.json) has the compressed and uncompressed bytes per superbundle, per asset kind and per codec,
+#how many entries share a SHA1 with an earlier one and the size the dump is going to have.
+#With the dumpStats.json of an earlier dump on the same machine, it also predicts how long the dump takes.
+import manifest
+import payload
+import os
+import json
+import sys
+
+#Adjust paths here.
+
+gameDirectory = r"D:\Games\OriginGames\Need for Speed(TM) Rivals"
+reportPath    = r"E:\GameRips\NFS\NFSR\pc\analysis.json"
+
+#dumpStats.json of an earlier dump, its throughput is used to predict the runtime. Leave it empty to skip the prediction.
+statsPath = ""
+
+#####################################
+#####################################
+
+class Totals:
+    def __init__(self):
+        self.entries=0
+        self.bytesIn=0
+        self.bytesOut=0
+
+    def add(self,bytesIn,bytesOut):
+        self.entries+=1
+        self.bytesIn+=bytesIn
+        self.bytesOut+=bytesOut
+
+    def report(self):
+        return {"entries":self.entries,"bytesIn":self.bytesIn,"bytesOut":self.bytesOut,
+                "ratio":self.bytesOut/self.bytesIn if self.bytesIn else 0.0}
+
+total=Totals()
+kinds=dict() #ebx, res, chunks, tocChunks -> Totals
+codecs=dict() #codec name -> Totals, entries counts blocks here
+superbundles=list() #(toc path, Totals)
+targetPaths=set() #files the dump would contain, the dumper skips later entries with the same output path
+sha1s=set()
+sha1Entries=0
+duplicateEntries=0
+duplicateBytes=0
+skippedEntries=0
+missingEntries=0 #not in any cat, e.g. from a language that isn't installed
+files=dict() #path -> open file
+
+def addCodec(name,bytesIn,bytesOut):
+    c=codecs.get(name)
+    if c is None: c=codecs[name]=Totals()
+    c.add(bytesIn,bytesOut)
+
+def scanPayload(path,offset,size,originalSize):
+    #Walk the block headers of a payload like decompressPayload does. Returns the compressed and uncompressed size.
+    f=files.get(path)
+    if f is None: f=files[path]=open(path,"rb")
+    f.seek(offset)
+    bytesOut=0
+    while f.tell()!=offset+size:
+        dictFlag, uncompressedSize, comType, typeFlag, compressedSize = payload.readBlockHeader(f)
+        comType=payload.blockCodec(uncompressedSize,comType,typeFlag,compressedSize,f.tell()-8,f)
+        f.seek(compressedSize,1)
+        addCodec(payload.codecNames[comType],compressedSize,uncompressedSize)
+        bytesOut+=uncompressedSize
+        if originalSize and bytesOut==originalSize: break
+    return f.tell()-offset, bytesOut
+
+def analyzeEntry(entry):
+    global sha1Entries, duplicateEntries, duplicateBytes, skippedEntries, missingEntries
+    if not superbundles or superbundles[-1][0]!=entry.sb: superbundles.append((entry.sb,Totals()))
+    if entry.missing:
+        missingEntries+=1
+        return
+    if entry.sha1 is not None:
+        sha1Entries+=1
+        if entry.sha1 in sha1s:
+            duplicateEntries+=1
+            duplicateBytes+=entry.size
+        else:
+            sha1s.add(entry.sha1)
+    if entry.path in targetPaths:
+        skippedEntries+=1
+        return
+    targetPaths.add(entry.path)
+
+    if entry.patched:
+        #Patched payloads are put together from base and delta blocks, only the delta is counted as input.
+        addCodec("patched",entry.size,entry.originalSize)
+        bytesIn, bytesOut = entry.size, entry.originalSize
+    else:
+        bytesIn, bytesOut = scanPayload(entry.source,entry.offset,entry.size,entry.originalSize)
+    if entry.kind not in kinds: kinds[entry.kind]=Totals()
+    for t in (total,superbundles[-1][1],kinds[entry.kind]): t.add(bytesIn,bytesOut)
+
+def predictRuntime(report):
+    #Scale the throughput of the earlier dump to this one. Decompression time is per codec, as the codec mix decides most of it.
+    f=open(statsPath,"r")
+    dumpStats=json.load(f)
+    f.close()
+    prediction={"basedOn":statsPath}
+    if dumpStats.get("mbpsOut"):
+        prediction["seconds"]=report["predictedDumpSize"]/1048576/dumpStats["mbpsOut"]
+    prediction["decompressSeconds"]=dict()
+    for name, c in report["codecs"].items():
+        measured=dumpStats.get("codecs",dict()).get(name)
+        if measured and measured.get("mbpsDecompress"):
+            prediction["decompressSeconds"][name]=c["bytesOut"]/1048576/measured["mbpsDecompress"]
+    return prediction
+
+def writeReport():
+    report=total.report()
+    report["game"]=gameDirectory
+    report["predictedDumpSize"]=total.bytesOut
+    report["skippedEntries"]=skippedEntries
+    report["missingEntries"]=missingEntries
+    report["duplicateSha1Entries"]=duplicateEntries
+    report["duplicateSha1Ratio"]=duplicateEntries/sha1Entries if sha1Entries else 0.0
+    report["duplicateSha1Bytes"]=duplicateBytes
+    report["kinds"]={name: t.report() for name, t in kinds.items()}
+    report["codecs"]=dict()
+    for name, c in codecs.items():
+        report["codecs"][name]=c.report()
+        report["codecs"][name]["blocks"]=report["codecs"][name].pop("entries")
+    report["superbundles"]=[dict(path=os.path.relpath(path,gameDirectory),**t.report()) for path, t in superbundles]
+    if statsPath: report["predictedRuntime"]=predictRuntime(report)
+
+    folder=os.path.dirname(reportPath)
+    if folder: os.makedirs(folder,exist_ok=True)
+    f=open(reportPath,"w")
+    json.dump(report,f,indent=1)
+    f.close()
+    return report
+
+def printReport(report):
+    mb=lambda numBytes: numBytes/1048576
+    print("%d superbundles, %d entries, %.1f MB stored, %.1f MB after extraction" % (len(superbundles),total.entries,mb(total.bytesIn),mb(total.bytesOut)))
+    print("%d entries share their SHA1 with an earlier one (%.1f%%, %.1f MB stored), %d are skipped for having the same output path, %d are missing" % (
+        duplicateEntries,report["duplicateSha1Ratio"]*100,mb(duplicateBytes),skippedEntries,missingEntries))
+    for title, table in (("Kind",report["kinds"]),("Codec",report["codecs"])):
+        print("%-10s %12s %12s %12s %7s" % (title,"count","MB stored","MB out","ratio"))
+        for name, t in sorted(table.items(),key=lambda item: -item[1]["bytesOut"]):
+            print("%-10s %12d %12.1f %12.1f %7.2f" % (name,t.get("entries",t.get("blocks")),mb(t["bytesIn"]),mb(t["bytesOut"]),t["ratio"]))
+    prediction=report.get("predictedRuntime")
+    if prediction and "seconds" in prediction:
+        print("Predicted dump time: %.1f s (%.1f s of that decompressing)" % (prediction["seconds"],sum(prediction["decompressSeconds"].values())))
+
+#Paths can also be passed on the command line: analyzer.py [gameDirectory [reportPath [statsPath]]]
+if len(sys.argv)>1: gameDirectory=sys.argv[1]
+if len(sys.argv)>2: reportPath=sys.argv[2]
+if len(sys.argv)>3: statsPath=sys.argv[3]
+
+gameDirectory=os.path.normpath(gameDirectory)
+
+for entry in manifest.entries(gameDirectory): analyzeEntry(entry)
+
+for f in files.values(): f.close()
+if not superbundles:
+    print("No superbundles found, did you set input path correctly?")
+    sys.exit(1)
+
+printReport(writeReport())
@@ -1,11 +1,9 @@
-#Take a dict and fill it using a cat file: sha1 vs (offset, size, cas path)
+#Fill the catDict of an ExtractionContext using a cat file: sha1 vs (offset, size, cas path)
 #Cat files are always little endian.
 import dbo
 import os
 from struct import pack,unpack
 
-catDict=dict()
-
 class CatEntry:
     def __init__(self,f,casDirectory,version):
         if version<3:
@@ -15,7 +13,7 @@ class CatEntry:
 
         self.path=os.path.join(casDirectory,"cas_%02d.cas" % casNum)
 
-def readCat1(catPath):
+def readCat1(ctx,catPath):
     #2013, original version.
     cat=dbo.unXor(catPath)
     cat.seek(0,2) #get eof
@@ -25,9 +23,9 @@ def readCat1(catPath):
 
     while cat.tell()!=catSize:
         sha1=cat.read(20)
-        catDict[sha1]=CatEntry(cat,casDirectory,1)
+        ctx.catDict[sha1]=CatEntry(cat,casDirectory,1)
 
-def readCat2(catPath):
+def readCat2(ctx,catPath):
     #2015 (SWBF Beta), added the number of entries in the header and a new section with unknown data (usually empty).
     cat=dbo.unXor(catPath)
     cat.seek(16) #skip nyan
@@ -36,9 +34,9 @@ def readCat2(catPath):
 
     for i in range(numEntries):
         sha1=cat.read(20)
-        catDict[sha1]=CatEntry(cat,casDirectory,2)
+        ctx.catDict[sha1]=CatEntry(cat,casDirectory,2)
 
-def readCat3(catPath):
+def readCat3(ctx,catPath):
     #2015 (SWBF Final), added a a new var (always 0?) to cat entry.
     cat=dbo.unXor(catPath)
     cat.seek(16) #skip nyan
@@ -47,9 +45,9 @@ def readCat3(catPath):
 
     for i in range(numEntries):
         sha1=cat.read(20)
-        catDict[sha1]=CatEntry(cat,casDirectory,3)
+        ctx.catDict[sha1]=CatEntry(cat,casDirectory,3)
 
-def readCat4(catPath):
+def readCat4(ctx,catPath):
     #2017, added more unknown sections.
     cat=dbo.unXor(catPath)
     cat.seek(16) #skip nyan
@@ -58,4 +56,4 @@ def readCat4(catPath):
 
     for i in range(numEntries):
         sha1=cat.read(20)
-        catDict[sha1]=CatEntry(cat,casDirectory,4)
+        ctx.catDict[sha1]=CatEntry(cat,casDirectory,4)
@@ -0,0 +1,90 @@
+#Dump what a few ebx need and nothing else: the selected ebx (all ebx below some folders) and every res and chunk they reference,
+#directly or through the ebx they link to, are extracted. The rest of the res and chunks stay in the deferred queue (see deferred.py),
+#extractchunks.py can still extract them later.
+#All ebx are extracted all the same, the EBX GUID table needs every one of them and a link may lead anywhere in the game.
+#The references are read from the fields of the parsed ebx, with the complete tables:
+#  - GUID fields named ChunkId or ChunkGuid are chunks, ResourceRef fields are res (looked up in the RES table).
+#  - The external GUIDs are links to other ebx (looked up in the EBX GUID table), whose references are followed in turn.
+#  - A NewWaveAsset lists its chunks in its NewWaveResource, so those are only known once the res is extracted.
+import os
+import collections
+import ebx
+import convert
+import deferred
+import pipeline
+import stats
+import writer
+
+def start(dumpFolder,settings):
+    #Queue the res and chunks while the ebx are extracted. settings are the dumper settings they're written with.
+    deferred.deferRes=True
+    deferred.start(dumpFolder,settings)
+
+def inFolders(path,ebxRoot,folders):
+    return any(os.path.normcase(path).startswith(os.path.normcase(os.path.join(ebxRoot,folder,""))) for folder in folders)
+
+def extract(ctx,dumpFolder,folders):
+    #Submit the res and chunks the ebx below folders (relative to the ebx folder) reference.
+    #Returns the number of selected ebx, of ebx they link to, of res and chunks submitted and of the others that still aren't extracted.
+    header, records, outside = deferred.readQueue(dumpFolder) #the paths of the records are in dumpFolder
+    payloads=dict() #lowercase path -> record
+    for record in records: payloads.setdefault(record[0].lower(),record)
+
+    bundlePath=os.path.join(dumpFolder,"bundles")
+    ebxFolder=os.path.join(bundlePath,"ebx")
+    resFolder=os.path.join(bundlePath,"res")
+    chunkFolders=(os.path.join(dumpFolder,"chunks"),os.path.join(bundlePath,"chunks"))
+    ebxPaths=dict() #lowercase path -> path of every ebx in the dump, the GUID table may spell a name differently
+    for path in ctx.parsedEbx: ebxPaths[path.lower()]=path
+
+    wanted=list() #paths of the res and chunks in the order they're found
+    wantedKeys=set() #the same in lowercase, to look them up
+    def want(path):
+        record=payloads.get(path.lower())
+        if not record: return None #not in this dump
+        if record[0].lower() not in wantedKeys:
+            wantedKeys.add(record[0].lower())
+            wanted.append(record[0])
+        return record[0]
+    def wantChunk(chunkId):
+        #Toc chunks first like locator.findChunk.
+        for chunkFolder in chunkFolders:
+            if want(os.path.join(chunkFolder,chunkId+".chunk")): return
+
+    start=stats.clock()
+    selected=sorted(path for path in ebxPaths.values() if inFolders(path,ebxFolder,folders))
+    todo=collections.deque(selected)
+    seen=set(path.lower() for path in selected)
+    resPaths=list() #NewWaveResources
+    while todo:
+        path=todo.popleft()
+        with stats.phase("closure"): dbx=ebx.Dbx(ctx,path,ebxFolder)
+        for fileGuid, instanceGuid in dbx.externalGUIDs:
+            name=ctx.guidTable.get(fileGuid)
+            linked=ebxPaths.get(os.path.join(ebxFolder,name+".ebx").lower()) if name else None
+            if linked and linked.lower() not in seen:
+                seen.add(linked.lower())
+                todo.append(linked)
+        for rid in dbx.resourceReferences():
+            info=ctx.resTable.get(rid)
+            if info: want(os.path.join(resFolder,info.getResFilename()))
+        for chunkId in dbx.chunkReferences(): wantChunk(chunkId)
+        if dbx.prim.desc.name in ("NewWaveAsset","LocalizedWaveAsset"):
+            resName=dbx.newWaveResource()
+            resPath=want(os.path.join(resFolder,resName)) if resName else None
+            if resPath: resPaths.append(resPath)
+
+    submitted=0
+    for path in wanted:
+        if deferred.submit(payloads[path.lower()]): submitted+=1
+    pipeline.wait()
+
+    #The chunks of the NewWaveResources, now that they're extracted.
+    numFirst=len(wanted)
+    for resPath in resPaths:
+        for chunkId in convert.newWaveChunks(resPath): wantChunk(chunkId)
+    for path in wanted[numFirst:]:
+        if deferred.submit(payloads[path.lower()]): submitted+=1
+    pipeline.then(stats.endPhase,"selectEbx",start)
+    left=outside+sum(1 for key, record in payloads.items() if key not in wantedKeys and not writer.exists(record[0]))
+    return len(selected), len(seen)-len(selected), submitted, left
@@ -0,0 +1,31 @@
+#The tables of one game and of one dump. Every function that fills or reads them gets the context to use,
+#so the tables of several games or dumps can be kept apart in one process (the daemon and manifest.py do that)
+#and handed to other threads or processes as a whole.
+#A context is not a whole dump though. The output sink, the pipeline, the journal, the stats, the shard, the deferred queue,
+#the conversion, the mounted pack, the zstd dictionary and the res type names are module state, so a process runs one dump at a time.
+import spill
+
+class ExtractionContext:
+    #What the dumper collects while going through one install.
+    def __init__(self,spillTables=False):
+        #With spillTables, the tables are kept in the store opened with spill.openStore instead of in memory.
+        if spillTables:
+            self.catDict=spill.SpillDict("catDict")
+            self.guidTable=spill.SpillDict("guidTable")
+            self.parsedEbx=spill.SpillSet("parsedEbx")
+            self.resTable=spill.SpillDict("resTable")
+        else:
+            self.catDict=dict() #sha1 -> CatEntry, or DalEntry for NFS: Edge
+            self.guidTable=dict() #file GUID -> ebx name
+            self.parsedEbx=set() #ebx paths whose GUID is in guidTable
+            self.resTable=dict() #resRid -> ResInfo
+        self.unkResTypes=list() #res types that have no name in resnames.txt
+        self.newWaves=None #GUID -> ResInfo of every NewWaveResource, for the asset conversion of the dumper (see convert.py)
+
+class DumpContext:
+    #What the ebx tools read from one dump: the GUID and RES tables the dumper wrote next to it.
+    def __init__(self):
+        self.guidTable=dict() #file GUID -> ebx name
+        self.resTable=dict() #resRid -> ResInfo
+        self.newWaves=None #GUID -> ResInfo of every NewWaveResource, filled in by res.cacheNewWaveResources
+        self.dbxCache=None #anything with get(key) and put(key,value,size) to keep linked ebx in once they're parsed, see daemon.py
@@ -0,0 +1,136 @@
+#Dump and convert in one go: the dumper hands what it extracts straight to the asset extraction of ebx.py (the one ebxtoasset uses)
+#and only the converted sounds and movies are written, next to the EBX GUID and RES tables. There's no dump for ebxtoasset to read back in.
+#It takes two passes, since an asset may reference chunks of bundles and tocs the dumper only gets to later:
+#  1. The ebx are extracted into memory (see writer.MemorySink), added to the GUID table and dropped again. The res and chunks aren't
+#     extracted at all, they're queued like the chunks of a metadata-first dump (see deferred.py). So are the ebx of the assets.
+#  2. The asset ebx are extracted again and parsed with the complete tables. Each asset gets the res and chunks it references extracted
+#     into memory and is converted as soon as they're all there. Whatever no later asset needs is dropped right away.
+#The queue and the journal make the first pass resumable. An interrupted second pass starts over and overwrites the assets it converted before.
+import os
+import collections
+import ebx
+import sbr
+import locator
+import deferred
+import payload
+import pipeline
+import stats
+import writer
+
+enabled=False
+folder="" #only the ebx below this folder (relative to the ebx folder) are converted
+ebxRecords=dict() #ebx path -> (size, fill, args) while the ebx is being extracted
+
+def start(dumpFolder,inputFolder=""):
+    #The first pass begins. The files go to the memory sink, which the dumper selects.
+    global enabled, folder
+    folder=inputFolder
+    deferred.deferRes=True
+    deferred.start(dumpFolder,{"outputSink":"memory","compressLevel":0})
+    enabled=True
+
+def finish():
+    #The first pass is done.
+    global enabled
+    deferred.finish()
+    ebxRecords.clear()
+    enabled=False
+
+def remember(path,size,fill,args):
+    #An ebx of the first pass was submitted. Its record is queued once the ebx turns out to be an asset.
+    ebxRecords[path]=(size,fill,args)
+
+def inFolder(path,ebxRoot):
+    if not folder: return True
+    return os.path.normcase(path).startswith(os.path.normcase(os.path.join(ebxRoot,folder,"")))
+
+def addEbx(path,ebxRoot):
+    #The ebx is in memory and in the GUID table by now. Queue it for the second pass if it's an asset, then drop it.
+    record=ebxRecords.pop(path,None)
+    if record and inFolder(path,ebxRoot) and path not in deferred.queued:
+        with stats.phase("ebxGuid"): dbx=ebx.Dbx(None,path,ebxRoot,True)
+        if dbx.prim.desc.name in ebx.assetTypes: deferred.add(path,*record)
+    writer.sink.release(path)
+
+
+
+def fetch(record):
+    #Extract a queued payload into memory unless it's there or on its way.
+    path, size, fillName, args = record
+    if pipeline.isPending(path) or writer.sink.find(path): return
+    payload.submit(path,size,getattr(payload,fillName),*args)
+
+def parseAsset(ctx,path,ebxRoot,dbxs):
+    dbx=ebx.Dbx(ctx,path,ebxRoot,True) #the primary instance is all extractAssets looks at
+    writer.sink.release(path)
+    dbxs.append(dbx)
+
+def newWaveChunks(resPath):
+    #Ids of the chunks with the variations of a NewWaveResource.
+    chunks=sbr.Bank(resPath).get("Chunks")
+    return [chunks.get("ChunkId").getGuid(i).format() for i in range(chunks.numElems)]
+
+def convertAsset(dbx,paths,users,folders,outputFolder):
+    #All payloads of the asset are in memory. Drop the ones no later asset needs once it's converted.
+    locator.reset() #the files in memory changed since the last lookup
+    chunkFolder, chunkFolder2, resFolder = folders
+    dbx.extractAssets(chunkFolder,chunkFolder2,resFolder,outputFolder)
+    for path in paths:
+        users[path]-=1
+        if not users[path]: writer.sink.release(path)
+
+def convertAssets(ctx,dumpFolder,outputFolder):
+    #The second pass. Returns the number of assets.
+    header, records, outside = deferred.readQueue(dumpFolder) #the paths of the records are in dumpFolder
+    payloads=dict() #lowercase path -> record of the res and chunks
+    assets=list()
+    for record in records:
+        key=record[0].lower()
+        if key.endswith(".ebx"): assets.append(record)
+        else: payloads.setdefault(key,record)
+
+    bundlePath=os.path.join(dumpFolder,"bundles")
+    ebxFolder=os.path.join(bundlePath,"ebx")
+    resFolder=os.path.join(bundlePath,"res")
+    folders=(os.path.join(dumpFolder,"chunks"),os.path.join(bundlePath,"chunks"),resFolder)
+    start=stats.clock()
+
+    #The asset ebx.
+    dbxs=list()
+    for record in assets:
+        fetch(record)
+        pipeline.then(parseAsset,ctx,record[0],ebxFolder,dbxs)
+    pipeline.wait()
+
+    #The NewWaveResources, they list the chunks of their assets.
+    resPaths=list()
+    for dbx in dbxs:
+        resName=dbx.newWaveResource() if dbx.prim.desc.name in ("NewWaveAsset","LocalizedWaveAsset") else None
+        record=payloads.get(os.path.join(resFolder,resName).lower()) if resName else None
+        if record: fetch(record)
+        resPaths.append(record[0] if record else None)
+    pipeline.wait()
+
+    #The chunks of every asset, toc chunks first like locator.findChunk.
+    plans=list()
+    users=collections.Counter()
+    for dbx, resPath in zip(dbxs,resPaths):
+        chunkIds=dbx.chunkReferences()
+        if resPath: chunkIds+=newWaveChunks(resPath)
+        paths=dict() #path -> None, a dict keeps the order
+        if resPath: paths[resPath]=None
+        for chunkId in chunkIds:
+            for chunkFolder in folders[:2]:
+                record=payloads.get(os.path.join(chunkFolder,chunkId+".chunk").lower())
+                if record:
+                    paths[record[0]]=None
+                    break
+        paths=list(paths)
+        users.update(paths)
+        plans.append((dbx,paths))
+
+    for dbx, paths in plans:
+        for path in paths: fetch(payloads[path.lower()])
+        pipeline.then(convertAsset,dbx,paths,users,folders,outputFolder)
+    pipeline.then(stats.endPhase,"convertAssets",start)
+    return len(dbxs)
@@ -0,0 +1,283 @@
+#Long-running server for the ebx tools. Loading the EBX GUID and RES tables (and the cats, for payloads straight from the game)
+#often takes longer than the work itself, so this loads them once and then serves requests from a socket in the dump folder.
+#Recently parsed ebx, decompressed frames of a compressed dump and decompressed payload blocks are kept in LRU caches.
+#
+#Start it with the paths below (or python daemon.py dumpDirectory [gameDirectory]), then send requests from another shell:
+#    python daemon.py text audio/music/foo           ebx to text, like ebxtotext
+#    python daemon.py asset audio/music/foo          extract the assets of an ebx, like ebxtoasset
+#    python daemon.py link <file GUID> [<instance GUID>]   name of the ebx behind a GUID and the type of the instance
+#    python daemon.py payload <sha1> <target>        decompress a payload from the cas archives of the game
+#    python daemon.py stats | reload | stop
+#Put --dump <dumpDirectory> in front to talk to the daemon of another dump than the one set below.
+#Batch jobs can also talk to the socket directly: one JSON object per line like {"op": "text", "path": "audio/music/foo"},
+#answered by one JSON line with "ok" and either the result or "error".
+#The socket is a Unix socket, or a TCP port on localhost where Python has no Unix sockets (Windows).
+import dbo
+import ebx
+import res
+import cas
+import das
+import payload
+import packfile
+import locator
+import zstdfile
+import context
+import collections
+import json
+import os
+import socket
+import socketserver
+import sys
+
+#Choose where you dumped the files and where the results of text and asset requests go.
+dumpDirectory    = r"E:\GameRips\NFS\NFSR\pc\dump"
+textDirectory    = r"E:\GameRips\NFS\NFSR\pc\ebx"
+assetDirectory   = r"E:\GameRips\NFS\NFSR\pc\assets"
+
+#The game the dump came from, its cats are only needed for payload requests. Leave it empty to skip them.
+gameDirectory    = r""
+
+#Cache sizes: parsed ebx files, and bytes of decompressed dump frames and payload blocks.
+dbxCacheEntries  = 2000
+frameCacheSize   = 256<<20
+blockCacheSize   = 256<<20
+
+socketName       = "daemon.sock" #in the dump folder
+port             = 47193 #used instead of the socket where there are no Unix sockets
+
+#These paths are relative to the dumpDirectory. They don't need to be changed.
+ebxFolder    = r"bundles\ebx"
+resFolder    = r"bundles\res"
+chunkFolder  = r"chunks"
+chunkFolder2 = r"bundles\chunks"
+
+##############################################################
+##############################################################
+
+class LruCache:
+    #Keeps values up to maxSize in total (in bytes, or any other unit the callers agree on), dropping the ones used longest ago.
+    def __init__(self,maxSize):
+        self.maxSize=maxSize
+        self.items=collections.OrderedDict() #key -> (value, size)
+        self.size=0
+        self.hits=0
+        self.misses=0
+
+    def get(self,key):
+        item=self.items.get(key)
+        if item is None:
+            self.misses+=1
+            return None
+        self.items.move_to_end(key)
+        self.hits+=1
+        return item[0]
+
+    def put(self,key,value,size):
+        if key in self.items: self.size-=self.items.pop(key)[1]
+        if size>self.maxSize: return
+        self.items[key]=(value,size)
+        self.size+=size
+        while self.size>self.maxSize:
+            self.size-=self.items.popitem(False)[1][1]
+
+    def clear(self):
+        self.items.clear()
+        self.size=0
+
+    def report(self):
+        return {"entries":len(self.items),"size":self.size,"hits":self.hits,"misses":self.misses}
+
+dbxCache=LruCache(dbxCacheEntries)
+blockCache=LruCache(blockCacheSize)
+zstdfile.frameCache=LruCache(frameCacheSize)
+guidNames=dict() #formatted file GUID -> ebx name
+dumpContext=context.DumpContext() #tables of the dump
+gameContext=context.ExtractionContext() #cats of the game
+
+def loadTables():
+    global dumpContext
+    #A fresh context, so nothing of the old dump is left behind, like its NewWave lookup.
+    dumpContext=context.DumpContext()
+    dumpContext.dbxCache=dbxCache #linked files are only parsed once too
+    print("Loading GUID table...")
+    ebx.loadGuidTable(dumpContext,dumpDirectory)
+    guidNames.clear()
+    for guid, name in dumpContext.guidTable.items(): guidNames[guid.format()]=name
+    print ("Loading RES table...")
+    res.loadResTable(dumpContext,dumpDirectory)
+    packfile.mount(dumpDirectory)
+    locator.reset()
+    dbxCache.clear()
+    zstdfile.frameCache.clear()
+
+def loadCats():
+    #All cats of the game, or the dal of NFS: Edge. A SHA1 found in more than one cat has the same data in each, so the order doesn't matter.
+    global gameContext
+    gameContext=context.ExtractionContext()
+    blockCache.clear()
+    if not gameDirectory: return
+    print("Reading cat entries...")
+    dataDir=os.path.join(gameDirectory,"Data")
+    if os.path.isfile(os.path.join(dataDir,"das.dal")):
+        das.readDal(gameContext,os.path.join(dataDir,"das.dal"))
+        return
+
+    tocLayout=dbo.readToc(os.path.join(dataDir,"layout.toc"))
+    installManifest=tocLayout.getSubObject("installManifest")
+    if not installManifest: readCat=cas.readCat1
+    elif not installManifest.getSubObject("installChunks"): readCat=cas.readCat2
+    elif installManifest.get("maxTotalSize")!=None: readCat=cas.readCat3
+    else: readCat=cas.readCat4
+    for dir0, dirs, ff in os.walk(gameDirectory):
+        if "cas.cat" in ff: readCat(gameContext,os.path.join(dir0,"cas.cat"))
+
+def ebxFile(path):
+    #Request paths are relative to the ebx folder, with either slash and with or without the extension.
+    path=os.path.join(ebxFolder,path.replace("/",os.sep).replace("\\",os.sep))
+    if path[-4:]!=".ebx": path+=".ebx"
+    if not packfile.isFile(path): raise Exception("No such ebx: %s" % path)
+    return path
+
+def readPayload(catEntry):
+    #Like payload.decompressPayload, but the decompressed blocks are kept in blockCache.
+    blocks=list()
+    f=None
+    pos=catEntry.offset
+    while pos<catEntry.offset+catEntry.size:
+        cached=blockCache.get((catEntry.path,pos))
+        if cached is None:
+            if not f: f=open(catEntry.path,"rb")
+            f.seek(pos)
+            dictFlag, uncompressedSize, comType, typeFlag, compressedSize = payload.readBlockHeader(f)
+            comType=payload.blockCodec(uncompressedSize,comType,typeFlag,compressedSize,pos,f)
+            data=payload.decodeBlock(f.read(compressedSize),dictFlag,uncompressedSize,comType)
+            cached=(data,pos+8+compressedSize)
+            blockCache.put((catEntry.path,pos),cached,uncompressedSize)
+        blocks.append(cached[0])
+        pos=cached[1]
+    if f: f.close()
+    return b"".join(blocks)
+
+def handleText(request):
+    dbx=ebx.loadDbx(dumpContext,ebxFile(request["path"]),ebxFolder)
+    outName=request.get("target") or os.path.join(textDirectory,dbx.trueFilename+".txt")
+    dbx.dump(outName)
+    return {"output":outName}
+
+def handleAsset(request):
+    dbx=ebx.loadDbx(dumpContext,ebxFile(request["path"]),ebxFolder)
+    outputFolder=request.get("target") or assetDirectory
+    dbx.extractAssets(chunkFolder,chunkFolder2,resFolder,outputFolder)
+    return {"asset":dbx.prim.desc.name,"output":outputFolder}
+
+def handleLink(request):
+    name=guidNames.get(request["guid"].upper())
+    if name is None: raise Exception("Unknown file GUID: %s" % request["guid"])
+    result={"name":name}
+    if request.get("instance"):
+        dbx=ebx.loadDbx(dumpContext,os.path.join(ebxFolder,name+".ebx").lower(),ebxFolder)
+        for guid, instance in dbx.instances:
+            if guid.format()==request["instance"].upper():
+                result["type"]=instance.desc.name
+                break
+        else:
+            raise Exception("No instance %s in %s" % (request["instance"],name))
+    return result
+
+def handlePayload(request):
+    sha1=bytes.fromhex(request["sha1"])
+    if sha1 not in gameContext.catDict: raise Exception("SHA1 not in any cat: %s" % request["sha1"])
+    data=readPayload(gameContext.catDict[sha1])
+    ebx.makeLongDirs(request["target"])
+    f=open(ebx.lp(request["target"]),"wb")
+    f.write(data)
+    f.close()
+    return {"output":request["target"],"size":len(data)}
+
+def handleStats(request):
+    return {"dbx":dbxCache.report(),"frames":zstdfile.frameCache.report(),"blocks":blockCache.report(),
+            "guids":len(dumpContext.guidTable),"res":len(dumpContext.resTable),"cat":len(gameContext.catDict)}
+
+def handleReload(request):
+    #The dump or the game changed.
+    loadTables()
+    loadCats()
+    return handleStats(request)
+
+handlers={"text":handleText,"asset":handleAsset,"link":handleLink,"payload":handlePayload,"stats":handleStats,"reload":handleReload}
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        #Requests are handled one at a time, the tables and caches aren't shared between threads.
+        for line in self.rfile:
+            if not line.strip(): continue
+            try:
+                request=json.loads(line)
+                if request.get("op")=="stop":
+                    self.reply({"ok":True})
+                    self.server.running=False
+                    return
+                result=handlers[request.get("op")](request) if request.get("op") in handlers else None
+                if result is None: raise Exception("Unknown request: %s" % request.get("op"))
+                result["ok"]=True
+            except Exception as e:
+                result={"ok":False,"error":"%s: %s" % (type(e).__name__,e)}
+            self.reply(result)
+
+    def reply(self,result):
+        self.wfile.write(json.dumps(result).encode()+b"\n")
+        self.wfile.flush()
+
+def serve():
+    socketPath=os.path.join(dumpDirectory,socketName)
+    if hasattr(socket,"AF_UNIX"):
+        if os.path.exists(socketPath): os.remove(socketPath) #left over from a daemon that was killed
+        server=socketserver.UnixStreamServer(socketPath,Handler)
+        print("Listening on %s" % socketPath)
+    else:
+        server=socketserver.TCPServer(("127.0.0.1",port),Handler)
+        print("Listening on port %d" % port)
+    server.running=True
+    while server.running: server.handle_request()
+    server.server_close()
+    if hasattr(socket,"AF_UNIX"): os.remove(socketPath)
+
+def send(request):
+    #Client side: send one request to the daemon of the dump and return the answer.
+    if hasattr(socket,"AF_UNIX"):
+        s=socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        s.connect(os.path.join(dumpDirectory,socketName))
+    else:
+        s=socket.create_connection(("127.0.0.1",port))
+    f=s.makefile("rwb")
+    f.write(json.dumps(request).encode()+b"\n")
+    f.flush()
+    answer=json.loads(f.readline())
+    f.close()
+    s.close()
+    return answer
+
+clientArgs={"text":["path"],"asset":["path"],"link":["guid","instance"],"payload":["sha1","target"],"stats":[],"reload":[],"stop":[]}
+
+args=sys.argv[1:]
+if args[:1]==["--dump"]:
+    #The daemon of another dump than the one set above.
+    dumpDirectory=args[1]
+    args=args[2:]
+if args and args[0] in clientArgs:
+    request={"op":args[0]}
+    request.update(zip(clientArgs[args[0]],args[1:]))
+    answer=send(request)
+    print(json.dumps(answer,indent=1))
+    sys.exit(0 if answer["ok"] else 1)
+
+if len(args)>0: dumpDirectory=args[0]
+if len(args)>1: gameDirectory=args[1]
+dumpDirectory=os.path.normpath(dumpDirectory)
+ebxFolder,chunkFolder,chunkFolder2,resFolder = [os.path.join(dumpDirectory, path) for path in (ebxFolder, chunkFolder, chunkFolder2, resFolder)]
+
+payload.zstdInit()
+loadTables()
+loadCats()
+serve()
+payload.zstdCleanup()
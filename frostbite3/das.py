@@ -1,12 +1,17 @@
 #Need for Speed: Edge stuff is handled here.
 import dbo
-import cas
 import payload
+import pipeline
+import writer
 import ebx
 import io
 import os
 from struct import pack,unpack
 import res
+import stats
+import sharding
+import convert
+import layout
 
 def readStringBuffer(f,len):
     result=b""
@@ -28,7 +33,7 @@ class DalEntry:
         self.size=unpack("<I",f.read(4))[0]
         self.path=dasPath
 
-def readDal(dalPath):
+def readDal(ctx,dalPath):
     dasDirectory=os.path.dirname(dalPath)
     f=open(dalPath,"rb")
     numDas=unpack("<B",f.read(1))[0]
@@ -43,62 +48,49 @@ def readDal(dalPath):
         for j in range(numEntries):
             sha1=f2.read(20)
             dalEntry=DalEntry(f2,dataOffset,dasPath)
-            cas.catDict[sha1]=dalEntry
+            ctx.catDict[sha1]=dalEntry
             dataOffset+=dalEntry.size
 
         f2.close()
 
     f.close()
 
-def prepareDir(targetPath):
-    if os.path.exists(targetPath): return True
-    folderPath=os.path.dirname(targetPath)
-    os.makedirs(folderPath,exist_ok=True)
-    #print(targetPath)
+def addEbxGuid(ctx,path,ebxPath):
+    #Called through the pipeline once the ebx is written. The null sink keeps nothing to read back.
+    if writer.sinkName=="null": return
+    with stats.phase("ebxGuid"): ebx.addEbxGuid(ctx,path,ebxPath)
+    if convert.enabled: convert.addEbx(path,ebxPath)
 
-def dump(tocPath,outPath):
-    toc=dbo.readToc(tocPath)
+def dump(ctx,tocPath,outPath):
+    with stats.phase("tocDecrypt"): tocData=dbo.unXor(tocPath)
+    with stats.phase("tocParse"): toc=dbo.DbObject(tocData)
     if not (toc.getSubObject("bundles") or toc.get("chunks")): return #there's nothing to extract (the sb might not even exist)
 
     sbPath=tocPath[:-3]+"sb"
     sb=open(sbPath,"rb")
+    stats.beginSuperbundle(tocPath)
 
-    chunkPathToc=os.path.join(outPath,"chunks")
-    bundlePath=os.path.join(outPath,"bundles")
-    ebxPath=os.path.join(bundlePath,"ebx")
-    resPath=os.path.join(bundlePath,"res")
-    chunkPath=os.path.join(bundlePath,"chunks")
+    outFolders=layout.folders(outPath)
+    ebxPath=outFolders[1]
 
     if not toc.get("das"): raise Exception("Non-DAS superbundle found in NFS: Edge.")
 
-    bundles=toc.getSubObject("bundles") #names offsets sizes (list sizes should be same)
-    offsets=bundles.get("offsets")
+    for bundleId, offset, delta in layout.bundles(toc):
+        if not sharding.hasUnit(tocPath,bundleId): continue
+        with stats.phase("manifest"): bundle, sourcePath = layout.readBundle(toc,tocPath,None,sb,bundleId,offset,delta)
 
-    for offset in offsets:
-        sb.seek(offset.content)
-        bundle=dbo.DbObject(sb)
-
-        for entry in bundle.get("ebx",list()): #name sha1 size originalSize
-            path=os.path.join(ebxPath,entry.get("name")+".ebx")
-            if payload.casBundlePayload(entry,path,False):
-                ebx.addEbxGuid(path,ebxPath)
-
-        for entry in bundle.get("res",list()): #name sha1 size originalSize resRid resType resMeta
-            res.addToResTable(entry.get("resRid"),entry.get("name"),entry.get("resType"),entry.get("resMeta"))
-            path=os.path.join(resPath,entry.get("name")+res.getResExt(entry.get("resType")))
-            payload.casBundlePayload(entry,path,False)
-
-        for entry in bundle.get("chunks",list()): #id sha1 size logicalOffset logicalSize chunkMeta::meta
-            path=os.path.join(chunkPath,entry.get("id").format()+".chunk")
-            payload.casBundlePayload(entry,path,True)
+        for kind, path, entry in layout.payloads(toc,bundle,outFolders):
+            if kind=="res": pipeline.then(res.addToResTable,ctx,*layout.resInfo(toc,entry))
+            if payload.casBundlePayload(ctx,entry,path,kind=="chunks") and kind=="ebx":
+                pipeline.then(addEbxGuid,ctx,path,ebxPath)
 
     #Deal with the chunks which are defined directly in the toc.
-    #These chunks do NOT know their originalSize.
-    for entry in toc.get("chunks"): #id sha1
-        targetPath=os.path.join(chunkPathToc,entry.get("id").format()+".chunk")
-        payload.casChunkPayload(entry,targetPath)
+    if sharding.hasUnit(tocPath,None): #or another shard's
+        for targetPath, entry in layout.tocChunks(toc,outFolders):
+            payload.casChunkPayload(ctx,entry,targetPath)
 
     sb.close()
+    pipeline.then(stats.endSuperbundle,stats.currentSb)
 
 #FrontEnd DAS files, this is its own archive format completely separate from the rest of the filesystem.
 def extractDas(dasPath,outPath):
@@ -149,22 +141,12 @@ def extractDas(dasPath,outPath):
             data=f.read(size)
 
         targetFile=os.path.normpath(os.path.join(feFolder,name))
-        prepareDir(targetFile)
-        f2=open(targetFile,"wb")
+        f2=writer.openTarget(targetFile,size)
         f2.write(data)
-        f2.close()
+        writer.closeTarget(f2,targetFile)
 
     f.close()
 
-def dumpRoot(dataDir,outPath):
-    for dir0, dirs, ff in os.walk(dataDir):
-        for fname in ff:
-            if fname[-4:]==".toc":
-                fname=os.path.join(dir0,fname)
-                localPath=os.path.relpath(fname,dataDir)
-                print(localPath)
-                dump(fname,outPath)
-
 def dumpFE(dataDir,outPath):
     for fname in os.listdir(dataDir):
         if fname[:6]=="das_fe":
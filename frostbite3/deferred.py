@@ -0,0 +1,132 @@
+#Deferred chunks of a metadata-first dump. The dumper extracts the ebx and res and writes the EBX GUID and RES tables before
+#it touches a single chunk, so ebxtotext can start on the dump while the (much larger) chunks are still to come.
+#Every chunk payload the dumper would submit is recorded in deferredChunks.bin instead: its target path (relative to the dump folder,
+#named like in a pack, so the dump can be moved before the chunks are extracted), size, and the payload function and arguments that extract it. extract() submits them to the pipeline afterwards, all of them or only the requested ones.
+#The queue is appended to as the bundles go by and flushed with each finished bundle, so it survives an interrupted dump just like the journal.
+#The asset conversion of the dumper queues the res and the asset ebx here as well, see convert.py.
+#So does selectEbx of the dumper with the res, see closure.py.
+import os
+import pickle
+import packfile
+import payload
+import pipeline
+import stats
+import writer
+
+queueName="deferredChunks.bin"
+
+enabled=False
+deferRes=False #the res are queued as well, for the asset conversion of the dumper (see convert.py)
+queue=None
+queuePath=""
+root="" #the dump folder
+queued=set() #target paths in the queue
+
+def start(dumpFolder,settings):
+    #Keep appending to the queue of an interrupted run. settings are the dumper settings the chunks have to be written with.
+    global enabled, queue, queuePath, root
+    root=dumpFolder
+    queuePath=os.path.join(dumpFolder,queueName)
+    queued.clear()
+    validSize=0
+    if os.path.isfile(queuePath):
+        header, records, validSize = readFile(queuePath)
+        queued.update(path for path in (pathOf(dumpFolder,record[0]) for record in records) if path)
+    queue=open(queuePath,"ab")
+    queue.truncate(validSize)
+    if not validSize: pickle.dump(settings,queue,2)
+    enabled=True
+
+def readQueue(dumpFolder):
+    #The settings of the dump, the records with their paths in dumpFolder and the number of records that were left out
+    #because their path is outside of it. Those are never extracted, somewhere else is no place to write to.
+    header, records, validSize = readFile(os.path.join(dumpFolder,queueName))
+    inside=list()
+    for name, size, fillName, args in records:
+        path=pathOf(dumpFolder,name)
+        if path: inside.append((path,size,fillName,args))
+    return header, inside, len(records)-len(inside)
+
+def pathOf(dumpFolder,name):
+    #Path of a queued name in the dump folder, None if it would be outside of it. Queues of earlier versions have absolute paths.
+    if os.path.isabs(name) or os.path.splitdrive(name)[0]:
+        name=packfile.nameOf(dumpFolder,name)
+        if name is None: return None
+    parts=name.replace("\\","/").split("/")
+    if not name or ".." in parts or os.path.isabs(name) or os.path.splitdrive(name)[0]: return None
+    return os.path.join(dumpFolder,*parts)
+
+def readFile(path):
+    #The settings of the dump, the records as they're stored and the size of the part that's complete.
+    f=open(path,"rb")
+    header=None
+    records=list()
+    validSize=0
+    try: header=pickle.load(f)
+    except Exception: pass
+    else:
+        validSize=f.tell()
+        while 1:
+            try: records.append(pickle.load(f))
+            except Exception: break #end of file or a record cut short by a crash
+            validSize=f.tell()
+    f.close()
+    return header, records, validSize
+
+def add(path,size,fill,args):
+    #Called instead of pipeline.submit for a chunk. fill is one of the payload functions, it's stored by name.
+    name=packfile.nameOf(root,path)
+    if name is None: raise ValueError("Can't queue %s, it's outside of the dump folder %s." % (path,root))
+    pickle.dump((name,size,fill.__name__,args),queue,2)
+    queued.add(path)
+
+def defers(path):
+    #Whether the payload at path goes to the queue instead of the pipeline.
+    if path.endswith(".chunk"): return True
+    return deferRes and not path.endswith(".ebx")
+
+def isQueued(path):
+    #The asset ebx queued by convert.py are extracted all the same.
+    return path in queued and defers(path)
+
+def flush(sync=False):
+    if not queue: return
+    queue.flush()
+    if sync: os.fsync(queue.fileno())
+
+def finish():
+    #No more chunks are queued. The file stays until the chunks are extracted.
+    global enabled, deferRes, queue
+    if queue: queue.close()
+    queue=None
+    enabled=False
+    deferRes=False
+
+def extract(dumpFolder,wanted=None):
+    #Submit the queued chunks whose file doesn't exist yet, or only those whose chunk id is in wanted (lowercase).
+    #Returns the number of chunks submitted and the number of the others that still aren't extracted (including the ones outside
+    #of the dump folder), the queue isn't rewritten when only a few are asked for.
+    header, records, left = readQueue(dumpFolder)
+    submitted=0
+    start=stats.clock()
+    for record in records:
+        if wanted is not None and os.path.basename(record[0])[:-6].lower() not in wanted:
+            if not writer.exists(record[0]): left+=1
+            continue
+        if submit(record): submitted+=1
+    pipeline.then(stats.endPhase,"deferredChunks",start)
+    return submitted, left
+
+def submit(record):
+    #Extract a queued payload unless its file exists or is on its way. Returns whether it was submitted.
+    path, size, fillName, args = record
+    if pipeline.isPending(path) or writer.exists(path):
+        stats.skipEntry()
+        return False
+    payload.submit(path,size,getattr(payload,fillName),*args)
+    return True
+
+def remove(dumpFolder):
+    #All chunks are extracted.
+    path=os.path.join(dumpFolder,queueName)
+    if os.path.isfile(path): os.remove(path)
@@ -0,0 +1,75 @@
+#Which ebx, res and chunks a patch changed, without extracting anything. Compares the toc/bundle manifests and cat SHA1s of two installs
+#(see manifest.py), or of an install and a manifest file saved from an earlier one, so only the changed files need to be dumped and processed again.
+#Entries are matched by their output path in the dump (name, or chunk id), and the file the dumper would extract for a path is compared by SHA1.
+#The report (diff.json) lists the added, removed and changed entries and how many stored bytes need to be read to extract just those.
+import manifest
+import os
+import json
+import sys
+
+#Adjust paths here. Each side is either a game directory or a manifest file written by this script.
+
+oldInstall   = r"E:\GameRips\NFS\NFSR\pc\manifest-1.0.txt"
+newInstall   = r"D:\Games\OriginGames\Need for Speed(TM) Rivals"
+reportPath   = r"E:\GameRips\NFS\NFSR\pc\diff.json"
+
+#Save the manifest of the new install here, to compare the next patch against. Leave it empty to skip it.
+manifestPath = r"E:\GameRips\NFS\NFSR\pc\manifest-1.1.txt"
+
+#####################################
+#####################################
+
+def dumpedEntries(install):
+    #The entry the dumper extracts for each output path: the first one that is in a cat.
+    result=dict()
+    entries=manifest.loadManifest(install) if os.path.isfile(install) else manifest.entries(install)
+    for entry in entries:
+        if entry.missing or entry.path in result: continue
+        result[entry.path]=entry
+    return result
+
+def isChanged(old,new):
+    #Noncas toc chunks have no SHA1, those are only compared by size.
+    if old.sha1 is None or new.sha1 is None: return old.size!=new.size
+    return old.sha1!=new.sha1
+
+def describe(entry):
+    return {"path":entry.path,"kind":entry.kind,"sha1":entry.sha1.hex() if entry.sha1 else None,"size":entry.size,"originalSize":entry.originalSize}
+
+#Paths can also be passed on the command line: diff.py oldInstall newInstall [reportPath [manifestPath]]
+if len(sys.argv)>1: oldInstall=sys.argv[1]
+if len(sys.argv)>2: newInstall=sys.argv[2]
+if len(sys.argv)>3: reportPath=sys.argv[3]
+if len(sys.argv)>4: manifestPath=sys.argv[4]
+
+print("Reading %s..." % oldInstall)
+oldEntries=dumpedEntries(os.path.normpath(oldInstall))
+print("Reading %s..." % newInstall)
+newEntries=dumpedEntries(os.path.normpath(newInstall))
+if manifestPath: manifest.saveManifest(newEntries.values(),manifestPath)
+
+added=[entry for path, entry in newEntries.items() if path not in oldEntries]
+removed=[entry for path, entry in oldEntries.items() if path not in newEntries]
+changed=[entry for path, entry in newEntries.items() if path in oldEntries and isChanged(oldEntries[path],entry)]
+unverified=sum(1 for path, entry in newEntries.items() if path in oldEntries and (entry.sha1 is None or oldEntries[path].sha1 is None))
+
+report={"old":oldInstall,"new":newInstall,
+        "entries":len(newEntries),"added":len(added),"removed":len(removed),"changed":len(changed),"comparedBySize":unverified,
+        #What extracting only the added and changed entries takes. Patched payloads count with their delta, toc chunks don't know their original size.
+        "deltaBytes":sum(entry.size for entry in added+changed),
+        "deltaOriginalBytes":sum(entry.originalSize or 0 for entry in added+changed),
+        "addedEntries":[describe(entry) for entry in added],
+        "removedEntries":[describe(entry) for entry in removed],
+        "changedEntries":[describe(entry) for entry in changed]}
+
+folder=os.path.dirname(reportPath)
+if folder: os.makedirs(folder,exist_ok=True)
+f=open(reportPath,"w")
+json.dump(report,f,indent=1)
+f.close()
+
+print("%d entries: %d added, %d removed, %d changed; extracting them reads %.1f MB (%.1f MB after extraction)" % (
+    len(newEntries),len(added),len(removed),len(changed),report["deltaBytes"]/1048576,report["deltaOriginalBytes"]/1048576))
+for kind in sorted(set(entry.kind for entry in list(newEntries.values())+removed)):
+    print("  %-10s %8d added %8d removed %8d changed" % (kind,sum(entry.kind==kind for entry in added),
+        sum(entry.kind==kind for entry in removed),sum(entry.kind==kind for entry in changed)))
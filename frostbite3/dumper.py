@@ -2,14 +2,27 @@
 #Often the assets are actually stored in cascat archives (the sbtoc knows where to search in the cascat), which is taken care of too.
 #The script does not overwrite existing files (mainly because 10 sbtocs pointing at the same asset in the cascat would make the extraction time unbearable).
 import dbo
-import noncas
 import ebx
 import payload
-import cas
 import das
 import os
 from struct import pack,unpack
 import res
+import stats
+import profiler
+import spill
+import checkpoint
+import writer
+import pipeline
+import mapped
+import iohints
+import context
+import sharding
+import deferred
+import convert
+import closure
+import layout
+import sys
 
 #Adjust paths here.
 #do yourself a favor and don't dump into the Users folder (or it might complain about permission)
@@ -17,10 +30,62 @@ import res
 gameDirectory   = r"D:\Games\OriginGames\Need for Speed(TM) Rivals"
 targetDirectory = r"E:\GameRips\NFS\NFSR\pc\dump"
 
+#Keep the cat, EBX GUID and RES tables in an on-disk store inside the target directory instead of in memory.
+#Memory use then stays flat no matter how big the game is, at the cost of some speed.
+spillTables = False
+
+#Where the extracted files go: "directory" for the usual folder tree, "pack" for a single dump.pack file with an index (dump.idx)
+#that ebxtotext and ebxtoasset read directly, or "null" to throw everything away and only measure how fast the dumper decodes.
+outputSink = "directory"
+
+#Store the extracted files recompressed with zstd at this level (1-19, 3 is a good start) instead of decompressed.
+#The dump gets several times smaller and ebxtotext/ebxtoasset read it as usual, 0 turns it off.
+compressLevel = 0
+
+#Create the files of each bundle grouped by output folder, which helps filesystems that lay out a folder's files together.
+#Noncas bundles are then no longer read front to back, so this is mostly worth it on slow target drives.
+sortByDirectory = False
+
+#Number of threads that read and decompress payloads while the main thread goes through the manifests and a writer thread writes the files.
+#Set it to 0 to do everything on the main thread, one payload after the other. At most one thread less than there are cores is used.
+workerThreads = 4
+
+#Tell the kernel how the cas and sb files are read (Linux and other unixes): read each payload ahead when it's queued and drop it
+#from the page cache once it's extracted. Otherwise a long dump fills the cache with archive data that's never read again
+#and pushes out everything else on the machine. Has no effect on Windows.
+pageCacheHints = True
+
+#Dump only a part of the game, so several machines (or processes) can share the work: "i/N" is the i-th of N shards, counting from 0.
+#Every shard needs a target directory of its own, merge.py puts them together into one dump afterwards. Leave it empty to dump everything.
+shard = ""
+
+#Metadata first: extract the ebx and res and write the EBX GUID and RES tables before any chunk, so ebxtotext can run on the dump right away.
+#The chunks are queued in deferredChunks.bin meanwhile. "now" extracts them right after the tables, "later" leaves them for extractchunks.py,
+#which extracts all of them or only the ones asked for. Leave it empty to extract everything in one go.
+deferChunks = ""
+
+#Dump and convert in one go: put the assets ebxtoasset.py would extract (sounds and movies) into this folder, and nothing but
+#the EBX GUID and RES tables into the target directory. The ebx, res and chunks are handed to the conversion in memory instead of being written,
+#and only the res and chunks the assets reference are extracted at all. convertFolder limits it to the ebx below a folder, like inputFolder
+#in ebxtoasset.py. outputSink and compressLevel don't apply, shard and deferChunks can't be used with it. Leave it empty for a normal dump.
+convertDirectory = ""
+convertFolder    = ""
+
+#Dump what a few ebx need: the ebx below these folders (relative to the ebx folder, e.g. [r"audio\music"]) get the res and chunks they reference
+#extracted, directly or through the ebx they link to. All ebx are extracted regardless, the rest of the res and chunks are queued
+#in deferredChunks.bin for extractchunks.py. shard, deferChunks and convertDirectory can't be used with it. Leave it empty to dump everything.
+selectEbx = []
+
 #####################################
 #####################################
 
-def dump(tocPath,baseTocPath,outPath):
+def addEbxGuid(ctx,path,ebxPath):
+    #Called through the pipeline once the ebx is written. The null sink keeps nothing to read back.
+    if writer.sinkName=="null": return
+    with stats.phase("ebxGuid"): checkpoint.addEbxGuid(ctx,path,ebxPath)
+    if convert.enabled: convert.addEbx(path,ebxPath)
+
+def dump(ctx,tocPath,baseTocPath,outPath):
     """Take the filename of a toc and dump all files to the targetFolder."""
 
     #Depending on how you look at it, there can be up to 2*(3*3+1)=20 different cases:
@@ -35,230 +100,172 @@ def dump(tocPath,baseTocPath,outPath):
     #Additionally, add some common fields to the ebx/res/chunks entries so they can be treated the same.
     #=> 6 cases.
 
-    toc=dbo.readToc(tocPath)
+    if checkpoint.isSuperbundleDone(tocPath): return #finished by an earlier run
+
+    with stats.phase("tocDecrypt"): tocData=dbo.unXor(tocPath)
+    with stats.phase("tocParse"): toc=dbo.DbObject(tocData)
     if not (toc.get("bundles") or toc.get("chunks")): return #there's nothing to extract (the sb might not even exist)
 
     sbPath=tocPath[:-3]+"sb"
     sb=open(sbPath,"rb")
-
-    chunkPathToc=os.path.join(outPath,"chunks")
-    bundlePath=os.path.join(outPath,"bundles")
-    ebxPath=os.path.join(bundlePath,"ebx")
-    resPath=os.path.join(bundlePath,"res")
-    chunkPath=os.path.join(bundlePath,"chunks")
+    stats.beginSuperbundle(tocPath)
+    outFolders=layout.folders(outPath)
+    ebxPath=outFolders[1]
 
     ###read the bundle depending on the four types (+cas+delta, +cas-delta, -cas+delta, -cas-delta) and choose the right function to write the payload
-    if toc.get("cas"):
-        for tocEntry in toc.get("bundles"): #id offset size, size is redundant
-            if tocEntry.get("base"): continue #Patched bundle. However, use the unpatched bundle because no file was patched at all.
-
-            sb.seek(tocEntry.get("offset"))
-            bundle=dbo.DbObject(sb)
-                    
-            #pick the right function
-            if tocEntry.get("delta"):
-                writePayload=payload.casPatchedBundlePayload
-            else:
-                writePayload=payload.casBundlePayload
-
-            for entry in bundle.get("ebx",list()): #name sha1 size originalSize
-                path=os.path.join(ebxPath,entry.get("name")+".ebx")
-                if writePayload(entry,path,False):
-                    ebx.addEbxGuid(path,ebxPath)
-
-            for entry in bundle.get("res",list()): #name sha1 size originalSize resRid resType resMeta
-                res.addToResTable(entry.get("resRid"),entry.get("name"),entry.get("resType"),entry.get("resMeta"))
-                path=os.path.join(resPath,entry.get("name")+res.getResExt(entry.get("resType")))
-                writePayload(entry,path,False)
-
-            for entry in bundle.get("chunks",list()): #id sha1 size logicalOffset logicalSize chunkMeta::h32 chunkMeta::meta
-                path=os.path.join(chunkPath,entry.get("id").format()+".chunk")
-                writePayload(entry,path,True)
-
-        #Deal with the chunks which are defined directly in the toc.
-        #These chunks do NOT know their originalSize.
-        for entry in toc.get("chunks"): #id sha1
-            targetPath=os.path.join(chunkPathToc,entry.get("id").format()+".chunk")
-            payload.casChunkPayload(entry,targetPath)
-    else:
-        for tocEntry in toc.get("bundles"): #id offset size, size is redundant
-            if tocEntry.get("base"): continue #Patched bundle. However, use the unpatched bundle because no file was patched at all.
-
-            sb.seek(tocEntry.get("offset"))
-
-            if tocEntry.get("delta"):
-                #The sb currently points at the delta file.
-                #Read the unpatched toc of the same name to get the base bundle.
-                baseToc=dbo.readToc(baseTocPath)
-                for baseTocEntry in baseToc.get("bundles"):
-                    if baseTocEntry.get("id").lower() == tocEntry.get("id").lower():
-                        break
-                else: #if no base bundle has with this name has been found:
-                    pass #use the last base bundle. This is okay because it is actually not used at all (the delta has uses instructionType 3 only).
-                    
-                basePath=baseTocPath[:-3]+"sb"
-                base=open(basePath,"rb")
-                base.seek(baseTocEntry.get("offset"))
-                bundle=noncas.patchedBundle(base, sb) #create a patched bundle using base and delta
-                base.close()
-                writePayload=payload.noncasPatchedBundlePayload
-                sourcePath=[basePath,sbPath] #base, delta
-            else:
-                bundle=noncas.unpatchedBundle(sb)
-                writePayload=payload.noncasBundlePayload
-                sourcePath=sbPath
-
-            for entry in bundle.ebx:
-                path=os.path.join(ebxPath,entry.name+".ebx")
-                if writePayload(entry,path,sourcePath):
-                    ebx.addEbxGuid(path,ebxPath)
-
-            for entry in bundle.res:
-                res.addToResTable(entry.resRid,entry.name,entry.resType,entry.resMeta)
-                path=os.path.join(resPath,entry.name+res.getResExt(entry.resType))
-                writePayload(entry,path,sourcePath)
-
-            for entry in bundle.chunks:
-                path=os.path.join(chunkPath,entry.id.format()+".chunk")
-                writePayload(entry,path,sourcePath)
-
-        #Deal with the chunks which are defined directly in the toc.
-        #These chunks do NOT know their originalSize.
-        for entry in toc.get("chunks"): #id offset size
-            targetPath=os.path.join(chunkPathToc,entry.get("id").format()+".chunk")
-            payload.noncasChunkPayload(entry,targetPath,sbPath)
-
-    sb.close()
+    casToc=layout.isCas(toc)
+    for bundleId, offset, delta in layout.bundles(toc):
+        if not sharding.hasUnit(tocPath,bundleId): continue
+        if checkpoint.isBundleDone(tocPath,bundleId): continue
 
+        with stats.phase("manifest"): bundle, sourcePath = layout.readBundle(toc,tocPath,baseTocPath,sb,bundleId,offset,delta)
 
+        #pick the right function
+        if casToc:
+            writePayload=payload.casPatchedBundlePayload if delta else payload.casBundlePayload
+        else:
+            writePayload=payload.noncasPatchedBundlePayload if delta else payload.noncasBundlePayload
 
-def dumpRoot(dataDir,patchDir,outPath):
-    os.makedirs(outPath,exist_ok=True)
-
-    for dir0, dirs, ff in os.walk(dataDir):
-        for fname in ff:
-            if fname[-4:]==".toc":
-                fname=os.path.join(dir0,fname)
-                localPath=os.path.relpath(fname,dataDir)
-                print(localPath)
-
-                #Check if there's a patched version and extract it first.
-                patchedName=os.path.join(patchDir,localPath)
-                if os.path.isfile(patchedName):
-                    dump(patchedName,fname,outPath)
+        for kind, path, entry in layout.payloads(toc,bundle,outFolders,writer.inDirectoryOrder):
+            if kind=="res": pipeline.then(checkpoint.addToResTable,ctx,*layout.resInfo(toc,entry))
+            if casToc: written=writePayload(ctx,entry,path,kind=="chunks")
+            else: written=writePayload(entry,path,sourcePath)
+            if written and kind=="ebx": pipeline.then(addEbxGuid,ctx,path,ebxPath)
 
-                dump(fname,None,outPath)
+        pipeline.then(checkpoint.endBundle,tocPath,bundleId)
 
-def findCats(dataDir,patchDir,readCat):
-    #Read all cats in the specified directory.
-    for dir0, dirs, ff in os.walk(dataDir):
-        for fname in ff:
-            if fname=="cas.cat":
-                fname=os.path.join(dir0,fname)
-                localPath=os.path.relpath(fname,dataDir)
-                print("Reading %s..." % localPath)
-                readCat(fname)
+    #Deal with the chunks which are defined directly in the toc.
+    if sharding.hasUnit(tocPath,None): #or another shard's
+        for targetPath, entry in layout.tocChunks(toc,outFolders):
+            if casToc: payload.casChunkPayload(ctx,entry,targetPath)
+            else: payload.noncasChunkPayload(entry,targetPath,sbPath)
 
-                #Check if there's a patched version.
-                patchedName=os.path.join(patchDir,localPath)
-                if os.path.isfile(patchedName):
-                    print("Reading patched %s..." % os.path.relpath(patchedName,patchDir))
-                    readCat(patchedName)
+    sb.close()
+    pipeline.then(iohints.dropFile,sbPath) #the manifests, and the payloads of noncas bundles once the workers are done with them
+    pipeline.then(stats.endSuperbundle,stats.currentSb)
+    pipeline.then(checkpoint.endSuperbundle,tocPath)
+
+#Paths can also be passed on the command line: dumper.py [gameDirectory [targetDirectory [workerThreads]]] [--shard i/N]
+#[--convert convertDirectory] [--select folder]... (--select can be given more than once)
+if "--shard" in sys.argv:
+    i=sys.argv.index("--shard")
+    shard=sys.argv[i+1]
+    del sys.argv[i:i+2]
+if "--convert" in sys.argv:
+    i=sys.argv.index("--convert")
+    convertDirectory=sys.argv[i+1]
+    del sys.argv[i:i+2]
+while "--select" in sys.argv:
+    i=sys.argv.index("--select")
+    selectEbx=selectEbx+[sys.argv[i+1]]
+    del sys.argv[i:i+2]
+if len(sys.argv)>1: gameDirectory=sys.argv[1]
+if len(sys.argv)>2: targetDirectory=sys.argv[2]
+if len(sys.argv)>3: workerThreads=int(sys.argv[3])
 
 #make the paths absolute and normalize the slashes
 gameDirectory=os.path.normpath(gameDirectory)
 targetDirectory=os.path.normpath(targetDirectory) #it's an absolute path already
+if convertDirectory:
+    if shard or deferChunks: raise Exception("convertDirectory can't be combined with shard or deferChunks.")
+    convertDirectory=os.path.normpath(convertDirectory)
+    outputSink="memory"
+    compressLevel=0
+if selectEbx and (shard or deferChunks or convertDirectory):
+    raise Exception("selectEbx can't be combined with shard, deferChunks or convertDirectory.")
 payload.zstdInit()
+writer.sortByDirectory=sortByDirectory
+writer.compressLevel=compressLevel
+iohints.enabled=pageCacheHints
+profiler.start(os.path.join(targetDirectory,"profile"),"dumper")
+
+if spillTables: spill.openStore(os.path.join(targetDirectory,"tables.db"))
+ctx=context.ExtractionContext(spillTables)
 
 print("Loading RES names...")
 res.loadResNames()
 
-#Load layout.toc
-tocLayout=dbo.readToc(os.path.join(gameDirectory,"Data","layout.toc"))
-
-if not tocLayout.getSubObject("installManifest") or \
-    not tocLayout.getSubObject("installManifest").getSubObject("installChunks"):
-    if not os.path.isfile(os.path.join(gameDirectory,"Data","das.dal")):
-        #Old layout similar to Frostbite 2 with a single cas.cat.
-        #Can also be non-cas.
-        dataDir=os.path.join(gameDirectory,"Data")
-        updateDir=os.path.join(gameDirectory,"Update")
-        patchDir=os.path.join(updateDir,"Patch","Data")
-
-        if not tocLayout.getSubObject("installManifest"):
-            readCat=cas.readCat1
-        else:
-            readCat=cas.readCat2 #Star Wars: Battlefront Beta
-
-        catPath=os.path.join(dataDir,"cas.cat") #Seems to always be in the same place.
-        if os.path.isfile(catPath):
-            print("Reading cat entries...")
-            readCat(catPath)
-
-            #Check if there's a patched version.
-            patchedCat=os.path.join(patchDir,os.path.relpath(catPath,dataDir))
-            if os.path.isfile(patchedCat):
-                print("Reading patched cat entries...")
-                readCat(patchedCat)
-
-        if os.path.isdir(updateDir):
-            #First, extract all DLCs.
-            for dir in os.listdir(updateDir):
-                if dir=="Patch":
-                    continue
-
-                print("Extracting DLC %s..." % dir)
-                dumpRoot(os.path.join(updateDir,dir,"Data"),patchDir,targetDirectory)
-
-        #Now extract the base game.
-        print("Extracting main game...")
-        dumpRoot(dataDir,patchDir,targetDirectory)
-    else:
-        #Special case for Need for Speed: Edge. Same as early FB3 but uses das.dal instead of cas.cat.
-        dataDir=os.path.join(gameDirectory,"Data")
-
+#Pick up where an interrupted run stopped.
+checkpoint.start(ctx,targetDirectory)
+if shard:
+    print("Planning shard %s..." % shard)
+    with profiler.phase("plan"): sharding.start(shard,gameDirectory,targetDirectory)
+    print("This shard extracts %d of %d units, %.1f of %.1f MB" % (sharding.plan["units"],sharding.plan["totalUnits"],
+          sharding.plan["weight"]/1048576,sharding.plan["totalWeight"]/1048576))
+writer.start(targetDirectory,outputSink)
+pipeline.start(workerThreads)
+if deferChunks: deferred.start(targetDirectory,{"outputSink":outputSink,"compressLevel":compressLevel})
+if convertDirectory: convert.start(targetDirectory,convertFolder)
+if selectEbx: closure.start(targetDirectory,{"outputSink":outputSink,"compressLevel":compressLevel})
+
+os.makedirs(targetDirectory,exist_ok=True)
+for step in layout.walk(gameDirectory):
+    if step[0]=="cat":
+        readCat, catPath, description = step[1:]
+        print("Reading %s..." % description)
+        with stats.phase("cat"), profiler.phase("cats"): readCat(ctx,catPath)
+    elif step[0]=="dal":
         print("Reading dal entries...")
-        dalPath=os.path.join(dataDir,"das.dal")
-        das.readDal(dalPath)
-
-        print("Extracting main game...")
-        das.dumpRoot(dataDir,targetDirectory)
+        with stats.phase("cat"), profiler.phase("cats"): das.readDal(ctx,step[1])
+    elif step[0]=="root":
+        print("Extracting %s..." % step[1])
+    elif step[0]=="toc":
+        with profiler.phase("dump"): dump(ctx,step[1],step[2],targetDirectory)
+    elif step[0]=="dasToc":
+        with profiler.phase("dump"): das.dump(ctx,step[1],targetDirectory)
+    elif step[0]=="fe" and not convertDirectory: #nothing in there to convert
         print("Extracting FE...")
-        das.dumpFE(dataDir,targetDirectory)
-else:
-    #New version with multiple cats split into install groups, seen in 2015 and later games.
-    #Appears to always use cas.cat and never use delta bundles, patch just replaces bundles fully.
-    dataDir=os.path.join(gameDirectory,"Data")
-    updateDir=os.path.join(gameDirectory,"Update")
-    patchDir=os.path.join(gameDirectory,"Patch")
-
-    #Detect cat version.
-    if tocLayout.getSubObject("installManifest").get("maxTotalSize")!=None:
-        readCat=cas.readCat3
-    else:
-        readCat=cas.readCat4
-
-    if os.path.isdir(updateDir):
-        #First, extract all DLCs.
-        for dir in os.listdir(updateDir):
-            print("Extracting DLC %s..." % dir)
-            dir=os.path.join(updateDir,dir,"Data")
-            findCats(dir,patchDir,readCat)
-            dumpRoot(dir,patchDir,targetDirectory)
-
-    #Now extract the base game.
-    print("Extracting main game...")
-    findCats(dataDir,patchDir,readCat)
-    dumpRoot(dataDir,patchDir,targetDirectory)
-
-if not os.path.isdir(targetDirectory):
+        with profiler.phase("dump"): das.dumpFE(step[1],targetDirectory)
+
+pipeline.wait()
+if not stats.totalEntries and not stats.skippedEntries and not checkpoint.doneBundles and not sharding.enabled:
     print("Nothing was extracted, did you set input path correctly?")
     sys.exit(1)
 
-print("Writing EBX GUID table...")
-ebx.writeGuidTable(targetDirectory)
-
-print ("Writing RES table...")
-res.writeResTable(targetDirectory)
+#The null sink keeps no files for the tables to point to.
+if writer.sinkName!="null":
+    print("Writing EBX GUID table...")
+    with stats.phase("tables"), profiler.phase("tables"): ebx.writeGuidTable(ctx,targetDirectory)
+
+    print ("Writing RES table...")
+    with stats.phase("tables"), profiler.phase("tables"): res.writeResTable(ctx,targetDirectory)
+
+if deferChunks:
+    deferred.finish()
+    writer.publish()
+    if deferChunks=="now":
+        print("Extracting deferred chunks...")
+        with profiler.phase("chunks"): deferred.extract(targetDirectory)
+        pipeline.wait()
+        deferred.remove(targetDirectory)
+    else:
+        print("The chunks are queued in %s, run extractchunks.py to extract them." % deferred.queueName)
+
+if convertDirectory:
+    convert.finish()
+    print("Converting assets...")
+    with profiler.phase("convert"): numAssets=convert.convertAssets(ctx,targetDirectory,convertDirectory)
+    pipeline.wait()
+    deferred.remove(targetDirectory)
+    print("Converted %d assets into %s" % (numAssets,convertDirectory))
+
+if selectEbx:
+    deferred.finish()
+    writer.publish()
+    print("Extracting what the selected ebx reference...")
+    with profiler.phase("closure"): numSelected, numLinked, submitted, left = closure.extract(ctx,targetDirectory,selectEbx)
+    pipeline.wait()
+    if not left: deferred.remove(targetDirectory)
+    print("%d selected ebx link to %d more, %d res and chunks extracted, %d left in %s" % (numSelected,numLinked,submitted,left,deferred.queueName))
+
+print("Writing dump statistics...")
+stats.writeReport(targetDirectory)
+checkpoint.finish()
+if sharding.enabled: sharding.finish(targetDirectory)
+writer.finish()
+profiler.finish()
+spill.closeStore()
 
 payload.zstdCleanup()
+mapped.closeFiles()
+iohints.closeFiles()
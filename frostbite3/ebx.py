@@ -4,42 +4,51 @@
 import os
 import copy
 from struct import unpack,pack
-import shutil
 import pickle
 from dbo import Guid
 import res
 import sbr
+import spill
+import packfile
+import locator
 
 def unpackLE(typ,data): return unpack("<"+typ,data)
 def unpackBE(typ,data): return unpack(">"+typ,data)
 
-guidTable=dict()
-parsedEbx=list()
-
-def addEbxGuid(path,ebxRoot):
-    if path in parsedEbx:
+def addEbxGuid(ctx,path,ebxRoot):
+    if path in ctx.parsedEbx:
         return
 
     #Add EBX GUID and name to the database.
     #Only parse primary instance since we just need Name field and there are some enormous EBX files.
-    dbx=Dbx(path,ebxRoot,True)
-    guidTable[dbx.fileGUID]=dbx.trueFilename
-    parsedEbx.append(path)
-
-def writeGuidTable(dumpFolder):
+    dbx=Dbx(None,path,ebxRoot,True)
+    ctx.guidTable[dbx.fileGUID]=dbx.trueFilename
+    ctx.parsedEbx.add(path)
+    return dbx.fileGUID, dbx.trueFilename
+
+def loadDbx(ctx,path,ebxRoot):
+    #Parse an ebx that a link points to, or take it from the cache of the context if it has one.
+    if ctx.dbxCache is None:
+        return Dbx(ctx,path,ebxRoot)
+    dbx=ctx.dbxCache.get((path,ebxRoot))
+    if dbx is None:
+        dbx=Dbx(ctx,path,ebxRoot)
+        ctx.dbxCache.put((path,ebxRoot),dbx,1)
+    return dbx
+
+def writeGuidTable(ctx,dumpFolder):
     f=open(os.path.join(dumpFolder,"guidTable.bin"),"wb")
-    pickle.dump(guidTable,f)
+    spill.dump(ctx.guidTable,f)
     f.close()
 
-def loadGuidTable(dumpFolder):
-    global guidTable
+def loadGuidTable(ctx,dumpFolder):
     path=os.path.join(dumpFolder,"guidTable.bin")
     if not os.path.isfile(path):
         print("WARNING: EBX GUID table is missing, it is required to properly parse links between different EBX files!")
         return
 
     f=open(path,"rb")
-    guidTable=pickle.load(f)
+    ctx.guidTable=pickle.load(f)
     f.close()
 
 def makeLongDirs(path):
@@ -173,7 +182,7 @@ class Field:
             extguid=dbx.externalGUIDs[self.value&0x7fffffff]
 
 ##            print guidTable[extguid[0]]
-            extDbx=Dbx(os.path.join(dbx.ebxRoot,guidTable[extguid[0]]+".ebx").lower(),dbx.ebxRoot)
+            extDbx=loadDbx(dbx.ctx,os.path.join(dbx.ebxRoot,dbx.ctx.guidTable[extguid[0]]+".ebx").lower(),dbx.ebxRoot)
             for guid, instance in extDbx.instances:
                 if guid==extguid[1]:
                     return instance
@@ -222,10 +231,16 @@ class FieldType:
 class Stub:
     pass
 
+#Primary instance types extractAssets turns into assets.
+assetTypes=("SoundWaveAsset","NewWaveAsset","LocalizedWaveAsset","HarmonySampleBankAsset","GinsuAsset","OctaneAsset",
+            "MovieTextureAsset","MovieTexture2Asset")
+
 
 class Dbx:
-    def __init__(self,path,ebxRoot,primOnly=False):
-        f=open2(path,"rb")
+    def __init__(self,ctx,path,ebxRoot,primOnly=False):
+        #ctx is the DumpContext with the tables of the dump the ebx belongs to, None if only the primary instance is read.
+        self.ctx=ctx
+        f=packfile.openFile(path)
 
         #metadata
         magic=f.read(4)
@@ -486,7 +501,7 @@ class Dbx:
                 towrite=""
                 if field.value>>31:
                     extguid=self.externalGUIDs[field.value&0x7fffffff]
-                    try: towrite=guidTable[extguid[0]]+"/"+extguid[1].format()
+                    try: towrite=self.ctx.guidTable[extguid[0]]+"/"+extguid[1].format()
                     except: towrite=extguid[0].format()+"/"+extguid[1].format()
                 elif field.value==0:
                     towrite="*nullGuid*"
@@ -528,8 +543,8 @@ class Dbx:
             elif typ==FieldType.ResourceRef:
                 resRid=field.value
                 towrite=" "+str(resRid)
-                if resRid in res.resTable:
-                    towrite+=" #"+res.resTable[resRid].name
+                if resRid in self.ctx.resTable:
+                    towrite+=" #"+self.ctx.resTable[resRid].name
                 self.writeField(f2,field,lvl,towrite)
 
             else:
@@ -541,6 +556,44 @@ class Dbx:
     def writeInstance(self,f,cmplx,text):
         f.write(cmplx.desc.name+" "+text+"\n")
 
+    def leafFields(self):
+        #Every field of the instances read so far that's neither a complex nor an array, array members included.
+        def walk(fields):
+            for field in fields:
+                if field.desc.getFieldType() in (FieldType.Void,FieldType.ValueType,FieldType.Array):
+                    yield from walk(field.value.fields)
+                else:
+                    yield field
+        for guid, instance in self.instances: yield from walk(instance.fields)
+
+    def chunkReferences(self):
+        #Ids of the chunks the instances read so far point at with a ChunkId or ChunkGuid field, in the order they appear.
+        ids=dict() #chunk id -> None, a dict keeps the order
+        for field in self.leafFields():
+            if field.desc.getFieldType()==FieldType.GUID and field.desc.name in ("ChunkId","ChunkGuid") and not field.value.isNull():
+                ids[field.value.format()]=None
+        return list(ids)
+
+    def resourceReferences(self):
+        #resRids of the res the instances read so far point at with a ResourceRef field, in the order they appear.
+        rids=dict() #resRid -> None, a dict keeps the order
+        for field in self.leafFields():
+            if field.desc.getFieldType()==FieldType.ResourceRef and field.value: rids[field.value]=None
+        return list(rids)
+
+    def newWaveResource(self):
+        #Name of the NewWaveResource with the variations of a NewWaveAsset, relative to the res folder. None if the RES table doesn't have it.
+        #Cache GUIDs for lookup the first time we encounter NewWaveAsset.
+        res.cacheNewWaveResources(self.ctx,self.bigEndian)
+
+        if self.prim.guid in self.ctx.newWaves:
+            return self.ctx.newWaves[self.prim.guid].getResFilename()
+        if len(self.ctx.resTable)!=0:
+            return None
+
+        #Attempt to fall back to simple name building for compatibility with scripts for newer layouts.
+        return self.trueFilename.lower()+".NewWaveResource"
+
     def extractAssets(self,chunkFolder,chunkFolder2,resFolder,outputFolder):
         self.chunkFolder=chunkFolder
         self.chunkFolder2=chunkFolder2
@@ -561,11 +614,8 @@ class Dbx:
             return None
 
         ChunkId=chnk.format()
-        chnkPath=os.path.join(self.chunkFolder,ChunkId+".chunk")
-        if os.path.isfile(chnkPath):
-            return chnkPath
-        chnkPath=os.path.join(self.chunkFolder2,ChunkId+".chunk")
-        if os.path.isfile(chnkPath):
+        chnkPath=locator.findChunk(self.chunkFolder,self.chunkFolder2,ChunkId)
+        if chnkPath:
             return chnkPath
 
         print("Chunk does not exist: "+ChunkId)
@@ -580,7 +630,7 @@ class Dbx:
         if totalChunks>1: target+=" "+str(idx)
         target+=ext
         makeLongDirs(target)
-        shutil.copyfile(currentChunkName,lp(target))
+        packfile.copyFile(currentChunkName,target)
 
     def extractSPS(self,f,offset,target):
         f.seek(offset)
@@ -653,25 +703,17 @@ class Dbx:
     def extractNewWaveAsset(self):
         print(self.trueFilename)
 
-        #Cache GUIDs for lookup the first time we encounter NewWaveAsset.
-        res.cacheNewWaveResources(self.bigEndian)
-
-        if self.prim.guid in res.newWaves:
-            resInfo=res.newWaves[self.prim.guid]
-            resPath=os.path.join(self.resFolder,resInfo.getResFilename())
-        else:
-            if len(res.resTable)!=0:
-                print("NewWaveResource not found in table for EBX: " + self.trueFilename)
-                return
-
-            #Attempt to fall back to simple name building for compatibility with scripts for newer layouts.
-            resPath=os.path.join(self.resFolder,self.trueFilename.lower()+".NewWaveResource")
+        resName=self.newWaveResource()
+        if not resName:
+            print("NewWaveResource not found in table for EBX: " + self.trueFilename)
+            return
 
-        if not os.path.isfile(lp(resPath)):
-            print("RES does not exist: " + os.path.relpath(resPath,self.resFolder))
+        resPath=locator.find(self.resFolder,resName)
+        if not resPath:
+            print("RES does not exist: " + os.path.normpath(resName))
             return
 
-        bank=sbr.Bank(lp(resPath))
+        bank=sbr.Bank(resPath)
         histogram=dict() #count the number of times each chunk is used by a variation to obtain the right index
 
         Chunks=[]
@@ -730,7 +772,7 @@ class Dbx:
                 if not currentChunkName:
                     continue #do NOT return, instead print the messages at the very end
 
-                f=open(currentChunkName,"rb")
+                f=packfile.openFile(currentChunkName)
                 ChunkHandles[Variation.ChunkId]=f
 
             for ijk in range(len(Variation.Segments)):
@@ -2,6 +2,9 @@ import os
 from struct import unpack,pack
 import ebx
 import res
+import profiler
+import packfile
+import context
 
 #Choose where you dumped the files and where to put the extracted assets.
 dumpDirectory   = r"E:\GameRips\NFS\NFSR\pc\dump"
@@ -28,13 +31,18 @@ chunkFolder2 = r"bundles\chunks" #if the chunk is not found in the first folder,
 
 ebxFolder,chunkFolder,chunkFolder2,resFolder = [os.path.join(dumpDirectory, path) for path in (ebxFolder, chunkFolder, chunkFolder2, resFolder)]
 inputFolder=os.path.join(ebxFolder,inputFolder)
+profiler.start(os.path.join(targetDirectory,"profile"),"ebxtoasset")
+ctx=context.DumpContext()
 
 print("Loading GUID table...")
-ebx.loadGuidTable(dumpDirectory)
+with profiler.phase("tables"): ebx.loadGuidTable(ctx,dumpDirectory)
 print ("Loading RES table...")
-res.loadResTable(dumpDirectory)
+with profiler.phase("tables"): res.loadResTable(ctx,dumpDirectory)
 
-for dir0, dirs, ff in os.walk(inputFolder):
-    for fname in ff:
-        dbx=ebx.Dbx(os.path.join(dir0,fname),ebxFolder)
-        dbx.extractAssets(chunkFolder,chunkFolder2,resFolder,targetDirectory)
+packfile.mount(dumpDirectory) #if the dump was written to a pack, read from it
+
+for path in packfile.walk(inputFolder):
+    with profiler.phase("parse"): dbx=ebx.Dbx(ctx,path,ebxFolder)
+    with profiler.phase("extract"): dbx.extractAssets(chunkFolder,chunkFolder2,resFolder,targetDirectory)
+
+profiler.finish()
@@ -3,6 +3,9 @@ from struct import unpack,pack
 import ebx
 import res
 import sys
+import profiler
+import packfile
+import context
 
 #Choose where you dumped the files and where to put the resulting TXT files.
 dumpDirectory   = r"E:\GameRips\NFS\NFSR\pc\dump"
@@ -16,23 +19,28 @@ ebxFolder       = r"bundles\ebx" #relative to the dumpDirectory
 
 ebxFolder   = os.path.join(dumpDirectory,ebxFolder)
 inputFolder = os.path.join(ebxFolder,inputFolder)
+profiler.start(os.path.join(targetDirectory,"profile"),"ebxtotext")
+ctx=context.DumpContext()
 
 if len(sys.argv)>1:
     for fname in sys.argv:
         if fname[-4:]!=".ebx" or not os.path.isfile(fname):
             continue
 
-        dbx=ebx.Dbx(fname,"")
+        with profiler.phase("parse"): dbx=ebx.Dbx(ctx,fname,"")
         outName=fname[:-4]+".txt"
-        dbx.dump(outName)
+        with profiler.phase("dump"): dbx.dump(outName)
 else:
     print("Loading GUID table...")
-    ebx.loadGuidTable(dumpDirectory)
+    with profiler.phase("tables"): ebx.loadGuidTable(ctx,dumpDirectory)
     print ("Loading RES table...")
-    res.loadResTable(dumpDirectory)
+    with profiler.phase("tables"): res.loadResTable(ctx,dumpDirectory)
 
-    for dir0, dirs, ff in os.walk(inputFolder):
-        for fname in ff:
-            dbx=ebx.Dbx(os.path.join(dir0,fname),ebxFolder)
-            outName=os.path.join(targetDirectory,dbx.trueFilename+".txt")
-            dbx.dump(outName)
+    packfile.mount(dumpDirectory) #if the dump was written to a pack, read from it
+
+    for path in packfile.walk(inputFolder):
+        with profiler.phase("parse"): dbx=ebx.Dbx(ctx,path,ebxFolder)
+        outName=os.path.join(targetDirectory,dbx.trueFilename+".txt")
+        with profiler.phase("dump"): dbx.dump(outName)
+
+profiler.finish()
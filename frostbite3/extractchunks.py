@@ -0,0 +1,74 @@
+#Extracts the chunks a metadata-first dump (deferChunks in dumper.py) left in deferredChunks.bin, all of them or only the ones asked for,
+#e.g. the chunks the ebx someone is working on need. They're written just like the dumper would have (same output sink and compression).
+#Chunks that exist already are skipped, so it can be run as often as needed. Once every chunk is extracted, the queue is removed.
+import payload
+import deferred
+import writer
+import pipeline
+import stats
+import mapped
+import iohints
+import os
+import sys
+
+#Adjust paths here.
+
+dumpDirectory = r"E:\GameRips\NFS\NFSR\pc\dump"
+
+#Chunk ids to extract, leave the list empty to extract all chunks. A file with one chunk id per line can be given as well, prefixed with @.
+chunkIds = []
+
+#Number of threads that read and decompress the chunks, see dumper.py.
+workerThreads = 4
+
+#####################################
+#####################################
+
+def wantedIds(args):
+    #Lowercase chunk ids from the arguments and the files they name.
+    wanted=set()
+    for arg in args:
+        if arg[:1]=="@":
+            f=open(arg[1:],"r")
+            wanted.update(line.strip().lower() for line in f if line.strip())
+            f.close()
+        else:
+            wanted.add(arg.lower())
+    return wanted
+
+#Paths can also be passed on the command line: extractchunks.py [dumpDirectory [chunkId or @listFile ...]]
+if len(sys.argv)>1: dumpDirectory=sys.argv[1]
+if len(sys.argv)>2: chunkIds=sys.argv[2:]
+
+dumpDirectory=os.path.normpath(dumpDirectory)
+queuePath=os.path.join(dumpDirectory,deferred.queueName)
+if not os.path.isfile(queuePath):
+    print("%s has no deferred chunks." % dumpDirectory)
+    sys.exit(0)
+settings, records, outside = deferred.readQueue(dumpDirectory)
+if outside: print("%d deferred chunks are queued for a path outside of %s, they can't be extracted." % (outside,dumpDirectory))
+
+payload.zstdInit()
+writer.compressLevel=settings["compressLevel"]
+iohints.enabled=True
+writer.start(dumpDirectory,settings["outputSink"])
+pipeline.start(workerThreads)
+
+wanted=wantedIds(chunkIds) if chunkIds else None
+print("Extracting %s of %d deferred chunks..." % ("%d" % len(wanted) if wanted is not None else "all",len(records)))
+submitted, left = deferred.extract(dumpDirectory,wanted)
+pipeline.wait()
+writer.finish()
+stats.progress()
+
+#Requested chunks that aren't in the queue, e.g. typos or chunks of another dump.
+if wanted is not None:
+    missing=wanted-set(os.path.basename(record[0])[:-6].lower() for record in records)
+    for chunkId in sorted(missing): print("Not a deferred chunk: %s" % chunkId)
+if not left:
+    deferred.remove(dumpDirectory)
+print("Extracted %d chunks (%.1f MB), %d skipped, %d still deferred" % (submitted,stats.totalBytesOut/1048576,stats.skippedEntries,left))
+
+payload.zstdCleanup()
+mapped.closeFiles()
+iohints.closeFiles()
@@ -0,0 +1,70 @@
+#Page cache hints for the archives the dumper streams through. A dump reads every cas and sb front to back exactly once,
+#but the kernel keeps all of it cached anyway and pushes out what is read again (the tables, the ebx behind the GUID table,
+#and everything else running on the box). So when a payload is submitted, the start of its range is read ahead (WILLNEED)
+#while the workers are still busy with the payloads before it, and once it's written, the range is dropped from the cache
+#(DONTNEED) and from the mapping if the file is mapped, see mapped.py. The files are marked SEQUENTIAL too, which doubles the kernel's own readahead.
+#This needs os.posix_fadvise (Linux and most other unixes), everywhere else the functions here do nothing.
+import mmap
+import os
+import threading
+
+enabled=False #the dumper turns it on, tools that read the same payloads more than once are better off with the cache
+readaheadSize=8<<20 #bytes at the start of a payload that are read ahead when it's submitted, the kernel's readahead takes care of the rest
+supported=hasattr(os,"posix_fadvise")
+
+fds=dict() #path -> file descriptor the hints are given on, or None if the file couldn't be opened
+lock=threading.Lock()
+
+def fileDescriptor(path):
+    fd=fds.get(path)
+    if fd is not None or path in fds: return fd
+    with lock:
+        if path not in fds:
+            try:
+                fd=os.open(path,os.O_RDONLY)
+                os.posix_fadvise(fd,0,0,os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                fd=None
+            fds[path]=fd
+        return fds[path]
+
+def willNeed(path,offset,size):
+    #A payload at offset in path was submitted, start reading it in the background.
+    if not (enabled and supported): return
+    fd=fileDescriptor(path)
+    if fd is None: return
+    os.posix_fadvise(fd,offset,min(size,readaheadSize),os.POSIX_FADV_WILLNEED)
+
+def dontNeed(path,offset,size,data=None):
+    #The payload at offset in path is written (see pipeline.afterWrite), data is the mapping of the file if it was read from one.
+    #The payloads are read in file order, so the page the payload shares with the one before it is dropped as well
+    #and the page it shares with the next one is kept.
+    if not (enabled and supported): return
+    fd=fileDescriptor(path)
+    if fd is None: return
+    start=offset-offset%mmap.PAGESIZE
+    end=offset+size-(offset+size)%mmap.PAGESIZE
+    if end<=start: return
+    if data is not None and hasattr(mmap,"MADV_DONTNEED"):
+        #Pages that are still mapped stay in the cache no matter what fadvise says. Nothing is ever written to the
+        #copy-on-write mapping, so anything that reads these pages again simply gets them from the file.
+        try: data.madvise(mmap.MADV_DONTNEED,start,end-start)
+        except (OSError,ValueError): pass #closed in the meantime
+    os.posix_fadvise(fd,start,end-start,os.POSIX_FADV_DONTNEED)
+
+def dropFile(path):
+    #Everything in path has been read, e.g. the manifests of an sb once its toc is done.
+    if not (enabled and supported): return
+    fd=fileDescriptor(path)
+    if fd is not None: os.posix_fadvise(fd,0,0,os.POSIX_FADV_DONTNEED)
+
+def closeFile(path):
+    #The file is about to be deleted or replaced, don't keep it open.
+    with lock: fd=fds.pop(path,None)
+    if fd is not None: os.close(fd)
+
+def closeFiles():
+    with lock:
+        for fd in fds.values():
+            if fd is not None: os.close(fd)
+        fds.clear()
@@ -0,0 +1,166 @@
+#The layout of an install: which cats and tocs there are, in which order they're gone through, which bundles of a toc count
+#and where each payload ends up in the dump. The dumper and manifest.py (the analyzer, diff and the shard plans) both walk
+#an install with the functions here, so they can't disagree about what a dump contains.
+import dbo
+import noncas
+import cas
+import res
+import os
+
+def walk(gameDirectory):
+    #The steps of going through an install, in order:
+    #  ("cat", readCat, path, description) - read the cat at path with readCat before the tocs that follow
+    #  ("dal", path)                       - read the das.dal of NFS: Edge at path
+    #  ("root", description)               - the DLC or main game the tocs that follow belong to
+    #  ("toc", tocPath, baseTocPath)       - a superbundle, baseTocPath is the unpatched toc if tocPath is in the patch folder
+    #  ("dasToc", tocPath)                 - a superbundle of NFS: Edge
+    #  ("fe", dataDir)                     - the FrontEnd DAS files of NFS: Edge
+    tocLayout=dbo.readToc(os.path.join(gameDirectory,"Data","layout.toc"))
+    dataDir=os.path.join(gameDirectory,"Data")
+    updateDir=os.path.join(gameDirectory,"Update")
+
+    if not tocLayout.getSubObject("installManifest") or \
+        not tocLayout.getSubObject("installManifest").getSubObject("installChunks"):
+        if not os.path.isfile(os.path.join(dataDir,"das.dal")):
+            #Old layout similar to Frostbite 2 with a single cas.cat.
+            #Can also be non-cas.
+            patchDir=os.path.join(updateDir,"Patch","Data")
+            if not tocLayout.getSubObject("installManifest"):
+                readCat=cas.readCat1
+            else:
+                readCat=cas.readCat2 #Star Wars: Battlefront Beta
+
+            catPath=os.path.join(dataDir,"cas.cat") #Seems to always be in the same place.
+            if os.path.isfile(catPath):
+                yield ("cat",readCat,catPath,"cat entries")
+                patchedCat=os.path.join(patchDir,"cas.cat")
+                if os.path.isfile(patchedCat): yield ("cat",readCat,patchedCat,"patched cat entries")
+
+            if os.path.isdir(updateDir):
+                #First, all DLCs.
+                for dir in os.listdir(updateDir):
+                    if dir=="Patch": continue
+                    yield ("root","DLC %s" % dir)
+                    yield from tocs(os.path.join(updateDir,dir,"Data"),patchDir)
+
+            yield ("root","main game")
+            yield from tocs(dataDir,patchDir)
+        else:
+            #Special case for Need for Speed: Edge. Same as early FB3 but uses das.dal instead of cas.cat.
+            yield ("dal",os.path.join(dataDir,"das.dal"))
+            yield ("root","main game")
+            for dir0, dirs, ff in os.walk(dataDir):
+                for fname in ff:
+                    if fname[-4:]==".toc": yield ("dasToc",os.path.join(dir0,fname))
+            yield ("fe",dataDir)
+    else:
+        #New version with multiple cats split into install groups, seen in 2015 and later games.
+        #Appears to always use cas.cat and never use delta bundles, patch just replaces bundles fully.
+        patchDir=os.path.join(gameDirectory,"Patch")
+        if tocLayout.getSubObject("installManifest").get("maxTotalSize")!=None:
+            readCat=cas.readCat3
+        else:
+            readCat=cas.readCat4
+
+        if os.path.isdir(updateDir):
+            #First, all DLCs.
+            for dir in os.listdir(updateDir):
+                yield ("root","DLC %s" % dir)
+                dir=os.path.join(updateDir,dir,"Data")
+                yield from cats(dir,patchDir,readCat)
+                yield from tocs(dir,patchDir)
+
+        yield ("root","main game")
+        yield from cats(dataDir,patchDir,readCat)
+        yield from tocs(dataDir,patchDir)
+
+def cats(dataDir,patchDir,readCat):
+    #All cats in the specified directory, each followed by its patched version if there is one.
+    for dir0, dirs, ff in os.walk(dataDir):
+        for fname in ff:
+            if fname=="cas.cat":
+                fname=os.path.join(dir0,fname)
+                localPath=os.path.relpath(fname,dataDir)
+                yield ("cat",readCat,fname,localPath)
+                patchedName=os.path.join(patchDir,localPath)
+                if os.path.isfile(patchedName): yield ("cat",readCat,patchedName,"patched "+localPath)
+
+def tocs(dataDir,patchDir):
+    #All tocs in the specified directory. A patched version goes first, the unpatched toc is its base.
+    for dir0, dirs, ff in os.walk(dataDir):
+        for fname in ff:
+            if fname[-4:]==".toc":
+                fname=os.path.join(dir0,fname)
+                patchedName=os.path.join(patchDir,os.path.relpath(fname,dataDir))
+                if os.path.isfile(patchedName): yield ("toc",patchedName,fname)
+                yield ("toc",fname,None)
+
+def folders(outPath):
+    #Where the payloads go: (toc chunks, bundle ebx, bundle res, bundle chunks).
+    bundlePath=os.path.join(outPath,"bundles")
+    return (os.path.join(outPath,"chunks"),os.path.join(bundlePath,"ebx"),os.path.join(bundlePath,"res"),os.path.join(bundlePath,"chunks"))
+
+def isCas(toc):
+    #The payloads of a cas toc are in the cas archives, found through the cats (or the dal for NFS: Edge).
+    return bool(toc.get("cas") or toc.get("das"))
+
+def bundles(toc):
+    #(id, offset in the sb, delta flag) of the bundles of a toc that are extracted. Base bundles are left out,
+    #they just state that the unpatched bundle is used, which is alright as the user needs to dump the unpatched files anyway.
+    #The bundles of NFS: Edge are known by their offset.
+    if toc.get("das"):
+        return [(offset.content,offset.content,False) for offset in toc.getSubObject("bundles").get("offsets")]
+    return [(tocEntry.get("id"),tocEntry.get("offset"),bool(tocEntry.get("delta"))) for tocEntry in toc.get("bundles") if not tocEntry.get("base")]
+
+def readBundle(toc,tocPath,baseTocPath,sb,bundleId,offset,delta):
+    #The manifest of a bundle and the archives a noncas bundle's payloads are in (None for cas).
+    sb.seek(offset)
+    if isCas(toc):
+        return dbo.DbObject(sb), None
+    sbPath=tocPath[:-3]+"sb"
+    if not delta:
+        return noncas.unpatchedBundle(sb), sbPath
+
+    #The sb currently points at the delta file. Read the unpatched toc of the same name to get the base bundle.
+    baseToc=dbo.DbObject(dbo.unXor(baseTocPath))
+    for baseTocEntry in baseToc.get("bundles"):
+        if baseTocEntry.get("id").lower() == bundleId.lower():
+            break
+    else: #if no base bundle has with this name has been found:
+        pass #use the last base bundle. This is okay because it is actually not used at all (the delta has uses instructionType 3 only).
+    basePath=baseTocPath[:-3]+"sb"
+    base=open(basePath,"rb")
+    base.seek(baseTocEntry.get("offset"))
+    bundle=noncas.patchedBundle(base,sb) #create a patched bundle using base and delta
+    base.close()
+    return bundle, [basePath,sbPath] #base, delta
+
+def payloads(toc,bundle,outFolders,order=None):
+    #(kind, target path, entry) of every payload of a bundle read with readBundle: the ebx, res and chunks in that order.
+    #order(entries,key) may reorder the ebx and the res, e.g. writer.inDirectoryOrder.
+    if order is None: order=lambda entries, key: entries
+    chunkPathToc, ebxPath, resPath, chunkPath = outFolders
+    if isCas(toc):
+        for entry in order(bundle.get("ebx",list()),lambda entry: entry.get("name")): #name sha1 size originalSize
+            yield "ebx", os.path.join(ebxPath,entry.get("name")+".ebx"), entry
+        for entry in order(bundle.get("res",list()),lambda entry: entry.get("name")): #name sha1 size originalSize resRid resType resMeta
+            yield "res", os.path.join(resPath,entry.get("name")+res.getResExt(entry.get("resType"))), entry
+        for entry in bundle.get("chunks",list()): #id sha1 size logicalOffset logicalSize chunkMeta::h32 chunkMeta::meta
+            yield "chunks", os.path.join(chunkPath,entry.get("id").format()+".chunk"), entry
+    else:
+        for entry in order(bundle.ebx,lambda entry: entry.name):
+            yield "ebx", os.path.join(ebxPath,entry.name+".ebx"), entry
+        for entry in order(bundle.res,lambda entry: entry.name):
+            yield "res", os.path.join(resPath,entry.name+res.getResExt(entry.resType)), entry
+        for entry in bundle.chunks:
+            yield "chunks", os.path.join(chunkPath,entry.id.format()+".chunk"), entry
+
+def resInfo(toc,entry):
+    #(resRid, name, resType, resMeta) of a res entry yielded by payloads, for the RES table.
+    if isCas(toc): return entry.get("resRid"), entry.get("name"), entry.get("resType"), entry.get("resMeta")
+    return entry.resRid, entry.name, entry.resType, entry.resMeta
+
+def tocChunks(toc,outFolders):
+    #(target path, entry) of the chunks defined directly in the toc. These chunks do NOT know their originalSize.
+    for entry in toc.get("chunks"): #id sha1 for cas, id offset size for noncas
+        yield os.path.join(outFolders[0],entry.get("id").format()+".chunk"), entry
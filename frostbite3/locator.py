@@ -0,0 +1,29 @@
+#Where the dumped chunks and res files are. Asset extraction looks up every chunk and res an ebx references, once per ebx,
+#and used to check one or two paths on the disk (or in the pack) for each of them. Instead, each folder is listed once,
+#with a single walk of the disk or of the pack index, and later lookups are dict lookups.
+#Names are compared without case, like the pack index and the file systems the dumps are usually written to do.
+import packfile
+import os
+
+folders=dict() #folder -> {lowercase path relative to the folder with forward slashes: full path}
+
+def folderIndex(folder):
+    index=folders.get(folder)
+    if index is None:
+        index=folders[folder]=dict()
+        start=len(os.path.join(folder,""))
+        for path in packfile.walk(folder):
+            index[path[start:].replace("\\","/").lower()]=path
+    return index
+
+def find(folder,name):
+    #Full path of a dumped file, name being relative to the folder. None if it wasn't dumped.
+    return folderIndex(folder).get(name.replace("\\","/").lower())
+
+def findChunk(chunkFolder,chunkFolder2,chunkId):
+    #Toc chunks first, the bundle chunks only if the toc has none with that id.
+    return find(chunkFolder,chunkId+".chunk") or find(chunkFolder2,chunkId+".chunk")
+
+def reset():
+    #The dump changed or another one was mounted.
+    folders.clear()
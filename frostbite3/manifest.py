@@ -0,0 +1,104 @@
+#The entries of an install as the dumper sees them, from layout.toc, the cats and the toc/sb manifests alone. Nothing is decompressed.
+#entries() goes through the install with the same walk as the dumper (see layout.py) and yields an Entry for every
+#ebx, res and chunk of every bundle and toc. Entries with the same output path are all yielded, the dumper only extracts the first one.
+#Used by the analyzer, by diff, which can also save the entries to a text file and compare a later install against that, and to plan sharded dumps (see sharding.py).
+import dbo
+import das
+import layout
+import res
+import context
+import os
+
+class Entry:
+    __slots__=("sb","bundle","kind","path","sha1","size","originalSize","source","offset","patched","missing")
+    def __init__(self,sb,kind,path,sha1,size,originalSize,source=None,offset=0,patched=False,missing=False,bundle=None):
+        self.sb=sb #toc path
+        self.bundle=bundle #id of the bundle (its offset in the sb for NFS: Edge), None for toc chunks
+        self.kind=kind #ebx, res, chunks (in bundles) or tocChunks
+        self.path=path #output path relative to the dump folder, always with forward slashes
+        self.sha1=sha1 #None for noncas toc chunks, which don't have one
+        self.size=size #stored bytes; for patched payloads only the delta
+        self.originalSize=originalSize #None for toc chunks, which don't know it
+        self.source=source #archive the blocks are in, None if the payload is patched or missing
+        self.offset=offset
+        self.patched=patched
+        self.missing=missing #not in any cat, e.g. from a language that isn't installed
+
+def casEntry(ctx,sb,kind,path,entry,originalSize,bundleId=None):
+    #Same choice as payload.casBundlePayload and casPatchedBundlePayload.
+    if entry.get("casPatchType")==2:
+        catDelta=ctx.catDict[entry.get("deltaSha1")]
+        return Entry(sb,kind,path,entry.get("sha1"),catDelta.size,originalSize,patched=True,bundle=bundleId)
+    sha1=entry.get("sha1")
+    if sha1 not in ctx.catDict:
+        return Entry(sb,kind,path,sha1,0,originalSize,missing=True,bundle=bundleId)
+    catEntry=ctx.catDict[sha1]
+    return Entry(sb,kind,path,sha1,catEntry.size,originalSize,catEntry.path,catEntry.offset,bundle=bundleId)
+
+def superbundleEntries(ctx,tocPath,baseTocPath):
+    #The counterpart of dumper.dump (and das.dump).
+    toc=dbo.DbObject(dbo.unXor(tocPath))
+    if not (toc.get("bundles") or toc.get("chunks")): return
+
+    sbPath=tocPath[:-3]+"sb"
+    sb=open(sbPath,"rb")
+    outFolders=layout.folders("")
+    casToc=layout.isCas(toc)
+
+    for bundleId, offset, delta in layout.bundles(toc):
+        bundle, sourcePath = layout.readBundle(toc,tocPath,baseTocPath,sb,bundleId,offset,delta)
+        for kind, path, entry in layout.payloads(toc,bundle,outFolders):
+            path=path.replace("\\","/")
+            if casToc:
+                originalSize=entry.get("logicalOffset")+entry.get("logicalSize") if kind=="chunks" else entry.get("originalSize")
+                yield casEntry(ctx,tocPath,kind,path,entry,originalSize,bundleId)
+            elif delta:
+                yield Entry(tocPath,kind,path,entry.sha1,entry.deltaSize,entry.originalSize,patched=True,bundle=bundleId)
+            else:
+                yield Entry(tocPath,kind,path,entry.sha1,entry.size,entry.originalSize,sourcePath,entry.offset,bundle=bundleId)
+
+    #Chunks defined directly in the toc, these don't know their originalSize.
+    for path, entry in layout.tocChunks(toc,outFolders):
+        path=path.replace("\\","/")
+        if casToc:
+            yield casEntry(ctx,tocPath,"tocChunks",path,entry,None)
+        else:
+            yield Entry(tocPath,"tocChunks",path,None,entry.get("size"),None,sbPath,entry.get("offset"))
+    sb.close()
+
+def entries(gameDirectory):
+    #All entries of an install, in the order of layout.walk like the dumper. The cats are read into a context of its own.
+    ctx=context.ExtractionContext()
+    if not res.resTypes: res.loadResNames()
+    for step in layout.walk(gameDirectory):
+        if step[0]=="cat":
+            readCat, catPath, description = step[1:]
+            print("Reading %s..." % description)
+            readCat(ctx,catPath)
+        elif step[0]=="dal":
+            print("Reading dal entries...")
+            das.readDal(ctx,step[1])
+        elif step[0]=="root":
+            print("Reading %s..." % step[1])
+        elif step[0]=="toc":
+            yield from superbundleEntries(ctx,step[1],step[2])
+        elif step[0]=="dasToc":
+            yield from superbundleEntries(ctx,step[1],None)
+        #The FrontEnd DAS files are left out.
+
+def saveManifest(entryList,path):
+    #One line per entry: kind, output path, SHA1 (or -), stored size, original size (or -), separated by tabs.
+    f=open(path,"w",encoding="utf-8")
+    f.write("#kind\tpath\tsha1\tsize\toriginalSize\n")
+    for entry in entryList:
+        f.write("%s\t%s\t%s\t%d\t%s\n" % (entry.kind,entry.path,entry.sha1.hex() if entry.sha1 else "-",entry.size,
+                                          "-" if entry.originalSize is None else entry.originalSize))
+    f.close()
+
+def loadManifest(path):
+    f=open(path,"r",encoding="utf-8")
+    for line in f:
+        if line[:1]=="#": continue
+        kind, name, sha1, size, originalSize = line.rstrip("\n").split("\t")
+        yield Entry(path,kind,name,None if sha1=="-" else bytes.fromhex(sha1),int(size),None if originalSize=="-" else int(originalSize))
+    f.close()
@@ -0,0 +1,41 @@
+#Memory-mapped game archives. Every cas and sb file the payloads come from is mapped once per run and stays mapped,
+#the payload readers then take their blocks straight from the mapping instead of reading each one into a new bytes object.
+#The mappings are copy-on-write (ACCESS_COPY) although nothing is ever written to them, because ctypes only hands out
+#pointers into writable buffers. Pages that aren't written to cost nothing extra.
+#If a file can't be mapped (empty, no address space or commit left), its payloads are read as before.
+import mmap
+import threading
+
+enabled=True
+
+maps=dict() #path -> mmap, or None if the file couldn't be mapped
+lock=threading.Lock()
+
+def mapFile(path):
+    #Mapping of the whole file, or None to read it the usual way.
+    if not enabled: return None
+    data=maps.get(path)
+    if data is not None or path in maps: return data
+    with lock:
+        if path not in maps:
+            try:
+                f=open(path,"rb")
+                try: maps[path]=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_COPY)
+                finally: f.close()
+            except (OSError,ValueError):
+                maps[path]=None
+        return maps[path]
+
+def closeFile(path):
+    #Unmap a file that is about to be deleted or replaced, Windows can't remove mapped files.
+    with lock: data=maps.pop(path,None)
+    if data is None: return
+    try: data.close()
+    except BufferError: pass
+
+def closeFiles():
+    for data in maps.values():
+        if data is None: continue
+        try: data.close()
+        except BufferError: pass #something still holds a view, the mapping goes away with it
+    maps.clear()
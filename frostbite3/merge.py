@@ -0,0 +1,143 @@
+#Puts the dump folders of the shards of a sharded dump (see shard in dumper.py) together into one dump.
+#The extracted files are moved (or copied) into the target directory and the partial EBX GUID and RES tables of the shards
+#are combined into the usual guidTable.bin and resTable.bin, so ebxtotext and ebxtoasset can't tell it from a dump made in one go.
+#All shards of the plan have to be finished. The target directory may be the dump folder of one of the shards, its files then stay where they are.
+#A summary of the shards is written to shards.json in the target directory.
+import context
+import ebx
+import res
+import packfile
+import sharding
+import os
+import json
+import shutil
+import sys
+
+#Adjust paths here.
+
+targetDirectory  = r"E:\GameRips\NFS\NFSR\pc\dump"
+shardDirectories = [r"E:\GameRips\NFS\NFSR\pc\dump-0", r"E:\GameRips\NFS\NFSR\pc\dump-1"]
+
+#Copy the files instead of moving them, so the shard folders stay intact.
+copyFiles = False
+
+#####################################
+#####################################
+
+payloadFolders=("bundles","chunks") #the folders of a dump the extracted files are in, the rest are tables and logs
+
+def loadShards(folders):
+    #The plan of every shard, checked to be complete and from the same plan.
+    shards=list()
+    for folder in folders:
+        plan=sharding.loadPlan(folder)
+        if not plan: raise Exception("%s is not the dump folder of a shard." % folder)
+        if not plan["finished"]: raise Exception("Shard %d/%d in %s isn't finished yet." % (plan["shard"],plan["count"],folder))
+        shards.append((plan,folder))
+    shards.sort(key=lambda shard: shard[0]["shard"])
+
+    plan=shards[0][0]
+    if any(other["plan"]!=plan["plan"] or other["count"]!=plan["count"] for other, folder in shards):
+        raise Exception("The shards were dumped from different installs or with a different number of shards.")
+    found=[other["shard"] for other, folder in shards]
+    if found!=list(range(plan["count"])):
+        raise Exception("Need shards 0 to %d exactly once, got %s." % (plan["count"]-1,", ".join(str(i) for i in found)))
+    return shards
+
+def mergeFolder(folder,target):
+    #Move the loose files of a shard into the target. Returns the number of files and of files the target had already.
+    numFiles=duplicates=0
+    for payloadFolder in payloadFolders:
+        for dir0, dirs, ff in os.walk(os.path.join(folder,payloadFolder)):
+            for fname in ff:
+                path=os.path.join(dir0,fname)
+                targetPath=os.path.join(target,os.path.relpath(path,folder))
+                if os.path.isfile(packfile.lp(targetPath)):
+                    duplicates+=1
+                    continue
+                os.makedirs(packfile.lp(os.path.dirname(targetPath)),exist_ok=True)
+                if copyFiles: shutil.copyfile(packfile.lp(path),packfile.lp(targetPath))
+                else: shutil.move(packfile.lp(path),packfile.lp(targetPath)) #a rename unless the folders are on different drives
+                numFiles+=1
+    return numFiles, duplicates
+
+def mergePack(folder,pack):
+    #Append the records of a shard's pack to the target pack, as they are (recompressed files stay compressed).
+    reader=packfile.PackReader(folder)
+    numFiles=duplicates=0
+    for name in reader.names(""):
+        targetPath=os.path.join(pack.root,name.replace("/",os.sep))
+        if pack.find(targetPath):
+            duplicates+=1
+            continue
+        offset, size = reader.find(os.path.join(folder,name.replace("/",os.sep)))
+        blocks=(reader.read(offset+pos,min(1<<20,size-pos)) for pos in range(0,size,1<<20))
+        pack.add(targetPath,blocks,size)
+        numFiles+=1
+    reader.pack.close()
+    reader.map.close()
+    return numFiles, duplicates
+
+def mergeTables(shards,target):
+    #The tables of the shards in shard order. Every GUID and RES entry comes from the bundles of one shard only,
+    #unless two bundles in different shards define the same one.
+    ctx=context.ExtractionContext()
+    for plan, folder in shards:
+        part=context.DumpContext()
+        ebx.loadGuidTable(part,folder)
+        res.loadResTable(part,folder)
+        ctx.guidTable.update(part.guidTable)
+        ctx.resTable.update(part.resTable)
+        unknownPath=os.path.join(folder,"unknownResTypes.txt")
+        if os.path.isfile(unknownPath):
+            f=open(unknownPath,"r")
+            for line in f:
+                typ=int(line,16)
+                if typ not in ctx.unkResTypes: ctx.unkResTypes.append(typ)
+            f.close()
+    ebx.writeGuidTable(ctx,target)
+    res.writeResTable(ctx,target)
+    return ctx
+
+def readStats(folder):
+    path=os.path.join(folder,"dumpStats.json")
+    if not os.path.isfile(path): return dict()
+    f=open(path,"r")
+    dumpStats=json.load(f)
+    f.close()
+    return {key: dumpStats.get(key) for key in ("entries","bytesIn","bytesOut","elapsed")}
+
+#Paths can also be passed on the command line: merge.py targetDirectory shardDirectory...
+if len(sys.argv)>1: targetDirectory=sys.argv[1]
+if len(sys.argv)>2: shardDirectories=sys.argv[2:]
+
+targetDirectory=os.path.abspath(os.path.normpath(targetDirectory))
+shards=loadShards([os.path.abspath(os.path.normpath(folder)) for folder in shardDirectories])
+packs=[os.path.isfile(os.path.join(folder,packfile.indexName)) for plan, folder in shards]
+if any(packs) and not all(packs): raise Exception("Either all shards or none of them have to be dumped into a pack.")
+os.makedirs(targetDirectory,exist_ok=True)
+
+pack=packfile.PackWriter(targetDirectory) if all(packs) else None
+summary=list()
+for plan, folder in shards:
+    print("Merging shard %d/%d from %s..." % (plan["shard"],plan["count"],folder))
+    if os.path.normcase(folder)==os.path.normcase(targetDirectory): numFiles, duplicates = 0, 0 #already in place
+    elif pack: numFiles, duplicates = mergePack(folder,pack)
+    else: numFiles, duplicates = mergeFolder(folder,targetDirectory)
+    shardSummary={"shard":plan["shard"],"folder":folder,"units":plan["units"],"weight":plan["weight"],"files":numFiles,"duplicates":duplicates}
+    shardSummary.update(readStats(folder))
+    summary.append(shardSummary)
+if pack: pack.finish()
+
+print("Merging EBX GUID and RES tables...")
+ctx=mergeTables(shards,targetDirectory)
+
+#The target is a complete dump now, not a shard anymore.
+planPath=os.path.join(targetDirectory,sharding.planName)
+if os.path.isfile(planPath): os.remove(planPath)
+f=open(os.path.join(targetDirectory,"shards.json"),"w")
+json.dump({"plan":shards[0][0]["plan"],"count":len(shards),"shards":summary},f,indent=1)
+f.close()
+
+print("Merged %d shards: %d files merged, %d duplicates, %d EBX GUIDs, %d RES entries" % (len(shards),sum(shard["files"] for shard in summary),
+      sum(shard["duplicates"] for shard in summary),len(ctx.guidTable),len(ctx.resTable)))
@@ -185,7 +185,7 @@ class Bundle: #noncas, read metadata only and seek to the start of the payload s
         metaOffset=f.tell()
         self.header=Header(unpack(">8I",f.read(32)))
         if self.header.magic!=0x9D798ED5: raise Exception("Wrong noncas bundle header magic.")
-        sha1List=[f.read(20) for i in range(self.header.totalCount)] #one sha1 for each ebx+res+chunk. Not necessary for extraction
+        sha1List=[f.read(20) for i in range(self.header.totalCount)] #one sha1 for each ebx+res+chunk
         self.ebx=[BundleEntry(unpack(">2I",f.read(8))) for i in range(self.header.ebxCount)]
         self.res=[BundleEntry(unpack(">2I",f.read(8))) for i in range(self.header.resCount)]
 
@@ -211,9 +211,7 @@ class Bundle: #noncas, read metadata only and seek to the start of the payload s
             
         self.entries=self.ebx+self.res+self.chunks
         f.seek(metaOffset+metaSize) #go to the start of the payload section
-##        #optional: attach sha1s to entries
-##        for i in range(len(self.entries)):
-##            self.entries[i].sha1=sha1List[i]
+        for entry, sha1 in zip(self.entries,sha1List): entry.sha1=sha1 #not necessary for extraction, the analyzer counts duplicates with them
     
 class Header: #8 uint32
     def __init__(self,values):
@@ -1,9 +1,16 @@
-import cas
 import os
 import io
-from struct import pack,unpack
+from struct import pack,unpack,unpack_from
 import ctypes
 import zlib
+import stats
+import pipeline
+import writer
+import mapped
+import iohints
+import sharding
+import deferred
+import convert
 
 liblz4 = ctypes.cdll.LoadLibrary(r"..\thirdparty\liblz4")
 libzstd = ctypes.cdll.LoadLibrary(r"..\thirdparty\libzstd")
@@ -47,7 +54,9 @@ def readBlockHeader(f):
     #8 bits: compression type
     #4 bits: always 7?
     #20 bits: compressed size
-    num1, num2 = unpack(">II",f.read(8))
+    return splitBlockHeader(*unpack(">II",f.read(8)))
+
+def splitBlockHeader(num1,num2):
     dictFlag=num1&0xFF000000
     uncompressedSize=num1&0x00FFFFFF
     comType=(num2&0xFF000000)>>24
@@ -55,73 +64,177 @@ def readBlockHeader(f):
     compressedSize=num2&0x000FFFFF
     return dictFlag, uncompressedSize, comType, typeFlag, compressedSize
 
-def decompressBlock(f,f2):
-    dictFlag, uncompressedSize, comType, typeFlag, compressedSize = readBlockHeader(f)
+codecNames={0x09:"lz4",0x0f:"zstd",0x15:"oodle",0x02:"zlib",0x00:"stored"}
 
+def blockCodec(uncompressedSize,comType,typeFlag,compressedSize,headerOffset,source):
+    #source is the file or the path the block is in, for the error message.
     #Hack for legacy format in NFS:R prototype.
     if typeFlag==0:
         comType=0x02 if uncompressedSize!=compressedSize else 0x00
 
+    if comType not in codecNames:
+        raise Exception("Unknown compression type 0x%02x at 0x%08x in %s" % (comType,headerOffset,getattr(source,"name",source)))
+    return comType
+
+def decompressBlock(f,f2):
+    dictFlag, uncompressedSize, comType, typeFlag, compressedSize = readBlockHeader(f)
+    comType=blockCodec(uncompressedSize,comType,typeFlag,compressedSize,f.tell()-8,f)
+
+    t0=stats.clock()
+    srcBuf=f.read(compressedSize)
+    t1=stats.clock()
+    dstBuf=decodeBlock(srcBuf,dictFlag,uncompressedSize,comType)
+    t2=stats.clock()
+    f2.write(dstBuf)
+    stats.addBlock(codecNames[comType],compressedSize,uncompressedSize,t1-t0,t2-t1,stats.clock()-t2)
+
+    return uncompressedSize
+
+def decodeBlock(srcBuf,dictFlag,uncompressedSize,comType):
+    #Decompress the data of a single block. The codecs release the GIL, so this also runs on the block pool.
+    #srcBuf is bytes, or a memoryview into a mapped archive that the ctypes codecs get a pointer to.
+    compressedSize=len(srcBuf)
+    src=srcBuf if type(srcBuf) is bytes else (ctypes.c_char*compressedSize).from_buffer(srcBuf)
     if comType==0x09:
         #Block is compressed with LZ4.
-        srcBuf=f.read(compressedSize)
         dstBuf=bytes(uncompressedSize)
-        liblz4.LZ4_decompress_safe_partial(srcBuf,dstBuf,compressedSize,uncompressedSize,uncompressedSize)
-        f2.write(dstBuf)
+        liblz4.LZ4_decompress_safe_partial(src,dstBuf,compressedSize,uncompressedSize,uncompressedSize)
     elif comType==0x0f:
         #Block is compressed with Zstd.
-        srcBuf=f.read(compressedSize)
         dstBuf=bytes(uncompressedSize)
         if dictFlag:
             zstd_dctx=ctypes.c_void_p(libzstd.ZSTD_createDCtx())
-            libzstd.ZSTD_decompress_usingDDict(zstd_dctx,dstBuf,uncompressedSize,srcBuf,compressedSize,zstd_dict)
+            libzstd.ZSTD_decompress_usingDDict(zstd_dctx,dstBuf,uncompressedSize,src,compressedSize,zstd_dict)
             libzstd.ZSTD_freeDCtx(zstd_dctx)
         else:
-            libzstd.ZSTD_decompress(dstBuf,uncompressedSize,srcBuf,compressedSize)
-        f2.write(dstBuf)
+            libzstd.ZSTD_decompress(dstBuf,uncompressedSize,src,compressedSize)
     elif comType==0x15:
         #Block is compressed with Oodle. Only used in FIFA 18/19 so far.
         if not oodle: raise Exception("You need oo2core_4_win64.dll to decompress Oodle v4.")
-        srcBuf=f.read(compressedSize)
         dstBuf=bytes(uncompressedSize)
-        oodle.OodleLZ_Decompress(srcBuf,compressedSize,dstBuf,uncompressedSize,0,0,0,0,0,0,0,0,0,3)
-        f2.write(dstBuf)
+        oodle.OodleLZ_Decompress(src,compressedSize,dstBuf,uncompressedSize,0,0,0,0,0,0,0,0,0,3)
     elif comType==0x02:
         #Block is compressed with zlib.
-        srcBuf=f.read(compressedSize)
         dstBuf=zlib.decompress(srcBuf)
-        f2.write(dstBuf)
-    elif comType==0x00:
-        #No compression, just write this block as it is.
-        f2.write(f.read(compressedSize))
     else:
-        raise Exception("Unknown compression type 0x%02x at 0x%08x in %s" % (comType,f.tell()-8,f.name))
-
-    return uncompressedSize
+        #No compression, just write this block as it is.
+        dstBuf=srcBuf
+    return dstBuf
+
+def timedDecodeBlock(block):
+    t0=stats.clock()
+    dstBuf=decodeBlock(*block)
+    return dstBuf, stats.clock()-t0
+
+def decompressBlocksParallel(f,f2,size,originalSize):
+    #Large payloads: read the blocks a window at a time, cut the window at the block headers
+    #and decompress its blocks on the block pool. The results come back in order, so they're written one after the other.
+    remaining=size
+    data=b""
+    written=0
+    while 1:
+        t0=stats.clock()
+        window=f.read(min(pipeline.parallelWindow,remaining))
+        readTime=stats.clock()-t0
+        remaining-=len(window)
+        data=data+window if data else window
+
+        blocks=list()
+        codecs=list()
+        pos=0
+        while pos+8<=len(data):
+            dictFlag, uncompressedSize, comType, typeFlag, compressedSize = splitBlockHeader(*unpack_from(">II",data,pos))
+            if pos+8+compressedSize>len(data): break
+            comType=blockCodec(uncompressedSize,comType,typeFlag,compressedSize,f.tell()-len(data)+pos,f)
+            blocks.append((data[pos+8:pos+8+compressedSize],dictFlag,uncompressedSize,comType))
+            codecs.append(codecNames[comType])
+            pos+=8+compressedSize
+            written+=uncompressedSize
+            if originalSize and written==originalSize: break
+        data=data[pos:]
+
+        for block, codec, (dstBuf, decompressTime) in zip(blocks,codecs,pipeline.mapBlocks(timedDecodeBlock,blocks)):
+            t2=stats.clock()
+            f2.write(dstBuf)
+            stats.addBlock(codec,len(block[0]),block[2],readTime*len(block[0])/len(window) if window else 0.0,decompressTime,stats.clock()-t2)
+
+        if (originalSize and written==originalSize) or (not remaining and not data): return
+        if not remaining: raise Exception("Block cut short at the end of the payload in %s" % f.name)
+
+def decompressMapped(f2,data,offset,size,originalSize,srcPath):
+    #The blocks of a payload in a mapped archive. The codecs get the blocks straight from the mapping and stored blocks are written from it,
+    #so no compressed byte gets copied. Large payloads go to the block pool in windows like in decompressBlocksParallel.
+    view=memoryview(data)
+    parallel=size>=pipeline.parallelSize and pipeline.blockPool
+    end=offset+size
+    pos=offset
+    written=0
+    blocks=list()
+    windowSize=0
+    while pos<end:
+        dictFlag, uncompressedSize, comType, typeFlag, compressedSize = splitBlockHeader(*unpack_from(">II",data,pos))
+        comType=blockCodec(uncompressedSize,comType,typeFlag,compressedSize,pos,srcPath)
+        if pos+8+compressedSize>len(data): raise Exception("Block cut short at the end of %s" % srcPath)
+        block=(view[pos+8:pos+8+compressedSize],dictFlag,uncompressedSize,comType)
+        pos+=8+compressedSize
+        written+=uncompressedSize
+        done=pos>=end or (originalSize and written==originalSize)
+
+        if not parallel:
+            t1=stats.clock()
+            dstBuf=decodeBlock(*block)
+            t2=stats.clock()
+            f2.write(dstBuf)
+            stats.addBlock(codecNames[comType],compressedSize,uncompressedSize,0.0,t2-t1,stats.clock()-t2)
+        else:
+            blocks.append(block)
+            windowSize+=compressedSize
+            if windowSize>=pipeline.parallelWindow or done:
+                for block, (dstBuf, decompressTime) in zip(blocks,pipeline.mapBlocks(timedDecodeBlock,blocks)):
+                    t2=stats.clock()
+                    f2.write(dstBuf)
+                    stats.addBlock(codecNames[block[3]],len(block[0]),block[2],0.0,decompressTime,stats.clock()-t2)
+                blocks=list()
+                windowSize=0
+        if done: break
+
+#The two functions below write the payload into f2, they're passed to pipeline.submit which provides the target.
+def decompressPayload(f2,srcPath,offset,size,originalSize):
+    data=mapped.mapFile(srcPath)
+    if data is not None:
+        decompressMapped(f2,data,offset,size,originalSize,srcPath)
+        pipeline.afterWrite(iohints.dontNeed,srcPath,offset,size,data)
+        stats.addEntry()
+        return
 
-def decompressPayload(srcPath,offset,size,originalSize,outPath):
     f=open(srcPath,"rb")
     f.seek(offset)
-    f2=open2(outPath,"wb")
 
     #Payloads are split into blocks and each block may or may not be compressed.
     #We need to decompress and glue the blocks together to get the real file.
+    if size>=pipeline.parallelSize and pipeline.blockPool:
+        decompressBlocksParallel(f,f2,size,originalSize)
+        f.close()
+        iohints.dontNeed(srcPath,offset,size)
+        stats.addEntry()
+        return
+
     while f.tell()!=offset+size:
         decompressBlock(f,f2)
         if originalSize and f2.tell()==originalSize:
             break
 
     f.close()
-    f2.close()
+    iohints.dontNeed(srcPath,offset,size)
+    stats.addEntry()
 
 def split1v7(num): return (num>>28,num&0x0fffffff) #0x7A945CF1 => (7, 0xA945CF1)
 
-def decompressPatchedPayload(basePath,baseOffset,deltaPath,deltaOffset,deltaSize,originalSize,outPath,midInstructionType=-1,midInstructionSize=0):
+def decompressPatchedPayload(f2,basePath,baseOffset,deltaPath,deltaOffset,deltaSize,originalSize,midInstructionType=-1,midInstructionSize=0):
     base=open(basePath,"rb")
     delta=open(deltaPath,"rb")
     base.seek(baseOffset)
     delta.seek(deltaOffset)
-    f2=open2(outPath,"wb")
 
     instructionType=midInstructionType
     instructionSize=midInstructionSize
@@ -181,30 +294,59 @@ def decompressPatchedPayload(basePath,baseOffset,deltaPath,deltaOffset,deltaSize
     while f2.tell()!=originalSize:
         decompressBlock(base,f2)
 
+    iohints.dontNeed(basePath,baseOffset,base.tell()-baseOffset)
+    iohints.dontNeed(deltaPath,deltaOffset,deltaSize)
     base.close()
     delta.close()
-    f2.close()
+    stats.addEntry()
+
+def submit(targetPath,size,fill,*args):
+    #Chunks of a metadata-first dump go to the deferred queue instead, see deferred.py. So do the res when converting, see convert.py.
+    if deferred.enabled and deferred.defers(targetPath):
+        deferred.add(targetPath,size,fill,args)
+        return
+    if convert.enabled: convert.remember(targetPath,size,fill,args)
+    readAhead(fill,args)
+    pipeline.submit(targetPath,size,fill,*args)
+
+def readAhead(fill,args):
+    #Start reading the ranges the payload comes from, see iohints.py.
+    if fill is decompressPayload:
+        srcPath, offset, size = args[:3]
+        iohints.willNeed(srcPath,offset,size)
+    else:
+        basePath, baseOffset, deltaPath, deltaOffset, deltaSize = args[:5]
+        iohints.willNeed(basePath,baseOffset,iohints.readaheadSize) #the base doesn't know how much of it is used
+        iohints.willNeed(deltaPath,deltaOffset,deltaSize)
+
+def alreadyDumped(targetPath):
+    if pipeline.isPending(targetPath) or deferred.isQueued(targetPath) or writer.exists(targetPath):
+        stats.skipEntry()
+        return True
+    return False
 
 #for each bundle, the dump script selects one of these six functions
-def casBundlePayload(entry,targetPath,isChunk):
-    if os.path.isfile(lp(targetPath)): return True
+def casBundlePayload(ctx,entry,targetPath,isChunk):
+    if alreadyDumped(targetPath): return True
+    if not sharding.owns(targetPath): return False
 
     #Some files may be from localizations user doesn't have installed.
     sha1=entry.get("sha1")
-    if sha1 in cas.catDict:
+    if sha1 in ctx.catDict:
         if isChunk:
             originalSize=entry.get("logicalOffset")+entry.get("logicalSize")
         else:
             originalSize=entry.get("originalSize")
 
-        catEntry=cas.catDict[sha1]
-        decompressPayload(catEntry.path,catEntry.offset,catEntry.size,originalSize,targetPath)
+        catEntry=ctx.catDict[sha1]
+        submit(targetPath,originalSize,decompressPayload,catEntry.path,catEntry.offset,catEntry.size,originalSize)
         return True
     else:
         return False
 
-def casPatchedBundlePayload(entry,targetPath,isChunk):
-    if os.path.isfile(lp(targetPath)): return True
+def casPatchedBundlePayload(ctx,entry,targetPath,isChunk):
+    if alreadyDumped(targetPath): return True
+    if not sharding.owns(targetPath): return False
 
     if entry.get("casPatchType")==2:
         if isChunk:
@@ -212,43 +354,49 @@ def casPatchedBundlePayload(entry,targetPath,isChunk):
         else:
             originalSize=entry.get("originalSize")
 
-        catDelta=cas.catDict[entry.get("deltaSha1")]
-        catBase=cas.catDict[entry.get("baseSha1")]
-        decompressPatchedPayload(catBase.path,catBase.offset,
-                                 catDelta.path,catDelta.offset,catDelta.size,
-                                 originalSize,targetPath)
+        catDelta=ctx.catDict[entry.get("deltaSha1")]
+        catBase=ctx.catDict[entry.get("baseSha1")]
+        submit(targetPath,originalSize,decompressPatchedPayload,
+               catBase.path,catBase.offset,
+               catDelta.path,catDelta.offset,catDelta.size,
+               originalSize)
         return True
     else:
-        return casBundlePayload(entry, targetPath,isChunk) #if casPatchType is not 2, use the unpatched function.
+        return casBundlePayload(ctx,entry,targetPath,isChunk) #if casPatchType is not 2, use the unpatched function.
 
-def casChunkPayload(entry,targetPath):
-    if os.path.isfile(lp(targetPath)): return True
+def casChunkPayload(ctx,entry,targetPath):
+    if alreadyDumped(targetPath): return True
+    if not sharding.owns(targetPath): return False
 
     #Some files may be from localizations user doesn't have installed.
     sha1=entry.get("sha1")
-    if sha1 in cas.catDict:
-        catEntry=cas.catDict[entry.get("sha1")]
-        decompressPayload(catEntry.path,catEntry.offset,catEntry.size,None,targetPath)
+    if sha1 in ctx.catDict:
+        catEntry=ctx.catDict[entry.get("sha1")]
+        submit(targetPath,None,decompressPayload,catEntry.path,catEntry.offset,catEntry.size,None)
         return True
     else:
         return False
 
 def noncasBundlePayload(entry,targetPath,sourcePath):
-    if os.path.isfile(lp(targetPath)): return True
-    decompressPayload(sourcePath,entry.offset,entry.size,entry.originalSize,targetPath)
+    if alreadyDumped(targetPath): return True
+    if not sharding.owns(targetPath): return False
+    submit(targetPath,entry.originalSize,decompressPayload,sourcePath,entry.offset,entry.size,entry.originalSize)
     return True
 
 def noncasPatchedBundlePayload(entry,targetPath,sourcePath):
-    if os.path.isfile(lp(targetPath)): return True
-    decompressPatchedPayload(sourcePath[0], entry.baseOffset,#entry.baseSize,
-                            sourcePath[1], entry.deltaOffset, entry.deltaSize,
-                            entry.originalSize, targetPath,
-                            entry.midInstructionType, entry.midInstructionSize)
+    if alreadyDumped(targetPath): return True
+    if not sharding.owns(targetPath): return False
+    submit(targetPath,entry.originalSize,decompressPatchedPayload,
+           sourcePath[0], entry.baseOffset,#entry.baseSize,
+           sourcePath[1], entry.deltaOffset, entry.deltaSize,
+           entry.originalSize,
+           entry.midInstructionType, entry.midInstructionSize)
     return True
 
 def noncasChunkPayload(entry,targetPath,sourcePath):
-    if os.path.isfile(lp(targetPath)): return True
-    decompressPayload(sourcePath,entry.get("offset"),entry.get("size"),None,targetPath)
+    if alreadyDumped(targetPath): return True
+    if not sharding.owns(targetPath): return False
+    submit(targetPath,None,decompressPayload,sourcePath,entry.get("offset"),entry.get("size"),None)
     return True
 
 
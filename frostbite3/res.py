@@ -1,13 +1,12 @@
 #Res names and res lookup table are handled here.
-#Frostbite 3 looks up res files by 64-bit ID.
+#Frostbite 3 looks up res files by 64-bit ID. The RES table itself is part of the context (see context.py), the type names are shared.
 import os
 import pickle
 import re
+import spill
 from dbo import Guid
 
 resTypes=dict()
-resTable=dict()
-unkResTypes=list()
 
 def loadResNames():
     #Load known res type names from the list into types table.
@@ -47,59 +46,53 @@ class ResInfo:
     def getResFilename(self):
         return self.name+getResExt(self.resType)
 
-def addToResTable(resRid,name,resType,resMeta):
-    if resType not in resTypes and resType not in unkResTypes:
-        unkResTypes.append(resType)
+def addToResTable(ctx,resRid,name,resType,resMeta):
+    if resType not in resTypes and resType not in ctx.unkResTypes:
+        ctx.unkResTypes.append(resType)
 
     #Null resRid can't be looked up.
     if resRid!=0:
-        resTable[resRid]=ResInfo(name,resType,resMeta)
+        ctx.resTable[resRid]=ResInfo(name,resType,resMeta)
 
-def writeResTable(dumpFolder):
+def writeResTable(ctx,dumpFolder):
     f=open(os.path.join(dumpFolder,"resTable.bin"),"wb")
-    pickle.dump(resTable,f)
+    spill.dump(ctx.resTable,f)
     f.close()
 
     #Log any res types we don't know names for yet.
-    if len(unkResTypes)!=0:
+    if len(ctx.unkResTypes)!=0:
         f=open(os.path.join(dumpFolder,"unknownResTypes.txt"),"w")
-        for typ in unkResTypes:
+        for typ in ctx.unkResTypes:
             f.write("0x%08x\n" % typ)
         f.close()
 
-def loadResTable(dumpFolder):
-    global resTable
+def loadResTable(ctx,dumpFolder):
     path=os.path.join(dumpFolder,"resTable.bin")
     if not os.path.isfile(path):
         print("WARNING: RES table is missing, it is required to link to RES files!")
         return
 
     f=open(path,"rb")
-    resTable=pickle.load(f)
+    ctx.resTable=pickle.load(f)
+    ctx.newWaves=None
     f.close()
 
     #Load res names, too.
     loadResNames()
 
-newWaves=dict()
-newWavesCached=False
-
-def cacheNewWaveResources(bigEndian):
+def cacheNewWaveResources(ctx,bigEndian):
     #Special case for NewWaveAssets which look up NewWaveResources by GUID stored in resMeta.
-    global newWavesCached
-    if newWavesCached:
+    if ctx.newWaves is not None:
         return
 
-    if len(resTable)==0:
+    ctx.newWaves=dict()
+    if len(ctx.resTable)==0:
         print("Falling back to simple NewWaveResource finding method, may not work properly.")
-        newWavesCached=True
         return
 
     print("Caching NewWaveResource GUIDs...")
     typ=hasher("newwaveresource")
-    for val in resTable.values():
+    for val in ctx.resTable.values():
         if val.resType==typ:
             guid=Guid.frombytes(val.resMeta,bigEndian)
-            newWaves[guid]=val
-
-    newWavesCached=True
+            ctx.newWaves[guid]=val
@@ -3,6 +3,7 @@
 from struct import unpack,pack
 import io
 import dbo
+import packfile
 
 def unpackLE(typ,data): return unpack("<"+typ,data)
 def unpackBE(typ,data): return unpack(">"+typ,data)
@@ -190,7 +191,7 @@ class DataSet:
 class Bank:
     def __init__(self,path):
         #Load the whole SBR into memory.
-        f=open(path,"rb")
+        f=packfile.openFile(path)
         self.f=io.BytesIO(f.read())
         f.close()
 
@@ -0,0 +1,107 @@
+#Sharded dumps: several machines (or processes) dump one install at the same time, each into a dump folder of its own,
+#and merge.py puts the parts together into a single dump with the same files and tables as a dump made in one go.
+#The shards don't talk to each other. Every shard makes the same plan from the manifests of the install (see manifest.py):
+#the units of work are the bundles and the chunks defined directly in each toc, weighted by the stored bytes of the payloads
+#they're the first to extract. The units are handed out largest first, each to the shard with the fewest bytes so far.
+#A path that is in several units belongs to the shard of the first unit that has it, just like the dumper only extracts the first one.
+import hashlib
+import json
+import os
+import manifest
+
+planName="shard.json"
+
+enabled=False
+index=0
+count=1
+gameRoot=""
+dumpRoot=""
+units=dict() #(toc path relative to the game directory, bundle id or None for the toc chunks) -> shard
+owners=dict() #output path relative to the dump folder -> shard, for the paths that are in more than one unit
+plan=dict() #what's written to shard.json
+
+def parseSpec(spec):
+    #"i/N" is the i-th of N shards, counting from 0.
+    try: i, n = [int(part) for part in spec.split("/")]
+    except ValueError: i, n = -1, 0
+    if not 0<=i<n: raise Exception("Invalid shard %s, it must be i/N with 0<=i<N." % spec)
+    return i, n
+
+def unitKey(tocPath,bundleId):
+    #The game directory may be somewhere else on every machine.
+    return (os.path.relpath(tocPath,gameRoot).replace("\\","/").lower(), bundleId)
+
+def start(spec,gameDirectory,dumpFolder):
+    #Make the plan and pick this shard's part of it. A dump folder only ever holds one shard of one plan.
+    global enabled, index, count, gameRoot, dumpRoot, plan
+    index, count = parseSpec(spec)
+    gameRoot=gameDirectory
+    dumpRoot=dumpFolder
+
+    order=list() #units in the order the dumper goes through them
+    weights=dict()
+    first=dict() #path -> unit that extracts it
+    shared=set()
+    for entry in manifest.entries(gameDirectory):
+        key=unitKey(entry.sb,entry.bundle)
+        if key not in weights:
+            weights[key]=0
+            order.append(key)
+        if entry.missing: continue #the dumper goes on to the next entry with this path
+        unit=first.get(entry.path)
+        if unit is None:
+            first[entry.path]=key
+            weights[key]+=entry.size
+        elif unit!=key:
+            shared.add(entry.path)
+
+    loads=[0]*count
+    units.clear()
+    for position, key in sorted(enumerate(order),key=lambda item: (-weights[item[1]],item[0])):
+        shard=min(range(count),key=lambda i: (loads[i],i))
+        units[key]=shard
+        loads[shard]+=weights[key]
+    owners.clear()
+    for path in shared: owners[path]=units[first[path]]
+
+    digest=hashlib.sha1()
+    for key in order: digest.update(("%s\t%s\t%d\t%d\n" % (key[0],key[1],weights[key],units[key])).encode("utf-8"))
+    for path in sorted(owners): digest.update(("%s\t%d\n" % (path,owners[path])).encode("utf-8"))
+    plan={"shard":index,"count":count,"plan":digest.hexdigest(),"units":sum(1 for key in order if units[key]==index),
+          "totalUnits":len(order),"weight":loads[index],"totalWeight":sum(loads),"finished":False}
+
+    previous=loadPlan(dumpFolder)
+    if previous and (previous["shard"],previous["count"],previous["plan"])!=(index,count,plan["plan"]):
+        raise Exception("%s holds shard %d/%d of a different plan, use a separate target directory for every shard." % (
+            dumpFolder,previous["shard"],previous["count"]))
+    writePlan(dumpFolder)
+    enabled=True
+
+def hasUnit(tocPath,bundleId):
+    #Whether this shard goes through the bundle (or the toc chunks if bundleId is None) of tocPath.
+    return not enabled or units.get(unitKey(tocPath,bundleId))==index
+
+def owns(path):
+    #Whether this shard extracts the payload at path, which is in one of its units.
+    if not enabled or not owners: return True
+    owner=owners.get(path[len(dumpRoot)+1:].replace("\\","/"))
+    return owner is None or owner==index
+
+def loadPlan(dumpFolder):
+    path=os.path.join(dumpFolder,planName)
+    if not os.path.isfile(path): return None
+    f=open(path,"r")
+    result=json.load(f)
+    f.close()
+    return result
+
+def writePlan(dumpFolder):
+    os.makedirs(dumpFolder,exist_ok=True)
+    f=open(os.path.join(dumpFolder,planName),"w")
+    json.dump(plan,f,indent=1)
+    f.close()
+
+def finish(dumpFolder):
+    #The shard's files and tables are complete, merge.py may take them.
+    plan["finished"]=True
+    writePlan(dumpFolder)
@@ -0,0 +1,125 @@
+#Tables that grow with the size of the game (cat entries, EBX GUIDs, RES IDs) can be kept on disk here so the dumper's memory use stays flat.
+#All tables live in one SQLite file. Writes are buffered and appended in batches, a key that's written twice keeps its last value.
+#At the end, a table is merged straight into the same pickle that the in-memory dict would give, without loading the table into memory.
+import os
+import pickle
+import sqlite3
+
+batchSize=20000 #number of buffered writes per table before they're appended to the store
+pickleBatch=1000 #number of items per SETITEMS opcode when writing the final pickle
+
+connection=None
+storePath=""
+tables=list()
+
+def encode(obj): return pickle.dumps(obj,2)
+def decode(data): return pickle.loads(data)
+
+def openStore(path):
+    global connection, storePath
+    os.makedirs(os.path.dirname(path),exist_ok=True)
+    if os.path.isfile(path): os.remove(path) #left over from a crashed run
+    storePath=path
+    connection=sqlite3.connect(path)
+    #The store is thrown away at the end, so durability doesn't matter.
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.execute("PRAGMA cache_size=-65536") #64 MB page cache
+
+def closeStore():
+    global connection
+    if not connection: return
+    connection.close()
+    connection=None
+    del tables[:]
+    os.remove(storePath)
+
+class SpillDict:
+    #Behaves like the dict it replaces for everything the scripts do with it.
+    def __init__(self,name):
+        self.name="%s%d" % (name,len(tables)) #every context gets its own tables
+        self.pending=dict() #encoded key -> value
+        connection.execute("CREATE TABLE %s (key BLOB, value BLOB)" % self.name)
+        connection.execute("CREATE INDEX %s_key ON %s (key)" % (self.name,self.name))
+        tables.append(self)
+
+    def flush(self):
+        if not self.pending: return
+        connection.executemany("INSERT INTO %s VALUES (?,?)" % self.name,
+                               [(key,encode(value)) for key, value in self.pending.items()])
+        connection.commit()
+        self.pending.clear()
+
+    def __setitem__(self,key,value):
+        self.pending[encode(key)]=value
+        if len(self.pending)>=batchSize: self.flush()
+
+    def lookup(self,encodedKey):
+        if encodedKey in self.pending: return self.pending[encodedKey]
+        row=connection.execute("SELECT value FROM %s WHERE key=? ORDER BY rowid DESC LIMIT 1" % self.name,(encodedKey,)).fetchone()
+        if row is None: raise KeyError
+        return decode(row[0])
+
+    def __getitem__(self,key):
+        try: return self.lookup(encode(key))
+        except KeyError: raise KeyError(key)
+
+    def get(self,key,defaultVal=None):
+        try: return self.lookup(encode(key))
+        except KeyError: return defaultVal
+
+    def __contains__(self,key):
+        encodedKey=encode(key)
+        if encodedKey in self.pending: return True
+        return connection.execute("SELECT 1 FROM %s WHERE key=? LIMIT 1" % self.name,(encodedKey,)).fetchone() is not None
+
+    def __len__(self):
+        self.flush()
+        return connection.execute("SELECT count(DISTINCT key) FROM %s" % self.name).fetchone()[0]
+
+    def clear(self):
+        self.pending.clear()
+        connection.execute("DELETE FROM %s" % self.name)
+        connection.commit()
+
+    def merged(self):
+        #Latest value of every key, in the order the keys were last written.
+        self.flush()
+        return connection.execute("SELECT key, value FROM %s WHERE rowid IN (SELECT max(rowid) FROM %s GROUP BY key) ORDER BY rowid" % (self.name,self.name))
+
+    def items(self):
+        for key, value in self.merged():
+            yield decode(key), decode(value)
+
+    def values(self):
+        for key, value in self.merged():
+            yield decode(value)
+
+    def __iter__(self):
+        for key, value in self.merged():
+            yield decode(key)
+
+    def writePickle(self,f):
+        #Write a protocol 2 pickle of the equivalent dict: EMPTY_DICT, then batches of MARK key value ... SETITEMS.
+        #The stored keys and values are complete pickles themselves, so only their PROTO header and STOP opcode are cut off.
+        #Their memo indices clash between items, which is fine since every item only refers to its own memo entries.
+        f.write(b"\x80\x02}")
+        cursor=self.merged()
+        while 1:
+            rows=cursor.fetchmany(pickleBatch)
+            if not rows: break
+            f.write(b"(")
+            for key, value in rows:
+                f.write(key[2:-1])
+                f.write(value[2:-1])
+            f.write(b"u")
+        f.write(b".")
+
+class SpillSet(SpillDict):
+    def add(self,key):
+        self[key]=None
+
+def dump(table,f):
+    #Pickle a table no matter where it's kept.
+    if isinstance(table,SpillDict): table.writePickle(f)
+    else: pickle.dump(table,f)
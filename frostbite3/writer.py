@@ -0,0 +1,331 @@
+#Output side of the dumper, every extracted file goes through here and ends up in one of three sinks:
+#  directory: the usual tree of loose files. Files are written to a numbered file in the partial folder and moved into place once
+#             they're complete, so a killed dumper never leaves a truncated file behind that the next run would skip.
+#             Folders that are known to exist are cached, files of known size are preallocated
+#             and the many small block writes of a payload are gathered into large buffered writes.
+#  pack:      a single append-only pack file with a sorted index, see packfile.py.
+#  null:      throws everything away, to measure how fast the dumper decodes.
+#  memory:    keeps the files in memory until they're released, for the dumper's asset conversion (see convert.py).
+#With compressLevel set, the files are recompressed with zstd on their way to the sink, see zstdfile.py.
+import os
+import io
+import itertools
+import shutil
+import threading
+import packfile
+import zstdfile
+
+bufferSize=1<<20 #block writes are gathered until this many bytes are pending
+preallocateSize=1<<18 #files of at least this size are preallocated when their final size is known
+spillSize=8<<20 #payloads held in memory move on to a partial file once they get this large
+sortByDirectory=False #hand out bundle entries grouped by output folder, see inDirectoryOrder
+compressLevel=0 #zstd level the files are stored with, 0 stores them decompressed
+
+partialDirectory="partial"
+partialNames=itertools.count()
+knownDirectories=set() #folders that exist already, so most files don't need any makedirs calls
+canPreallocate=True
+sink=None
+sinkName=""
+
+def lp(path): #long pathnames
+    if path[:4]=='\\\\?\\' or path=="" or len(path)<=247: return path
+    return '\\\\?\\' + os.path.normpath(path)
+
+def start(dumpFolder,name="directory"):
+    global partialDirectory, sink, sinkName
+    partialDirectory=os.path.join(dumpFolder,"partial")
+    if os.path.isdir(partialDirectory): shutil.rmtree(partialDirectory) #left over from a killed run
+    os.makedirs(partialDirectory)
+    sink=sinks[name](dumpFolder)
+    sinkName=name
+
+def finish():
+    sink.finish()
+    shutil.rmtree(partialDirectory)
+
+#The functions the dumper uses, whatever the sink.
+def openTarget(path,size=None):
+    #size is the final size of the file if it's known in advance.
+    if compressLevel: return zstdfile.Compressor(sink.openTarget(path,None),compressLevel)
+    return sink.openTarget(path,size)
+
+def openBuffer(path,size=None):
+    #Like openTarget, but the result may be filled on another thread than the one that closes it.
+    if compressLevel: return zstdfile.Compressor(sink.openBuffer(path,None),compressLevel)
+    return sink.openBuffer(path,size)
+
+def finishTarget(f):
+    #The payload is complete. Compresses what's left, so a pipeline worker does it rather than the writer thread.
+    if type(f) is zstdfile.Compressor: f.close()
+
+def closeTarget(f,path):
+    if type(f) is zstdfile.Compressor:
+        f.close()
+        f=f.target
+    sink.closeTarget(f,path)
+
+def exists(path):
+    return sink.exists(path)
+
+def publish():
+    #Make the files written so far readable by the other scripts while the dump goes on (the pack needs its index for that).
+    sink.publish()
+
+def flush():
+    #Make everything written so far survive the process being killed.
+    sink.flush()
+
+def sync():
+    #Make everything written so far survive a power loss as well.
+    sink.sync()
+
+def inDirectoryOrder(entries,name):
+    #Optionally sort the entries of a bundle by the folder of their output file (name returns the file name of an entry)
+    #so each folder's files are created together. The order within a folder stays the same.
+    if not sortByDirectory: return entries
+    return sorted(entries,key=lambda entry: os.path.dirname(name(entry)))
+
+
+
+def makeDirs(path):
+    #Create the folder of the file unless we've done so before.
+    folderPath=os.path.dirname(path)
+    if folderPath in knownDirectories: return
+    os.makedirs(lp(folderPath),exist_ok=True)
+    knownDirectories.add(folderPath)
+
+def preallocate(f,size):
+    global canPreallocate
+    if hasattr(os,"posix_fallocate"):
+        try: os.posix_fallocate(f.fileno(),0,size)
+        except OSError: canPreallocate=False #the filesystem doesn't support it, don't try again
+    else:
+        #Moving the end of file makes NTFS reserve the clusters in one go, the data is written sequentially afterwards.
+        f.truncate(size)
+
+def openPartial(size=None):
+    #Small files get a small buffer, there's no point in allocating a large one for them.
+    buffering=bufferSize if size is None else max(min(size,bufferSize),io.DEFAULT_BUFFER_SIZE)
+    f=open(os.path.join(partialDirectory,"%d.part" % next(partialNames)),"wb",buffering=buffering)
+    f.allocated=0
+    if size and size>=preallocateSize and canPreallocate:
+        preallocate(f,size)
+        f.allocated=size
+    return f
+
+def closePartial(f):
+    #Drop any preallocated space that didn't get used.
+    if f.tell()<f.allocated: f.truncate()
+    f.close()
+
+class Buffer:
+    #In-memory target. Keeps the blocks as they come, unless the payload turns out to be large.
+    def __init__(self,size):
+        self.size=size
+        self.blocks=list()
+        self.length=0
+        self.f=None
+
+    def write(self,data):
+        self.length+=len(data)
+        if self.f:
+            self.f.write(data)
+            return
+        self.blocks.append(data)
+        if self.length>=spillSize: self.toFile()
+
+    def tell(self):
+        return self.length
+
+    def toFile(self):
+        #Move the content to a partial file, which is returned.
+        if not self.f:
+            self.f=openPartial(self.size)
+            self.f.writelines(self.blocks)
+            self.blocks=None
+        return self.f
+
+class DirectorySink:
+    def __init__(self,dumpFolder):
+        self.unsynced=list() #files moved into place since the last sync, where there's no os.sync (Windows)
+        self.lock=threading.Lock()
+
+    def openTarget(self,path,size):
+        return openPartial(size)
+
+    def openBuffer(self,path,size):
+        return Buffer(size)
+
+    def closeTarget(self,f,path):
+        if type(f) is Buffer: f=f.toFile()
+        closePartial(f)
+        makeDirs(path)
+        os.replace(f.name,lp(path))
+        if not hasattr(os,"sync"):
+            with self.lock: self.unsynced.append(path)
+
+    def exists(self,path):
+        return os.path.isfile(lp(path))
+
+    def publish(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def sync(self):
+        #One os.sync writes back the data of the files and the folder entries of their names. Windows has no such thing,
+        #there every file is flushed on its own (NTFS journals the renames).
+        if hasattr(os,"sync"):
+            os.sync()
+            return
+        with self.lock: paths, self.unsynced = self.unsynced, list()
+        for path in paths:
+            f=open(lp(path),"r+b")
+            os.fsync(f.fileno())
+            f.close()
+
+    def finish(self):
+        pass
+
+class PackSink:
+    def __init__(self,dumpFolder):
+        self.pack=packfile.PackWriter(dumpFolder)
+        packfile.mounted=self.pack #so the EBX GUID pass can read the ebx back
+
+    def openTarget(self,path,size):
+        return Buffer(size)
+
+    def openBuffer(self,path,size):
+        return Buffer(size)
+
+    def closeTarget(self,f,path):
+        if not f.f:
+            self.pack.add(path,f.blocks,f.length)
+            return
+
+        #Large payload, copy it over from its partial file.
+        closePartial(f.f)
+        src=open(f.f.name,"rb")
+        self.pack.add(path,iter(lambda: src.read(bufferSize),b""),f.length)
+        src.close()
+        os.remove(f.f.name)
+
+    def exists(self,path):
+        return self.pack.find(path) is not None
+
+    def publish(self):
+        self.pack.writeIndex()
+
+    def flush(self):
+        self.pack.flush()
+
+    def sync(self):
+        self.pack.sync()
+
+    def finish(self):
+        self.pack.finish()
+        packfile.mounted=None
+
+class NullFile:
+    #Counts what's written and throws it away.
+    def __init__(self):
+        self.length=0
+
+    def write(self,data):
+        self.length+=len(data)
+
+    def tell(self):
+        return self.length
+
+class NullSink:
+    def __init__(self,dumpFolder):
+        self.closed=set() #paths of the files thrown away, duplicates are skipped just like with the other sinks
+
+    def openTarget(self,path,size):
+        return NullFile()
+
+    def openBuffer(self,path,size):
+        return NullFile()
+
+    def closeTarget(self,f,path):
+        self.closed.add(path)
+
+    def exists(self,path):
+        return path in self.closed
+
+    def publish(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def sync(self):
+        pass
+
+    def finish(self):
+        pass
+
+class MemorySink:
+    #Nothing is written, the files are kept until release() and read back like from a pack (it's mounted, see packfile.openFile).
+    def __init__(self,dumpFolder):
+        self.root=dumpFolder
+        self.files=dict() #lowercase name -> content
+        self.released=set() #lowercase names of the files that were here, so they still count as extracted
+        self.lock=threading.Lock() #the writer thread adds files while the main thread reads and releases them
+        packfile.mounted=self
+
+    def key(self,path):
+        name=packfile.nameOf(self.root,path)
+        return name.lower() if name is not None else None
+
+    def openTarget(self,path,size):
+        return io.BytesIO()
+
+    def openBuffer(self,path,size):
+        return io.BytesIO()
+
+    def closeTarget(self,f,path):
+        with self.lock: self.files[self.key(path)]=f.getvalue()
+
+    def exists(self,path):
+        key=self.key(path)
+        with self.lock: return key in self.files or key in self.released
+
+    def release(self,path):
+        #The file has been read for the last time.
+        key=self.key(path)
+        with self.lock:
+            if self.files.pop(key,None) is not None: self.released.add(key)
+
+    def find(self,path):
+        key=self.key(path)
+        with self.lock: return (key,) if key in self.files else None
+
+    def read(self,key):
+        with self.lock: return self.files[key]
+
+    def open(self,location):
+        #For packfile.openFile, the file is in memory anyway.
+        return io.BytesIO(self.read(*location))
+
+    def names(self,prefix):
+        #All names that start with prefix, sorted like the index of a pack.
+        key=prefix.lower()
+        with self.lock: return sorted(name for name in self.files if name.startswith(key))
+
+    def publish(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def sync(self):
+        pass
+
+    def finish(self):
+        self.files.clear()
+        packfile.mounted=None
+
+sinks={"directory":DirectorySink,"pack":PackSink,"null":NullSink,"memory":MemorySink}
@@ -0,0 +1,200 @@
+#Compressed-at-rest dump files. With compressLevel set in the dumper, every extracted file is stored as a series of independent
+#zstd frames of frameSize bytes each, followed by a seek table in the zstd seekable format (contrib/seekable_format in the zstd sources):
+#a skippable frame with the compressed and decompressed size of every frame, then the number of frames, a descriptor byte and a magic.
+#The file names stay the same. packfile.openFile recognizes these files and returns a file object that only decompresses
+#the frames that are actually read, so the scripts working on the dump don't need to know about it.
+import ctypes
+import io
+import threading
+from struct import pack,unpack
+
+frameSize=1<<20 #decompressed bytes per frame, a read never has to decompress more than one frame it doesn't need
+wholeFileSize=4<<20 #files up to this size are decompressed in one go when they're opened
+
+frameMagic=b"\x28\xb5\x2f\xfd"
+skippableMagic=0x184D2A5E
+seekableMagic=0x8F92EAB1
+footerSize=9 #"<IBI"
+
+libzstd=None
+local=threading.local() #compression and decompression contexts are per thread
+frameCache=None #shared cache of decompressed frames with get(key) and put(key,value,size), set by long-running tools like the daemon
+
+def loadLibrary():
+    #Loaded on first use, so the dll is only needed when the dump is compressed.
+    global libzstd
+    if libzstd: return libzstd
+    lib=ctypes.cdll.LoadLibrary(r"..\thirdparty\libzstd")
+    lib.ZSTD_compressBound.restype=ctypes.c_size_t
+    lib.ZSTD_compressBound.argtypes=[ctypes.c_size_t]
+    lib.ZSTD_createCCtx.restype=ctypes.c_void_p
+    lib.ZSTD_createDCtx.restype=ctypes.c_void_p
+    lib.ZSTD_compressCCtx.restype=ctypes.c_size_t
+    lib.ZSTD_compressCCtx.argtypes=[ctypes.c_void_p,ctypes.c_void_p,ctypes.c_size_t,ctypes.c_char_p,ctypes.c_size_t,ctypes.c_int]
+    lib.ZSTD_decompressDCtx.restype=ctypes.c_size_t
+    lib.ZSTD_decompressDCtx.argtypes=[ctypes.c_void_p,ctypes.c_void_p,ctypes.c_size_t,ctypes.c_char_p,ctypes.c_size_t]
+    lib.ZSTD_isError.restype=ctypes.c_uint
+    lib.ZSTD_isError.argtypes=[ctypes.c_size_t]
+    libzstd=lib
+    return lib
+
+def compress(data,level):
+    lib=loadLibrary()
+    if not hasattr(local,"cctx"):
+        local.cctx=ctypes.c_void_p(lib.ZSTD_createCCtx())
+        local.cbuf=ctypes.create_string_buffer(lib.ZSTD_compressBound(frameSize))
+    size=lib.ZSTD_compressCCtx(local.cctx,local.cbuf,len(local.cbuf),data,len(data),level)
+    if lib.ZSTD_isError(size): raise Exception("zstd compression failed")
+    return ctypes.string_at(local.cbuf,size)
+
+def decompress(data,size):
+    lib=loadLibrary()
+    if not hasattr(local,"dctx"): local.dctx=ctypes.c_void_p(lib.ZSTD_createDCtx())
+    dst=ctypes.create_string_buffer(size)
+    result=lib.ZSTD_decompressDCtx(local.dctx,dst,size,data,len(data))
+    if lib.ZSTD_isError(result) or result!=size: raise Exception("Corrupt zstd frame")
+    return dst.raw
+
+class Compressor:
+    #Target wrapper, compresses everything written to it into the target it wraps. tell() counts decompressed bytes.
+    def __init__(self,target,level):
+        self.target=target
+        self.level=level
+        self.pending=list()
+        self.pendingLength=0
+        self.length=0
+        self.frames=list() #(compressed size, decompressed size)
+        self.closed=False
+
+    def write(self,data):
+        self.length+=len(data)
+        self.pending.append(data)
+        self.pendingLength+=len(data)
+        if self.pendingLength>=frameSize: self.compressPending(False)
+
+    def tell(self):
+        return self.length
+
+    def compressPending(self,final):
+        #Compress all complete frames, and the incomplete last one too if final.
+        data=b"".join(self.pending)
+        end=len(data) if final else len(data)-len(data)%frameSize
+        for offset in range(0,end,frameSize):
+            self.writeFrame(data[offset:offset+frameSize])
+        if final and not self.frames: self.writeFrame(b"") #an empty file still gets one frame so it's recognized
+        rest=data[end:]
+        self.pending=[rest] if rest else list()
+        self.pendingLength=len(rest)
+
+    def writeFrame(self,data):
+        frame=compress(data,self.level)
+        self.target.write(frame)
+        self.frames.append((len(frame),len(data)))
+
+    def close(self):
+        #Write the last frame and the seek table. The wrapped target is left open for the sink.
+        if self.closed: return
+        self.closed=True
+        self.compressPending(True)
+        table=b"".join(pack("<II",compressedSize,size) for compressedSize, size in self.frames)
+        self.target.write(pack("<II",skippableMagic,len(table)+footerSize)+table+pack("<IBI",len(self.frames),0,seekableMagic))
+
+class ZstdFile:
+    #Read-only file object on a compressed dump file. Keeps the last decompressed frame around for the many small reads of the parsers.
+    def __init__(self,f,frames):
+        self.f=f
+        self.name=f.name
+        self.offsets=list() #(compressed offset, decompressed offset) of every frame
+        self.frames=frames
+        compressedOffset=decompressedOffset=0
+        for compressedSize, size in frames:
+            self.offsets.append((compressedOffset,decompressedOffset))
+            compressedOffset+=compressedSize
+            decompressedOffset+=size
+        self.size=decompressedOffset
+        self.pos=0
+        self.frameIndex=-1
+        self.frame=b""
+        self.frameStart=0
+
+    def loadFrame(self,pos):
+        #Make the frame containing pos the current one.
+        i=self.frameIndex
+        if i<0 or not self.frameStart<=pos<self.frameStart+len(self.frame):
+            i=0
+            lo, hi = 0, len(self.frames)
+            while lo<hi: #last frame that starts at or before pos
+                mid=(lo+hi)//2
+                if self.offsets[mid][1]<=pos: i=mid; lo=mid+1
+                else: hi=mid
+            compressedOffset, self.frameStart = self.offsets[i]
+            compressedSize, size = self.frames[i]
+            self.frame=frameCache.get((self.name,i)) if frameCache is not None else None
+            if self.frame is None:
+                self.f.seek(compressedOffset)
+                self.frame=decompress(self.f.read(compressedSize),size)
+                if frameCache is not None: frameCache.put((self.name,i),self.frame,size)
+            self.frameIndex=i
+
+    def read(self,size=-1):
+        end=self.size if size is None or size<0 else min(self.pos+size,self.size)
+        if self.pos>=end: return b""
+        self.loadFrame(self.pos)
+        start=self.pos-self.frameStart
+        if end<=self.frameStart+len(self.frame): #the usual case, everything is in the current frame
+            self.pos=end
+            return self.frame[start:end-self.frameStart]
+        chunks=[self.frame[start:]]
+        self.pos=self.frameStart+len(self.frame)
+        while self.pos<end:
+            self.loadFrame(self.pos)
+            chunks.append(self.frame[:end-self.pos])
+            self.pos+=len(chunks[-1])
+        return b"".join(chunks)
+
+    def seek(self,offset,whence=0):
+        if whence==1: offset+=self.pos
+        elif whence==2: offset+=self.size
+        self.pos=max(offset,0)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+def readSeekTable(f):
+    #Frame sizes of a compressed dump file, or None if f is a regular file. Leaves f at the start.
+    frames=None
+    fileSize=f.seek(0,2)
+    f.seek(0)
+    if fileSize>=len(frameMagic)+8+footerSize and f.read(4)==frameMagic:
+        f.seek(-footerSize,2)
+        count, descriptor, magic = unpack("<IBI",f.read(footerSize))
+        entrySize=12 if descriptor&0x80 else 8 #optional checksums
+        tableSize=count*entrySize
+        if magic==seekableMagic and tableSize+footerSize+8<=fileSize:
+            f.seek(-footerSize-tableSize-8,2)
+            if unpack("<II",f.read(8))==(skippableMagic,tableSize+footerSize):
+                table=f.read(tableSize)
+                frames=[unpack("<II",table[i:i+8]) for i in range(0,tableSize,entrySize)]
+    f.seek(0)
+    return frames
+
+def openFile(f):
+    #Return a file object with the decompressed content of f, or f itself if it's not compressed.
+    frames=readSeekTable(f)
+    if frames is None: return f
+    zf=ZstdFile(f,frames)
+    if zf.size>wholeFileSize: return zf
+    data=io.BytesIO(zf.read())
+    data.name=f.name
+    f.close()
+    return data
@@ -0,0 +1,175 @@
+#Runs the dumpers for several installs at once. The jobs come from a JSON file with a list of objects like
+#    {"engine": "fb3", "game": "D:\\Games\\Need for Speed(TM) Rivals", "target": "E:\\GameRips\\NFS\\NFSR\\pc\\dump"}
+#and optionally "name", "workers" (worker threads of that dumper, --workers if it's not set), "args" (extra dumper arguments,
+#e.g. ["--profile"]) and "sourceDevice"/"targetDevice" (any label, for disks the script can't tell apart by itself).
+#All dumpers share one budget of worker threads. On top of that, only --sourceReaders dumpers read from the same physical disk
+#and only --targetWriters dumpers write to the same physical disk at a time, so every disk is kept busy without several streams
+#fighting over its heads. Jobs start in file order; a job whose disks are busy is passed over, one that only waits for worker
+#threads holds back the jobs after it, so large installs don't starve.
+#Each dumper writes its output to a log file, the results (wall time and the totals of each dumpStats.json) are printed and can be saved as JSON.
+#
+#Examples:
+#    python batchdump.py jobs.json
+#    python batchdump.py jobs.json --budget 12 --sourceReaders 1 --targetWriters 2 --output batch.json
+import argparse
+import collections
+import json
+import os
+import subprocess
+import sys
+import time
+
+rootDirectory=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+engineFolders={"fb3":"frostbite3","fb2":"frostbite2"}
+pollInterval=0.5 #seconds between checks for finished dumpers
+
+def existingPath(path):
+    #The target folder may not exist yet, its disk is the one of the closest folder above it that does.
+    path=os.path.abspath(path)
+    while not os.path.exists(path):
+        parent=os.path.dirname(path)
+        if parent==path: break
+        path=parent
+    return path
+
+def deviceOf(path):
+    #Name of the physical disk a path is on. On Linux the partition is looked up in sysfs to find its disk,
+    #elsewhere the volume (drive letter) has to do; set sourceDevice/targetDevice in the job file where that's not good enough.
+    if os.name=="nt":
+        return os.path.splitdrive(os.path.abspath(path))[0].upper()
+    st=os.stat(existingPath(path))
+    sysPath="/sys/dev/block/%d:%d" % (os.major(st.st_dev),os.minor(st.st_dev))
+    if not os.path.exists(sysPath):
+        return "dev%d:%d" % (os.major(st.st_dev),os.minor(st.st_dev)) #not a block device, e.g. tmpfs or a network share
+    sysPath=os.path.realpath(sysPath)
+    if os.path.isfile(os.path.join(sysPath,"partition")): sysPath=os.path.dirname(sysPath)
+    return os.path.basename(sysPath)
+
+class Job:
+    def __init__(self,index,spec,args):
+        if spec.get("engine") not in engineFolders:
+            raise Exception("Job %d: engine must be one of %s" % (index,", ".join(engineFolders)))
+        self.index=index
+        self.engine=spec["engine"]
+        self.game=os.path.normpath(spec["game"])
+        self.target=os.path.normpath(spec["target"])
+        self.name=spec.get("name") or os.path.basename(self.target)
+        #A job can't ask for more than the whole budget, it would never start.
+        self.workers=max(1,min(int(spec.get("workers",args.workers)),args.budget))
+        self.extraArgs=[str(arg) for arg in spec.get("args",list())]
+        self.sourceDevice=spec.get("sourceDevice") or deviceOf(self.game)
+        self.targetDevice=spec.get("targetDevice") or deviceOf(self.target)
+        self.logPath=os.path.join(args.logs,"%02d_%s.log" % (index,self.name))
+        self.process=None
+        self.log=None
+        self.start=0.0
+        self.wall=0.0
+
+    def run(self,python):
+        #The scripts use paths relative to their own folder for the thirdparty libraries.
+        cmd=[python,"dumper.py",self.game,self.target,str(self.workers)]+self.extraArgs
+        self.log=open(self.logPath,"w")
+        self.start=time.perf_counter()
+        self.process=subprocess.Popen(cmd,cwd=os.path.join(rootDirectory,engineFolders[self.engine]),stdout=self.log,stderr=subprocess.STDOUT)
+
+    def finish(self):
+        self.wall=time.perf_counter()-self.start
+        self.log.close()
+
+    def result(self):
+        result={"index":self.index,"name":self.name,"engine":self.engine,"game":self.game,"target":self.target,"workers":self.workers,
+                "sourceDevice":self.sourceDevice,"targetDevice":self.targetDevice,"returnCode":self.process.returncode,
+                "wall":self.wall,"log":self.logPath}
+        statsPath=os.path.join(self.target,"dumpStats.json")
+        if self.process.returncode==0 and os.path.isfile(statsPath):
+            f=open(statsPath,"r")
+            dumpStats=json.load(f)
+            f.close()
+            for key in ("entries","bytesIn","bytesOut"): result[key]=dumpStats.get(key)
+        return result
+
+class Budget:
+    #Worker threads left and dumpers per disk.
+    def __init__(self,args):
+        self.freeWorkers=args.budget
+        self.sourceReaders=args.sourceReaders
+        self.targetWriters=args.targetWriters
+        self.readers=collections.Counter() #source disk -> running dumpers
+        self.writers=collections.Counter() #target disk -> running dumpers
+
+    def devicesFree(self,job):
+        return self.readers[job.sourceDevice]<self.sourceReaders and self.writers[job.targetDevice]<self.targetWriters
+
+    def take(self,job):
+        self.freeWorkers-=job.workers
+        self.readers[job.sourceDevice]+=1
+        self.writers[job.targetDevice]+=1
+
+    def give(self,job):
+        self.freeWorkers+=job.workers
+        self.readers[job.sourceDevice]-=1
+        self.writers[job.targetDevice]-=1
+
+def startJobs(waiting,running,budget,python):
+    for job in list(waiting):
+        if not budget.devicesFree(job): continue
+        if job.workers>budget.freeWorkers: break #keep the threads that free up for this one
+        waiting.remove(job)
+        budget.take(job)
+        job.run(python)
+        running.append(job)
+        print("Started %s (%s, %d workers, reading %s, writing %s)" % (job.name,job.engine,job.workers,job.sourceDevice,job.targetDevice))
+
+def main():
+    parser=argparse.ArgumentParser(description="Run the dumpers for several installs at once, sharing threads and disks.")
+    parser.add_argument("jobFile",help="JSON file with the list of jobs")
+    parser.add_argument("--budget",type=int,default=os.cpu_count() or 1,help="worker threads of all running dumpers together")
+    parser.add_argument("--workers",type=int,default=4,help="worker threads of a dumper whose job doesn't set them")
+    parser.add_argument("--sourceReaders",type=int,default=1,help="dumpers reading from the same disk at once")
+    parser.add_argument("--targetWriters",type=int,default=1,help="dumpers writing to the same disk at once")
+    parser.add_argument("--logs",default=None,help="folder for the dumper logs, next to the job file by default")
+    parser.add_argument("--python",default=sys.executable,help="interpreter used for the dumpers")
+    parser.add_argument("--output",default=None,help="write the results to this JSON file")
+    args=parser.parse_args()
+    if args.budget<1 or args.workers<1 or args.sourceReaders<1 or args.targetWriters<1:
+        parser.error("--budget, --workers, --sourceReaders and --targetWriters must be at least 1")
+    if not args.logs: args.logs=os.path.splitext(args.jobFile)[0]+"_logs"
+    os.makedirs(args.logs,exist_ok=True)
+
+    f=open(args.jobFile,"r")
+    specs=json.load(f)
+    f.close()
+    waiting=[Job(i,spec,args) for i, spec in enumerate(specs)]
+    running=list()
+    results=list()
+    budget=Budget(args)
+
+    start=time.perf_counter()
+    while waiting or running:
+        startJobs(waiting,running,budget,args.python)
+        time.sleep(pollInterval)
+        for job in list(running):
+            if job.process.poll() is None: continue
+            job.finish()
+            running.remove(job)
+            budget.give(job)
+            result=job.result()
+            results.append(result)
+            if result["returnCode"]:
+                print("FAILED %s with exit code %d after %.1fs, see %s" % (job.name,result["returnCode"],job.wall,job.logPath))
+            elif "bytesOut" in result:
+                print("Finished %s in %.1fs: %d entries, %.1f MB in, %.1f MB out (%.1f MB/s)" % (job.name,job.wall,result["entries"],
+                      result["bytesIn"]/1048576,result["bytesOut"]/1048576,result["bytesOut"]/1048576/job.wall))
+            else:
+                print("Finished %s in %.1fs" % (job.name,job.wall))
+
+    failed=sum(1 for result in results if result["returnCode"])
+    print("%d jobs in %.1fs, %d failed" % (len(results),time.perf_counter()-start,failed))
+    if args.output:
+        f=open(args.output,"w")
+        json.dump(sorted(results,key=lambda result: result["index"]),f,indent=1)
+        f.close()
+    sys.exit(1 if failed else 0)
+
+if __name__=="__main__":
+    main()
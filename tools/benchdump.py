@@ -0,0 +1,112 @@
+#End-to-end dumper benchmark on a synthetic install written by geninstall.py.
+#The install is generated once per set of options and reused by later runs; the dump target is wiped before every run.
+#Results (wall time, throughput and the dumper's own dumpStats.json) are printed and written as JSON.
+#
+#Examples:
+#    python benchdump.py work --size 1G
+#    python benchdump.py work --engine fb2 --entries 100000 --repeat 3
+#    python benchdump.py work --size 10G --layout v4 --output results.json -- --profile
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import geninstall
+
+rootDirectory=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+engineFolders={"fb3":"frostbite3","fb2":"frostbite2"}
+
+def installName(args,engine):
+    #One folder per distinct set of generator options.
+    scale="s%d" % args.size if args.size else "e%d" % args.entries
+    name="%s_%s_%s_%s" % (engine,args.layout if engine=="fb3" else "v1",args.flavor,scale)
+    if args.patch: name+="_patch"
+    if args.encrypt: name+="_xor"
+    return name+"_seed%d" % args.seed
+
+def prepareInstall(args,engine):
+    installDir=os.path.join(args.workDir,"installs",installName(args,engine))
+    if os.path.isfile(os.path.join(installDir,"install.json")) and not args.regenerate:
+        return installDir
+
+    if os.path.isdir(installDir): shutil.rmtree(installDir)
+    print("Generating %s..." % installDir)
+    start=time.perf_counter()
+    summary=geninstall.generate(installDir,engine=engine,layout=args.layout,flavor=args.flavor,size=args.size,entries=args.entries,
+                                patch=args.patch,encrypt=args.encrypt,seed=args.seed,codecs=args.codecs)
+    print("Generated %d entries, %.1f MB in %.1fs" % (summary["entries"],summary["bytes"]/1048576,time.perf_counter()-start))
+    return installDir
+
+def runDumper(args,engine,installDir,run):
+    targetDir=os.path.join(args.workDir,"dump_"+engine)
+    if os.path.isdir(targetDir): shutil.rmtree(targetDir)
+
+    #The scripts use paths relative to their own folder for the thirdparty libraries.
+    cmd=[args.python,"dumper.py",installDir,targetDir]+args.dumperArgs
+    logPath=os.path.join(args.workDir,"%s_run%d.log" % (engine,run))
+    log=open(logPath,"w")
+    start=time.perf_counter()
+    ret=subprocess.call(cmd,cwd=os.path.join(rootDirectory,engineFolders[engine]),stdout=log,stderr=subprocess.STDOUT)
+    wall=time.perf_counter()-start
+    log.close()
+    if ret:
+        raise Exception("Dumper failed with exit code %d, see %s" % (ret,logPath))
+
+    f=open(os.path.join(targetDir,"dumpStats.json"),"r")
+    dumpStats=json.load(f)
+    f.close()
+
+    f=open(os.path.join(installDir,"install.json"),"r")
+    install=json.load(f)
+    f.close()
+
+    result={"engine":engine,"run":run,"install":installDir,"wall":wall,
+            "entries":dumpStats["entries"],"bytesIn":dumpStats["bytesIn"],"bytesOut":dumpStats["bytesOut"],
+            "mbpsIn":dumpStats["bytesIn"]/1048576/wall,"mbpsOut":dumpStats["bytesOut"]/1048576/wall,
+            "entriesPerSecond":dumpStats["entries"]/wall,"generated":install,"dumpStats":dumpStats}
+    if not args.keep: shutil.rmtree(targetDir)
+    return result
+
+def main():
+    parser=argparse.ArgumentParser(description="Run the dumpers against a synthetic install and report throughput.")
+    parser.add_argument("workDir",help="folder for generated installs, dumps and logs")
+    parser.add_argument("--engine",choices=("fb3","fb2","both"),default="both")
+    parser.add_argument("--layout",choices=("v1","v2","v3","v4"),default="v1",help="fb3 layout/cat version")
+    parser.add_argument("--flavor",choices=("cas","noncas","mixed"),default="mixed")
+    parser.add_argument("--size",type=geninstall.parseSize,default=None,help="install size in uncompressed payload bytes, e.g. 1G or 10G")
+    parser.add_argument("--entries",type=int,default=None,help="install size in bundle entries, e.g. 100000")
+    parser.add_argument("--codecs",default="lz4,zstd,zlib,stored")
+    parser.add_argument("--patch",action="store_true")
+    parser.add_argument("--encrypt",action="store_true")
+    parser.add_argument("--seed",type=int,default=1)
+    parser.add_argument("--repeat",type=int,default=1,help="number of dumps per engine")
+    parser.add_argument("--regenerate",action="store_true",help="write the install again even if it exists")
+    parser.add_argument("--keep",action="store_true",help="keep the last dump")
+    parser.add_argument("--python",default=sys.executable,help="interpreter used for the dumpers")
+    parser.add_argument("--output",default=None,help="write the results to this JSON file")
+    parser.add_argument("dumperArgs",nargs="*",help="extra arguments for dumper.py, after --")
+    args=parser.parse_args()
+    if not args.size and not args.entries: args.size=1<<30
+    args.workDir=os.path.abspath(args.workDir)
+    os.makedirs(args.workDir,exist_ok=True)
+
+    engines=("fb3","fb2") if args.engine=="both" else (args.engine,)
+    results=list()
+    for engine in engines:
+        installDir=prepareInstall(args,engine)
+        for run in range(args.repeat):
+            result=runDumper(args,engine,installDir,run)
+            results.append(result)
+            print("%s run %d: %.2fs, %d entries (%.0f/s), %.1f MB in (%.1f MB/s), %.1f MB out (%.1f MB/s)" % (engine,run,result["wall"],
+                  result["entries"],result["entriesPerSecond"],result["bytesIn"]/1048576,result["mbpsIn"],result["bytesOut"]/1048576,result["mbpsOut"]))
+
+    if args.output:
+        f=open(args.output,"w")
+        json.dump(results,f,indent=1)
+        f.close()
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,124 @@
+#End-to-end check of the frostbite3 dumper's convert mode (convertDirectory) and closure mode (selectEbx) on an install
+#written by geninstall.py --assets, which records in install.json what every sound, prop and scene ebx references.
+#  - convert: every .sps file ebxtoasset would write must come out with the right content, and nothing else.
+#  - closure: with the scenes selected, exactly the res and chunks of the scenes and the ebx they link to (directly or not) get extracted.
+#Exits with 1 if anything is off.
+#
+#Examples:
+#    python checkassets.py work
+#    python checkassets.py work --layout v4 --flavor noncas --patch --workers 0
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import geninstall
+
+rootDirectory=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+engineDirectory=os.path.join(rootDirectory,"frostbite3")
+selectedFolder="generated/scenes"
+
+def runDumper(args,installDir,name,options):
+    targetDir=os.path.join(args.workDir,name)
+    if os.path.isdir(targetDir): shutil.rmtree(targetDir)
+    logPath=os.path.join(args.workDir,name+".log")
+    log=open(logPath,"w")
+    ret=subprocess.call([args.python,"dumper.py",installDir,targetDir,str(args.workers)]+options,cwd=engineDirectory,stdout=log,stderr=subprocess.STDOUT)
+    log.close()
+    if ret:
+        raise Exception("Dumper failed with exit code %d, see %s" % (ret,logPath))
+    return targetDir
+
+def listFiles(folder):
+    #Paths relative to folder with forward slashes.
+    paths=list()
+    for dir0, dirs, ff in os.walk(folder):
+        for fname in ff:
+            paths.append(os.path.relpath(os.path.join(dir0,fname),folder).replace(os.sep,"/"))
+    return paths
+
+def compare(what,expected,found):
+    #Print the differences between two sets, returns True if they're equal.
+    missing=sorted(expected-found)
+    unexpected=sorted(found-expected)
+    for path in missing[:10]: print("  missing %s: %s" % (what,path))
+    for path in unexpected[:10]: print("  unexpected %s: %s" % (what,path))
+    if missing or unexpected:
+        print("  %d %s missing, %d unexpected" % (len(missing),what,len(unexpected)))
+    return not missing and not unexpected
+
+def checkConvert(args,installDir,assets):
+    convertDir=os.path.join(args.workDir,"converted")
+    if os.path.isdir(convertDir): shutil.rmtree(convertDir)
+    runDumper(args,installDir,"dump_convert",["--convert",convertDir])
+
+    expected=dict()
+    for asset in assets.values(): expected.update(asset["files"])
+    found=set(listFiles(convertDir))
+    ok=compare("sound",set(expected),found)
+    for path in sorted(found&set(expected)):
+        f=open(os.path.join(convertDir,path),"rb")
+        sha1=hashlib.sha1(f.read()).hexdigest()
+        f.close()
+        if sha1!=expected[path]:
+            print("  wrong content: %s" % path)
+            ok=False
+    print("convert: %d sounds %s" % (len(expected),"ok" if ok else "FAILED"))
+    return ok
+
+def checkClosure(args,installDir,assets):
+    dumpDir=runDumper(args,installDir,"dump_select",["--select",selectedFolder])
+
+    #The selected ebx and everything they link to.
+    todo=[name for name in assets if name.startswith(selectedFolder+"/")]
+    seen=set(todo)
+    res, chunks = set(), set()
+    while todo:
+        asset=assets[todo.pop()]
+        res.update(asset["res"])
+        chunks.update(asset["chunks"])
+        for name in asset["links"]:
+            if name not in seen:
+                seen.add(name)
+                todo.append(name)
+
+    foundRes=set(os.path.splitext(path)[0] for path in listFiles(os.path.join(dumpDir,"bundles","res")))
+    foundChunks=set()
+    for folder in (os.path.join(dumpDir,"chunks"),os.path.join(dumpDir,"bundles","chunks")):
+        foundChunks.update(path[:-6] for path in listFiles(folder))
+    ok=compare("res",res,foundRes)
+    ok=compare("chunk",chunks,foundChunks) and ok
+    print("closure: %d ebx, %d res, %d chunks %s" % (len(seen),len(res),len(chunks),"ok" if ok else "FAILED"))
+    return ok
+
+def main():
+    parser=argparse.ArgumentParser(description="Check the convert and closure modes of the frostbite3 dumper against what geninstall.py --assets recorded.")
+    parser.add_argument("workDir",help="folder for the install, the dumps and their logs")
+    parser.add_argument("--layout",choices=("v1","v2","v3","v4"),default="v2",help="fb3 layout/cat version")
+    parser.add_argument("--flavor",choices=("cas","noncas","mixed"),default="mixed")
+    parser.add_argument("--entries",type=int,default=2000,help="install size in bundle entries")
+    parser.add_argument("--bundles",type=int,default=4,help="bundles per superbundle, few of them spread the links across superbundles")
+    parser.add_argument("--patch",action="store_true")
+    parser.add_argument("--encrypt",action="store_true")
+    parser.add_argument("--seed",type=int,default=1)
+    parser.add_argument("--workers",type=int,default=4,help="worker threads of the dumper")
+    parser.add_argument("--python",default=sys.executable,help="interpreter used for the dumper")
+    args=parser.parse_args()
+    args.workDir=os.path.abspath(args.workDir)
+
+    installDir=os.path.join(args.workDir,"install")
+    if os.path.isdir(installDir): shutil.rmtree(installDir)
+    summary=geninstall.generate(installDir,engine="fb3",layout=args.layout,flavor=args.flavor,entries=args.entries,bundles=args.bundles,
+                                patch=args.patch,encrypt=args.encrypt,seed=args.seed,assets=True)
+    assets=summary["assets"]
+    print("Generated %d entries with %d asset ebx" % (summary["entries"],len(assets)))
+
+    ok=checkConvert(args,installDir,assets)
+    ok=checkClosure(args,installDir,assets) and ok
+    sys.exit(0 if ok else 1)
+
+if __name__=="__main__":
+    main()
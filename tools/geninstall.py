@@ -0,0 +1,1071 @@
+#Writes a synthetic but format-valid game install that the dumpers can extract.
+#Everything is generated from a seed so the same arguments always give the same install.
+#
+#Frostbite 3 layouts (--layout):
+#    v1: layout.toc without install manifest, single Data/cas.cat (readCat1), optional Update/Patch with delta bundles
+#    v2: layout.toc with install manifest but no install chunks, single Data/cas.cat (readCat2), optional patch as v1
+#    v3: install chunks with maxTotalSize, one cas.cat per install chunk (readCat3)
+#    v4: install chunks without maxTotalSize, one cas.cat per install chunk (readCat4)
+#Frostbite 2 installs always use the single Data/cas.cat layout, the patch uses common.dat and delta bundles.
+#With --x360 their sb files are compressed like on the X360, with zlib instead of LZX so xbstandin.py can decompress them.
+#With --assets fb3 installs also get sounds (SoundWaveAsset, NewWaveAsset and its NewWaveResource, with their chunks) and ebx
+#that link to them across files. install.json then lists what each of these ebx references, checkassets.py checks the dumper against it.
+#
+#Blocks are compressed with LZ4, Zstd, zlib or stored. If the LZ4/Zstd libraries from the thirdparty folder can't be loaded,
+#valid literal-only LZ4 blocks and raw Zstd frames are written instead so the install can still be generated anywhere.
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import io
+import json
+import os
+import random
+import struct
+import zlib
+from collections import OrderedDict
+from struct import pack
+
+def loadLibrary(name):
+    #Prefer the bundled library, then one installed on the system.
+    try: return ctypes.cdll.LoadLibrary(os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","thirdparty","lib"+name))
+    except OSError: pass
+    path=ctypes.util.find_library(name)
+    if not path: return None
+    try: return ctypes.cdll.LoadLibrary(path)
+    except OSError: return None
+
+liblz4=loadLibrary("lz4")
+libzstd=loadLibrary("zstd")
+
+blockSize=0x10000 #uncompressed size of a single fb3 block
+casMaxSize=0x40000000 #start a new cas_XX.cas after 1 GB
+
+def hasher(keyword): #32bit FNV-1 hash with FNV_offset_basis = 5381 and FNV_prime = 33
+    hash = 5381
+    for byte in keyword:
+        hash = (hash*33) ^ ord(byte)
+        hash &= 0xffffffff
+    return hash
+
+def parseSize(text):
+    #"1G" -> 1073741824, "500M", "64K" or plain bytes
+    text=text.strip().upper()
+    units={"K":1<<10,"M":1<<20,"G":1<<30,"T":1<<40}
+    if text[-1:] in units: return int(float(text[:-1])*units[text[-1]])
+    return int(text)
+
+
+
+#DbObject (binary JSON) writer, the inverse of dbo.DbObject.
+class Sha1(bytes): pass
+class Blob(bytes): pass
+class Long(int): pass
+
+class Guid:
+    def __init__(self,num1,num2,num3,num4):
+        self.val=num1,num2,num3,num4
+    def random(rng):
+        return Guid(rng.getrandbits(32),rng.getrandbits(16),rng.getrandbits(16),rng.getrandbits(64))
+    def encode(self,bigEndian):
+        end=">" if bigEndian else "<"
+        return pack(end+"IHH",*self.val[:3])+pack(">Q",self.val[3])
+    def format(self):
+        return "%08X-%04X-%04X-%04X-%012X" % (self.val[0],self.val[1],self.val[2],
+                                             (self.val[3]>>48)&0xFFFF,self.val[3]&0x0000FFFFFFFFFFFF)
+
+def encode7bit(num):
+    result=bytearray()
+    while 1:
+        byte=num&0x7f
+        num>>=7
+        if num:
+            result.append(byte|0x80)
+        else:
+            result.append(byte)
+            return bytes(result)
+
+def dbObject(value,name=None):
+    #name=None writes an anonymous entry (root objects and list members).
+    def header(typ):
+        if name is None: return bytes([typ|0x80])
+        return bytes([typ])+name.encode()+b"\x00"
+
+    if isinstance(value,dict):
+        content=b"".join(dbObject(val,key) for key, val in value.items())+b"\x00"
+        return header(0x02)+encode7bit(len(content))+content
+    elif isinstance(value,list):
+        content=b"".join(dbObject(val) for val in value)+b"\x00"
+        return header(0x01)+encode7bit(len(content))+content
+    elif isinstance(value,bool):
+        return header(0x06)+pack("<?",value)
+    elif isinstance(value,Long):
+        return header(0x09)+pack("<Q",value)
+    elif isinstance(value,int):
+        if value>0xFFFFFFFF: return header(0x09)+pack("<Q",value)
+        return header(0x08)+pack("<I",value)
+    elif isinstance(value,str):
+        data=value.encode()
+        return header(0x07)+encode7bit(len(data)+1)+data+b"\x00"
+    elif isinstance(value,Guid):
+        return header(0x0F)+value.encode(False)
+    elif isinstance(value,Sha1):
+        return header(0x10)+bytes(value)
+    elif isinstance(value,Blob):
+        return header(0x13)+encode7bit(len(value))+bytes(value)
+    raise TypeError("Can't encode %r as DbObject" % (value,))
+
+def signedFile(data,rng,encrypt):
+    #Wrap toc/cat data the way the game does: either XOR encrypted with a random key or with an empty key.
+    if not encrypt:
+        #Empty signature and a key of 0x7b bytes (which decodes to all zeroes), readable as plain data by both engines.
+        return b"\x00\xD1\xCE\x01"+bytes(292)+b"\x7b"*260+data
+
+    key=bytes(rng.getrandbits(8) for i in range(257))
+    keyStream=(key*(len(data)//257+1))[:len(data)]
+    encrypted=(int.from_bytes(data,"little")^int.from_bytes(keyStream,"little")).to_bytes(len(data),"little")
+    return b"\x00\xD1\xCE\x00"+bytes(292)+bytes(byte^0x7b for byte in key)+b"\x7b"*3+encrypted
+
+def openFile(path):
+    os.makedirs(os.path.dirname(path),exist_ok=True)
+    return open(path,"wb")
+
+def writeFile(path,data):
+    f=openFile(path)
+    f.write(data)
+    f.close()
+
+
+
+#Payload content.
+def makeData(rng,size):
+    #Semi-compressible data: random runs repeated a few times, roughly what real chunks compress to.
+    out=bytearray()
+    while len(out)<size:
+        run=rng.randbytes(rng.randint(16,256))
+        out+=run*rng.randint(1,8)
+    return bytes(out[:size])
+
+def spsStream(rng):
+    #Sound samples the way ebx.extractSPS reads them: a header block (0x48), data blocks (0x44) and an empty last block (0x45).
+    blocks=[pack(">I",(0x48<<24)|12)+rng.randbytes(8)]
+    for i in range(rng.randint(1,8)):
+        size=rng.randrange(64,8192,4)
+        blocks.append(pack(">I",(0x44<<24)|size)+makeData(rng,size-4))
+    blocks.append(pack(">I",(0x45<<24)|4))
+    return b"".join(blocks)
+
+def soundChunk(rng,numSegments):
+    #Chunk with the samples of a few segments, each one after its seek table.
+    #Returns the chunk and (samples offset, seek table offset, samples) per segment.
+    data=bytearray()
+    segments=list()
+    for i in range(numSegments):
+        seekTableOffset=len(data)
+        data+=rng.randbytes(rng.randrange(0,64,4))
+        samples=spsStream(rng)
+        segments.append((len(data),seekTableOffset,samples))
+        data+=samples
+    return bytes(data), segments
+
+def newWaveBank(chunks,segments,variations):
+    #NewWaveResource: a Harmony sample bank (see sbr.py) with the chunks (chunk id, size), segments (samples offset, seek table offset, length)
+    #and variations (chunk index, first segment index, segment count) of a NewWaveAsset. Every field is a plain list of values.
+    def bits(val): return struct.unpack("<I",pack("<f",val))[0]
+    dataSets=[("Chunks",len(chunks),[("ChunkId",0x8,[1+16*i for i in range(len(chunks))]), #pointers are 1 too large
+                                     ("ChunkSize",0x2,[size for chunkId, size in chunks])],b"".join(chunkId.encode(False) for chunkId, size in chunks)),
+              ("Segments",len(segments),[("SamplesOffset",0x2,[segment[0] for segment in segments]),
+                                         ("SeekTableOffset",0x2,[segment[1] for segment in segments]),
+                                         ("Duration",0x5,[bits(segment[2]) for segment in segments])],b""),
+              ("Variations",len(variations),[("MemoryChunkIndex",0x2,[variation[3] for variation in variations]),
+                                             ("StreamChunkIndex",0x2,[variation[4] for variation in variations]),
+                                             ("FirstSegmentIndex",0x2,[variation[1] for variation in variations]),
+                                             ("SegmentCount",0x2,[variation[2] for variation in variations])],b"")]
+    out=io.BytesIO()
+    out.write(b"SBle"+bytes(0x40))
+    tableOffset=out.tell()
+    out.write(bytes(8*len(dataSets)))
+    dsetOffsets=list()
+    for name, numElems, fields, data in dataSets:
+        dsetOffsets.append(out.tell())
+        tablesOffset=out.tell()+0x48+0x18*len(fields)
+        header=bytearray(0x48)
+        header[0x00:0x04]=pack("<I",0x44534554)
+        header[0x08:0x0C]=pack("<I",hasher(name))
+        header[0x18:0x1C]=pack("<I",tablesOffset+8*numElems*len(fields)) #data after the tables
+        header[0x38:0x3C]=pack("<I",numElems)
+        header[0x3C:0x3E]=pack("<H",len(fields))
+        out.write(header)
+        for i, (fname, dataType, values) in enumerate(fields):
+            out.write(pack("<IBBHQII",hasher(fname),dataType,0x04,0,0,tablesOffset+8*numElems*i,0))
+        for fname, dataType, values in fields:
+            out.write(b"".join(pack("<Q",val) for val in values))
+        out.write(data)
+
+    bank=bytearray(out.getvalue())
+    bank[0x0A:0x0C]=pack("<H",len(dataSets))
+    bank[0x18:0x1C]=pack("<I",tableOffset)
+    for i, offset in enumerate(dsetOffsets):
+        bank[tableOffset+8*i:tableOffset+8*i+4]=pack("<I",offset)
+    return bytes(bank)
+
+class EbxBuilder:
+    #Minimal but complete ebx: a primary asset instance (CString name, ints, float, array, link and for fb3 a ResourceRef)
+    #followed by a number of small node instances.
+    def __init__(self,engine):
+        self.engine=engine
+
+    def build(self,rng,name,numNodes,resRid,assetType="GeneratedAsset",link=None):
+        #Returns the file GUID, the GUID of the primary instance and the ebx. link is the (file GUID, instance GUID) of an instance
+        #in another ebx that the Link field points to instead of the first node.
+        fb3=self.engine=="fb3"
+        fileGuid=Guid.random(rng)
+        keywords=[assetType,"Name","Id","Scale","Values","Link","member","GeneratedAsset-Values","GeneratedNode","Index","Weight"]
+        if fb3: keywords.append("Resource")
+
+        #(name, type, ref, offset); field types are stored in bits 4-8
+        fields=[("Name",0x07,0,0),("Id",0x10,0,4),("Scale",0x13,0,8),("Values",0x04,1,12),("Link",0x03,0,16)]
+        if fb3: fields.append(("Resource",0x17,0,24))
+        assetFields=len(fields)
+        fields.append(("member",0x10,0,0))
+        fields+=[("Index",0x0F,0,0),("Weight",0x13,0,4)]
+
+        #(name, fieldStartIndex, numField, alignment, size)
+        complexes=[(assetType,0,assetFields,16,32),("GeneratedAsset-Values",assetFields,1,4,4),("GeneratedNode",assetFields+1,2,16,8)]
+
+        numValues=rng.randint(0,16)
+        arraySection=b"".join(pack("<I",rng.getrandbits(32)) for i in range(numValues))
+
+        guids=[Guid.random(rng) for i in range(numNodes+1)]
+        instances=list()
+        if link: linkValue=0x80000000 #first external GUID
+        else: linkValue=2 if numNodes else 0 #first node
+        asset=pack("<IIfII",0,rng.getrandbits(32),rng.random(),0,linkValue)
+        if fb3: asset+=pack("<IQ",0,resRid)
+        else: asset+=bytes(12)
+        instances.append((guids[0],asset))
+        for i in range(numNodes):
+            instances.append((guids[i+1],pack("<if",i,rng.random())))
+
+        repeaters=[(0,1)]
+        if numNodes: repeaters.append((2,numNodes))
+        return fileGuid, guids[0], self.assemble(fileGuid,keywords,fields,complexes,repeaters,instances,name,
+                                                 [(arraySection,numValues,1)],[link] if link else [])
+
+    def buildSoundWave(self,rng,name,chunks,segments,variations):
+        #SoundWaveAsset (fb3 only) with its chunks (chunk id, size), segments (samples offset, seek table offset, length)
+        #and variations (chunk index, first segment index, segment count) in arrays of value types.
+        fileGuid=Guid.random(rng)
+        keywords=["SoundWaveAsset","Name","Chunks","Segments","RuntimeVariations","Resource","member",
+                  "SoundWaveAsset-Chunks","SoundWaveAsset-Segments","SoundWaveAsset-RuntimeVariations",
+                  "SoundDataChunk","ChunkId","ChunkSize","SoundWaveSegment","SamplesOffset","SeekTableOffset","SegmentLength",
+                  "SoundWaveVariation","ChunkIndex","FirstSegmentIndex","SegmentCount"]
+        fields=[("Name",0x07,0,0),("Chunks",0x04,1,4),("Segments",0x04,2,8),("RuntimeVariations",0x04,3,12),("Resource",0x17,0,16),
+                ("member",0x02,4,0),("member",0x02,5,0),("member",0x02,6,0),
+                ("ChunkId",0x15,0,0),("ChunkSize",0x10,0,16),
+                ("SamplesOffset",0x10,0,0),("SeekTableOffset",0x10,0,4),("SegmentLength",0x13,0,8),
+                ("ChunkIndex",0x10,0,0),("FirstSegmentIndex",0x10,0,4),("SegmentCount",0x10,0,8)]
+        complexes=[("SoundWaveAsset",0,5,16,24),("SoundWaveAsset-Chunks",5,1,4,4),("SoundWaveAsset-Segments",6,1,4,4),
+                   ("SoundWaveAsset-RuntimeVariations",7,1,4,4),("SoundDataChunk",8,2,4,20),("SoundWaveSegment",10,3,4,12),
+                   ("SoundWaveVariation",13,3,4,12)]
+        arrays=[(b"".join(chunkId.encode(False)+pack("<I",size) for chunkId, size in chunks),len(chunks),1),
+                (b"".join(pack("<IIf",*segment) for segment in segments),len(segments),2),
+                (b"".join(pack("<III",*variation) for variation in variations),len(variations),3)]
+        instanceGuid=Guid.random(rng)
+        asset=pack("<IIIIQ",0,0,1,2,0)
+        return fileGuid, instanceGuid, self.assemble(fileGuid,keywords,fields,complexes,[(0,1)],[(instanceGuid,asset)],name,arrays,[])
+
+    def assemble(self,fileGuid,keywords,fields,complexes,repeaters,instances,name,arrays,externals):
+        #repeaters are (complex index, count) of the instances, which are (GUID, data) with the name at string offset 0.
+        #arrays are (data, count, complex index) in the order the array fields refer to them, externals are (file GUID, instance GUID).
+        fb3=self.engine=="fb3"
+        stringSection=name.encode()+b"\x00"
+        while len(stringSection)%16: stringSection+=b"\x00"
+
+        keywordData=b"\x00".join(keyword.encode() for keyword in keywords)+b"\x00"
+        while len(keywordData)%16: keywordData+=b"\x00"
+
+        meta=io.BytesIO()
+        if fb3:
+            meta.write(fileGuid.encode(False))
+            while (meta.tell()+40)%16: meta.write(b"\x00")
+            for extFileGuid, extInstanceGuid in externals: meta.write(extFileGuid.encode(False)+extInstanceGuid.encode(False))
+        else:
+            meta.write(fileGuid.encode(False))
+            meta.write(instances[0][0].encode(False)) #primary instance
+        meta.write(keywordData)
+        for fname, typ, ref, offset in fields:
+            meta.write(pack("<IHHii" if fb3 else "<IHHII",hasher(fname),typ<<4,ref,offset,0))
+        for cname, start, num, align, size in complexes:
+            meta.write(pack("<IIBBHHH",hasher(cname),start,num,align,0,size,0))
+        for complexIndex, count in repeaters:
+            if fb3: meta.write(pack("<HH",complexIndex,count))
+            else: meta.write(pack("<III",0,count,complexIndex))
+        headerSize=40 if fb3 else 48
+        while (headerSize+meta.tell())%16: meta.write(b"\x00")
+        arraySection=bytearray()
+        for data, count, complexIndex in arrays:
+            meta.write(pack("<III",len(arraySection),count,complexIndex))
+            arraySection+=data
+        while (headerSize+meta.tell())%16: meta.write(b"\x00")
+        absStringOffset=headerSize+meta.tell()
+
+        payloadStart=absStringOffset+len(stringSection)
+        payload=bytearray()
+        def alignPayload(base):
+            while (base+len(payload))%16: payload.append(0)
+        for guid, data in instances:
+            if fb3: alignPayload(payloadStart)
+            payload+=guid.encode(False)+data
+        alignPayload(payloadStart)
+
+        if fb3:
+            header=pack("<3I6H3I",absStringOffset,len(stringSection)+len(payload)+len(arraySection),len(externals),
+                        len(repeaters),len(repeaters),0,len(complexes),len(fields),len(keywordData),
+                        len(stringSection),len(arrays),len(payload))
+        else:
+            header=pack("<11I",absStringOffset,len(stringSection)+len(payload)+len(arraySection),0,0,
+                        len(repeaters),len(complexes),len(fields),len(keywordData),
+                        len(stringSection),len(arrays),len(payload))
+        return b"\xCE\xD1\xB2\x0F"+header+meta.getvalue()+stringSection+bytes(payload)+bytes(arraySection)
+
+
+
+#Block encoders.
+def lz4Literals(data):
+    #A single LZ4 sequence with literals only. Valid for any decoder, just not compressed.
+    size=len(data)
+    if size<15: return bytes([size<<4])+data
+    ext=bytearray([0xF0])
+    rest=size-15
+    while rest>=255:
+        ext.append(255)
+        rest-=255
+    ext.append(rest)
+    return bytes(ext)+data
+
+def zstdRawFrame(data):
+    #Zstd frame with a single raw block: single segment, 4 byte content size.
+    return pack("<IB",0xFD2FB528,0xA0)+pack("<I",len(data))+pack("<I",(len(data)<<3)|1)[:3]+data
+
+def compressLz4(data):
+    if not liblz4: return lz4Literals(data)
+    bound=liblz4.LZ4_compressBound(len(data))
+    dst=ctypes.create_string_buffer(bound)
+    size=liblz4.LZ4_compress_default(data,dst,len(data),bound)
+    return dst.raw[:size]
+
+def compressZstd(data):
+    if not libzstd: return zstdRawFrame(data)
+    libzstd.ZSTD_compressBound.restype=ctypes.c_size_t
+    libzstd.ZSTD_compress.restype=ctypes.c_size_t
+    libzstd.ZSTD_compress.argtypes=[ctypes.c_void_p,ctypes.c_size_t,ctypes.c_void_p,ctypes.c_size_t,ctypes.c_int]
+    bound=libzstd.ZSTD_compressBound(len(data))
+    dst=ctypes.create_string_buffer(bound)
+    size=libzstd.ZSTD_compress(dst,bound,data,len(data),3)
+    return dst.raw[:size]
+
+comTypes={"stored":0x00,"zlib":0x02,"lz4":0x09,"zstd":0x0f}
+
+def fb3Block(data,codec):
+    if codec=="lz4": comp=compressLz4(data)
+    elif codec=="zstd": comp=compressZstd(data)
+    elif codec=="zlib": comp=zlib.compress(data,1)
+    else: comp=data
+    if len(comp)>=len(data) and codec!="lz4" and codec!="zstd":
+        codec, comp = "stored", data
+    return pack(">II",len(data),(comTypes[codec]<<24)|(7<<20)|len(comp))+comp
+
+def fb3Blocks(data,codecs,rng):
+    #Returns a list of encoded blocks, each block picks its codec from the list.
+    blocks=list()
+    for i in range(0,max(len(data),1),blockSize):
+        blocks.append(fb3Block(data[i:i+blockSize],rng.choice(codecs)))
+    return blocks
+
+def fb2Payload(data,compressed):
+    #fb2 zlib payloads are blocks of (uncompressed size, compressed size, zlib data). Uncompressed payloads are stored as is.
+    if not compressed: return data
+    out=bytearray()
+    for i in range(0,max(len(data),1),blockSize):
+        comp=zlib.compress(data[i:i+blockSize],1)
+        out+=pack(">II",len(data[i:i+blockSize]),len(comp))+comp
+    return bytes(out)
+
+
+
+class CasWriter:
+    #Appends payloads to cas_XX.cas files in a directory and collects the matching cat entries.
+    def __init__(self,directory,version):
+        self.directory=directory
+        self.version=version
+        self.casNum=0
+        self.f=None
+        self.entries=OrderedDict() #sha1 -> (offset, size, casNum)
+
+    def add(self,data):
+        sha1=hashlib.sha1(data).digest()
+        if sha1 in self.entries: return sha1
+        if not self.f or self.f.tell()+len(data)>casMaxSize:
+            if self.f: self.f.close()
+            self.casNum+=1
+            os.makedirs(self.directory,exist_ok=True)
+            self.f=open(os.path.join(self.directory,"cas_%02d.cas" % self.casNum),"wb")
+        self.entries[sha1]=(self.f.tell(),len(data),self.casNum)
+        self.f.write(data)
+        return sha1
+
+    def close(self,rng,encrypt):
+        if self.f: self.f.close()
+        cat=io.BytesIO()
+        cat.write(b"NyanNyanNyanNyan")
+        if self.version==2 or self.version==3: cat.write(pack("<II",len(self.entries),0))
+        elif self.version==4: cat.write(pack("<IIQQ",len(self.entries),0,0,0))
+        for sha1, (offset, size, casNum) in self.entries.items():
+            cat.write(sha1)
+            if self.version<3: cat.write(pack("<III",offset,size,casNum))
+            else: cat.write(pack("<IIII",offset,size,0,casNum))
+        writeFile(os.path.join(self.directory,"cas.cat"),signedFile(cat.getvalue(),rng,encrypt))
+
+
+
+class Entry:
+    def __init__(self,kind,name,size):
+        self.kind=kind #ebx, res, chunk
+        self.name=name #name for ebx/res, Guid for chunks
+        self.size=size
+        self.seed=None
+        self.data=None #content that must stay as it is (ebx, sounds), the rest is generated from seed
+
+    def getData(self):
+        #Payloads are regenerated from their seed whenever they're needed so large installs don't have to fit into memory.
+        if self.data is not None: return self.data
+        return makeData(random.Random(self.seed),self.size)
+
+class Generator:
+    def __init__(self,args):
+        self.args=args
+        self.rng=random.Random(args.seed)
+        self.engine=args.engine
+        self.codecs=args.codecs.split(",")
+        self.ebx=EbxBuilder(self.engine)
+        self.summary={"engine":self.engine,"layout":args.layout,"superbundles":0,"bundles":0,"entries":0,"bytes":0}
+        self.resTypes=[hasher(name) for name in ("texture","meshset","swfmovie","newwaveresource","animtrackdata")]
+        self.dupPool=list() #entries reused by other bundles, like shared assets in a real game
+        if args.assets:
+            if self.engine!="fb3": raise ValueError("Sound assets are only generated for fb3.")
+            #What every asset ebx references, for checkassets.py: name -> type, linked ebx, res, chunks and the files ebxtoasset makes of it.
+            self.summary["assets"]=OrderedDict()
+            self.sounds=list() #ebx other ebx can link to
+            self.props=list()
+            self.tocAssetChunks=list() #sound chunks that go into the toc of the current superbundle
+
+    def pickSize(self,kind):
+        rng=self.rng
+        if kind=="ebx": return rng.randint(1,6) #number of node instances
+        if kind=="res": return int(2**rng.uniform(9,16))
+        return int(2**rng.uniform(12,22)) #4 kB to 4 MB chunks
+
+    def newEntry(self,kind,index):
+        rng=self.rng
+        if self.dupPool and rng.random()<0.1:
+            old=rng.choice(self.dupPool)
+            if old.kind==kind: return old
+
+        if kind=="chunk":
+            guid=Guid.random(rng)
+            if self.engine=="fb2": guid.val=guid.val[:3]+(guid.val[3]|1,) #compressed chunk
+            entry=Entry(kind,guid,self.pickSize(kind))
+            entry.seed=rng.getrandbits(64)
+        elif kind=="ebx":
+            entry=Entry(kind,"generated/%s_%05d" % (rng.choice(("level","audio/music","ui","vehicles")),index),0)
+            entry.resRid=rng.getrandbits(63)|1
+            entry.guid, entry.instanceGuid, entry.data = self.ebx.build(rng,entry.name,self.pickSize(kind),entry.resRid)
+            entry.size=len(entry.data)
+        else:
+            entry=Entry(kind,"generated/res/res_%05d" % index,self.pickSize(kind))
+            entry.seed=rng.getrandbits(64)
+            entry.resType=rng.choice(self.resTypes)
+            entry.resMeta=rng.randbytes(16)
+            entry.resRid=rng.getrandbits(63)|1
+
+        if rng.random()<0.2: self.dupPool.append(entry)
+        return entry
+
+    def planBundle(self,numEntries):
+        #Ebx first, then res, then chunks, like real bundles.
+        entries=list()
+        for i in range(numEntries):
+            roll=self.rng.random()
+            kind="ebx" if roll<0.4 else "res" if roll<0.7 else "chunk"
+            entries.append(self.newEntry(kind,self.summary["entries"]+i))
+        if self.args.assets:
+            for i in range(self.rng.randint(0,3)): entries+=self.assetEntries()
+        entries.sort(key=lambda entry: ("ebx","res","chunk").index(entry.kind))
+
+        #Drop duplicate names within one bundle.
+        seen=set()
+        result=list()
+        for entry in entries:
+            key=(entry.kind,entry.name if entry.kind!="chunk" else entry.name.val)
+            if key in seen: continue
+            seen.add(key)
+            result.append(entry)
+
+        self.summary["entries"]+=len(result)
+        self.summary["bytes"]+=sum(entry.size for entry in result)
+        return result
+
+    def assetEntries(self):
+        #A sound (SoundWaveAsset or NewWaveAsset with its NewWaveResource) and its chunks, or an ebx that links to another ebx
+        #in another file: props link to sounds, scenes to sounds or props. Props and scenes may point at a res of their own.
+        rng=self.rng
+        index=len(self.summary["assets"])
+        roll=rng.random()
+        if roll<0.6: return self.soundEntries("generated/audio/sounds/wave_%05d" % index,roll<0.3)
+        kind="scene" if roll<0.8 else "prop"
+        name="generated/%ss/%s_%05d" % (kind,kind,index)
+        targets=self.sounds+self.props if kind=="scene" else self.sounds
+        link=rng.choice(targets) if targets and rng.random()<0.9 else None
+
+        entries=list()
+        resRid=rng.getrandbits(63)|1 #usually points at nothing, like in the other generated ebx
+        if rng.random()<0.5:
+            resEntry=Entry("res",name+"_data",self.pickSize("res"))
+            resEntry.seed=rng.getrandbits(64)
+            resEntry.resType=rng.choice(self.resTypes[:3])
+            resEntry.resMeta=rng.randbytes(16)
+            resEntry.resRid=resRid
+            entries.append(resEntry)
+
+        entry=Entry("ebx",name,0)
+        entry.guid, entry.instanceGuid, entry.data = self.ebx.build(rng,name,rng.randint(0,3),resRid,link=(link.guid,link.instanceGuid) if link else None)
+        entry.size=len(entry.data)
+        entries.insert(0,entry)
+        if kind=="prop": self.props.append(entry)
+        self.summary["assets"][name]=OrderedDict([("type","GeneratedAsset"),("links",[link.name] if link else []),
+                                                  ("res",[res.name for res in entries[1:]]),("chunks",[]),("files",OrderedDict())])
+        return entries
+
+    def soundEntries(self,name,newWave):
+        rng=self.rng
+        chunkEntries=list()
+        chunks=list()
+        segments=list()
+        variations=list() #chunk index, first segment index, segment count, memory and stream chunk index
+        for chunkIndex in range(rng.randint(1,2)):
+            data, chunkSegments = soundChunk(rng,rng.randint(1,3))
+            chunk=Entry("chunk",Guid.random(rng),len(data))
+            chunk.data=data
+            chunkEntries.append(chunk)
+            chunks.append((chunk.name,len(data)))
+
+            first=0
+            while first<len(chunkSegments):
+                count=rng.randint(1,len(chunkSegments)-first)
+                if rng.random()<0.5: variations.append((chunkIndex,len(segments)+first,count,(chunkIndex<<1)|1,0)) #in memory
+                else: variations.append((chunkIndex,len(segments)+first,count,0,chunkIndex<<1)) #streamed
+                first+=count
+            segments+=[(samplesOffset,seekTableOffset,rng.uniform(0.5,30),samples) for samplesOffset, seekTableOffset, samples in chunkSegments]
+
+        #The files ebx.extractSoundVariations writes, numbered per chunk.
+        files=OrderedDict()
+        histogram=dict()
+        for chunkIndex, first, count, memChunk, streamChunk in variations:
+            index=histogram.get(chunkIndex,0)
+            histogram[chunkIndex]=index+1
+            for i in range(count):
+                path=name
+                if len(chunks)>1 or len(variations)>1 or count>1: path+=" %d %d %d" % (chunkIndex,index,i)
+                files[path+".sps"]=hashlib.sha1(segments[first+i][3]).hexdigest()
+
+        entry=Entry("ebx",name,0)
+        entries=[entry]
+        if newWave:
+            #The NewWaveResource is found by the GUID of the primary instance in its resMeta.
+            entry.guid, entry.instanceGuid, entry.data = self.ebx.build(rng,name,rng.randint(0,3),0,"NewWaveAsset")
+            bank=Entry("res",name,0)
+            bank.data=newWaveBank(chunks,segments,variations)
+            bank.size=len(bank.data)
+            bank.resType=hasher("newwaveresource")
+            bank.resMeta=entry.instanceGuid.encode(False)
+            bank.resRid=rng.getrandbits(63)|1
+            entries.append(bank)
+        else:
+            entry.guid, entry.instanceGuid, entry.data = self.ebx.buildSoundWave(rng,name,chunks,[segment[:3] for segment in segments],
+                                                                                [variation[:3] for variation in variations])
+        entry.size=len(entry.data)
+        self.sounds.append(entry)
+
+        for chunk in chunkEntries:
+            if rng.random()<0.3: self.tocAssetChunks.append(chunk)
+            else: entries.append(chunk)
+        self.summary["assets"][name]=OrderedDict([("type","NewWaveAsset" if newWave else "SoundWaveAsset"),("links",[]),
+                                                  ("res",[name] if newWave else []),("chunks",[chunk.name.format() for chunk in chunkEntries]),
+                                                  ("files",files)])
+        return entries
+
+    def done(self):
+        if self.args.entries and self.summary["entries"]>=self.args.entries: return True
+        if self.args.size and self.summary["bytes"]>=self.args.size: return True
+        return False
+
+    def plan(self):
+        #Split the install into superbundles of bundles until the requested scale is reached.
+        superbundles=list()
+        while not self.done():
+            index=len(superbundles)
+            bundles=list()
+            for i in range(self.args.bundles):
+                bundles.append(("win32/sb_%03d/bundle_%03d" % (index,i),self.planBundle(self.args.bundleEntries)))
+                if self.done(): break
+            tocChunks=[self.newEntry("chunk",0) for i in range(self.rng.randint(0,4))]
+            if self.args.assets:
+                tocChunks+=self.tocAssetChunks
+                self.tocAssetChunks=list()
+            superbundles.append(("Win32/sb_%03d" % index,bundles,tocChunks))
+        self.summary["superbundles"]=len(superbundles)
+        self.summary["bundles"]=sum(len(sb[1]) for sb in superbundles)
+        return superbundles
+
+    def pickCas(self,index):
+        if self.args.flavor=="cas": return True
+        if self.args.flavor=="noncas": return False
+        return index%2==0
+
+    def generate(self,outDir):
+        superbundles=self.plan()
+        if self.engine=="fb3": self.generateFb3(outDir,superbundles)
+        else: self.generateFb2(outDir,superbundles)
+        writeFile(os.path.join(outDir,"install.json"),json.dumps(self.summary,indent=1).encode())
+        return self.summary
+
+    #Frostbite 3
+    def generateFb3(self,outDir,superbundles):
+        args=self.args
+        dataDir=os.path.join(outDir,"Data")
+        version=int(args.layout[1:])
+
+        layout=OrderedDict()
+        if version>=2:
+            manifest=OrderedDict()
+            if version>=3:
+                manifest["installChunks"]=[OrderedDict([("name","installchunk0"),("id",Guid.random(self.rng))])]
+                if version==3: manifest["maxTotalSize"]=Long(1<<40)
+            layout["installManifest"]=manifest
+        layout["superbundles"]=[OrderedDict([("name",sb[0])]) for sb in superbundles]
+        writeFile(os.path.join(dataDir,"layout.toc"),signedFile(dbObject(layout),self.rng,args.encrypt))
+
+        if version>=3:
+            casDir=os.path.join(dataDir,"Win32","installchunk0")
+        else:
+            casDir=dataDir
+        cas=CasWriter(casDir,version)
+        patchCas=CasWriter(os.path.join(outDir,"Update","Patch","Data"),version)
+
+        for index, (localName, bundles, tocChunks) in enumerate(superbundles):
+            isCas=self.pickCas(index)
+            tocPath=os.path.join(dataDir,localName+".toc")
+            if isCas: self.writeFb3CasSb(tocPath,bundles,tocChunks,cas)
+            else: self.writeFb3NoncasSb(tocPath,bundles,tocChunks)
+
+            if version<3 and args.patch and index%3==0:
+                patchToc=os.path.join(outDir,"Update","Patch","Data",localName+".toc")
+                if isCas: self.writeFb3CasPatch(patchToc,bundles,cas,patchCas)
+                else: self.writeFb3NoncasPatch(patchToc,tocPath,bundles)
+
+        cas.close(self.rng,args.encrypt)
+        if patchCas.entries: patchCas.close(self.rng,args.encrypt)
+
+    def casEntries(self,entries,cas):
+        ebx,res,chunks=list(),list(),list()
+        self.itemEntries=dict() #id(item) -> entry
+        for entry in entries:
+            blocks=fb3Blocks(entry.getData(),self.codecs,self.rng)
+            stored=b"".join(blocks)
+            sha1=cas.add(stored)
+            item=OrderedDict()
+            self.itemEntries[id(item)]=entry
+            if entry.kind=="chunk":
+                item["id"]=entry.name
+                item["sha1"]=Sha1(sha1)
+                item["size"]=len(stored)
+                item["logicalOffset"]=0
+                item["logicalSize"]=entry.size
+                chunks.append(item)
+                continue
+            item["name"]=entry.name
+            item["sha1"]=Sha1(sha1)
+            item["size"]=len(stored)
+            item["originalSize"]=entry.size
+            if entry.kind=="res":
+                item["resType"]=entry.resType
+                item["resMeta"]=Blob(entry.resMeta)
+                item["resRid"]=Long(entry.resRid)
+                res.append(item)
+            else:
+                ebx.append(item)
+        return ebx,res,chunks
+
+    def writeFb3CasSb(self,tocPath,bundles,tocChunks,cas):
+        sb=openFile(tocPath[:-3]+"sb")
+        tocBundles=list()
+        for name, entries in bundles:
+            ebx,res,chunks=self.casEntries(entries,cas)
+            manifest=OrderedDict([("path",name),("magicSalt",self.rng.getrandbits(31)),("ebx",ebx),("res",res),("chunks",chunks),
+                                  ("chunkMeta",[OrderedDict([("h32",self.rng.getrandbits(32)),("meta",Blob(b""))]) for chunk in chunks]),
+                                  ("alignMembers",True),("ridSupport",True),("storeCompressedSizes",False),
+                                  ("totalSize",Long(sum(entry.size for entry in entries))),("dbxTotalSize",Long(0))])
+            data=dbObject(manifest)
+            tocBundles.append(OrderedDict([("id",name),("offset",Long(sb.tell())),("size",len(data))]))
+            sb.write(data)
+
+        chunkItems=list()
+        for entry in tocChunks:
+            sha1=cas.add(b"".join(fb3Blocks(entry.getData(),self.codecs,self.rng)))
+            chunkItems.append(OrderedDict([("id",entry.name),("sha1",Sha1(sha1))]))
+
+        toc=OrderedDict([("bundles",tocBundles),("chunks",chunkItems),("cas",True),("name",os.path.basename(tocPath)[:-4]),("alwaysEmitSuperbundle",False)])
+        sb.close()
+        writeFile(tocPath,signedFile(dbObject(toc),self.rng,self.args.encrypt))
+
+    def writeFb3CasPatch(self,tocPath,bundles,cas,patchCas):
+        #Every other bundle gets patched: some entries are replaced by casPatchType 2 deltas on top of the base payload.
+        sb=openFile(tocPath[:-3]+"sb")
+        tocBundles=list()
+        for i, (name, entries) in enumerate(bundles):
+            if i%2:
+                tocBundles.append(OrderedDict([("id",name),("offset",Long(0)),("size",0),("base",True)]))
+                continue
+
+            ebx,res,chunks=self.casEntries(entries,cas)
+            for item in ebx+res+chunks:
+                if self.rng.random()<0.5: continue
+                baseStored=self.readCas(cas,item["sha1"])
+                deltaData, patchedData = self.casDelta(baseStored,self.itemEntries[id(item)])
+                if not deltaData: continue
+                item["casPatchType"]=2
+                item["baseSha1"]=item["sha1"]
+                item["deltaSha1"]=Sha1(patchCas.add(deltaData))
+                item["sha1"]=Sha1(hashlib.sha1(patchedData).digest())
+
+            manifest=OrderedDict([("path",name),("ebx",ebx),("res",res),("chunks",chunks),
+                                  ("chunkMeta",[OrderedDict([("h32",0),("meta",Blob(b""))]) for chunk in chunks])])
+            data=dbObject(manifest)
+            tocBundles.append(OrderedDict([("id",name),("offset",Long(sb.tell())),("size",len(data)),("delta",True)]))
+            sb.write(data)
+
+        toc=OrderedDict([("bundles",tocBundles),("chunks",[]),("cas",True),("name",os.path.basename(tocPath)[:-4])])
+        sb.close()
+        writeFile(tocPath,signedFile(dbObject(toc),self.rng,self.args.encrypt))
+
+    def readCas(self,cas,sha1):
+        offset,size,casNum=cas.entries[sha1]
+        cas.f.flush()
+        f=open(os.path.join(cas.directory,"cas_%02d.cas" % casNum),"rb")
+        f.seek(offset)
+        data=f.read(size)
+        f.close()
+        return data
+
+    def splitBlocks(self,stored):
+        #Split an encoded payload into its blocks and return them with their uncompressed sizes.
+        blocks=list()
+        pos=0
+        while pos<len(stored):
+            num1,num2=struct.unpack(">II",stored[pos:pos+8])
+            end=pos+8+(num2&0xFFFFF)
+            blocks.append(stored[pos:end])
+            pos=end
+        return blocks
+
+    def patchedData(self,entry,offset,size):
+        #Ebx and sounds must stay parseable, so they get their own content back in newly encoded blocks.
+        if entry.data is not None: return entry.data[offset:offset+size]
+        return makeData(self.rng,size)
+
+    def casDelta(self,baseStored,entry):
+        #Delta payload: keep the first base blocks (type 0), skip one base block (type 4) and add a new one from the delta (type 3).
+        #The remaining base blocks are added implicitly (infinite type 0).
+        baseBlocks=self.splitBlocks(baseStored)
+        if len(baseBlocks)<2: return None, None
+        keep=self.rng.randint(0,len(baseBlocks)-2)
+        oldSize=struct.unpack(">I",baseBlocks[keep][:4])[0]&0x00FFFFFF
+        newBlock=fb3Block(self.patchedData(entry,keep*blockSize,oldSize),self.rng.choice(self.codecs))
+        delta=bytearray()
+        if keep: delta+=pack(">I",(0<<28)|keep)
+        delta+=pack(">I",(4<<28)|1)
+        delta+=pack(">I",(3<<28)|1)+newBlock
+        patched=b"".join(baseBlocks[:keep])+newBlock+b"".join(baseBlocks[keep+1:])
+        return bytes(delta), patched
+
+    def noncasBundle(self,entries):
+        #Returns the bundle bytes and, per entry, the number of encoded blocks (needed for deltas).
+        ebx=[entry for entry in entries if entry.kind=="ebx"]
+        res=[entry for entry in entries if entry.kind=="res"]
+        chunks=[entry for entry in entries if entry.kind=="chunk"]
+        ordered=ebx+res+chunks
+
+        strings=io.BytesIO()
+        nameOffsets=dict()
+        for entry in ebx+res:
+            nameOffsets[id(entry)]=strings.tell()
+            strings.write(entry.name.encode()+b"\x00")
+
+        body=io.BytesIO()
+        datas=[entry.getData() for entry in ordered]
+        for data in datas: body.write(hashlib.sha1(data).digest())
+        for entry in ebx+res: body.write(pack(">2I",nameOffsets[id(entry)],entry.size))
+        for entry in res: body.write(pack(">I",entry.resType))
+        for entry in res: body.write(entry.resMeta)
+        for entry in res: body.write(pack(">Q",entry.resRid))
+        for entry in chunks:
+            logicalSize=entry.size&0xFFFF
+            body.write(entry.name.encode(True)+pack(">HHI",0,logicalSize,entry.size-logicalSize))
+        chunkMetaOffset=32+body.tell()
+        if chunks: body.write(dbObject([OrderedDict([("h32",self.rng.getrandbits(32)),("meta",Blob(b""))]) for chunk in chunks]))
+        chunkMetaSize=32+body.tell()-chunkMetaOffset
+        stringOffset=32+body.tell()
+        body.write(strings.getvalue())
+
+        meta=pack(">8I",0x9D798ED5,len(ordered),len(ebx),len(res),len(chunks),stringOffset,chunkMetaOffset,chunkMetaSize)+body.getvalue()
+        blocks=[fb3Blocks(data,self.codecs,self.rng) for data in datas]
+        data=pack(">I",len(meta))+meta+b"".join(b"".join(entryBlocks) for entryBlocks in blocks)
+        return data, len(meta), ordered, [len(entryBlocks) for entryBlocks in blocks]
+
+    def writeFb3NoncasSb(self,tocPath,bundles,tocChunks):
+        sb=openFile(tocPath[:-3]+"sb")
+        tocBundles=list()
+        self.noncasInfo=dict()
+        for name, entries in bundles:
+            data, metaSize, ordered, blocks = self.noncasBundle(entries)
+            self.noncasInfo[name]=(metaSize,ordered,blocks)
+            tocBundles.append(OrderedDict([("id",name),("offset",Long(sb.tell())),("size",len(data))]))
+            sb.write(data)
+
+        chunkItems=list()
+        for entry in tocChunks:
+            data=b"".join(fb3Blocks(entry.getData(),self.codecs,self.rng))
+            chunkItems.append(OrderedDict([("id",entry.name),("offset",Long(sb.tell())),("size",len(data))]))
+            sb.write(data)
+
+        toc=OrderedDict([("bundles",tocBundles),("chunks",chunkItems),("cas",False),("name",os.path.basename(tocPath)[:-4])])
+        sb.close()
+        writeFile(tocPath,signedFile(dbObject(toc),self.rng,self.args.encrypt))
+
+    def writeFb3NoncasPatch(self,tocPath,baseTocPath,bundles):
+        #Delta bundles: the metadata is copied from the base (type 0), then every entry either takes its base blocks (type 0)
+        #or skips them (type 4) and gets new blocks of the same total size from the delta (type 3).
+        sb=openFile(tocPath[:-3]+"sb")
+        tocBundles=list()
+        for i, (name, entries) in enumerate(bundles):
+            if i%2:
+                tocBundles.append(OrderedDict([("id",name),("offset",Long(0)),("size",0),("base",True)]))
+                continue
+
+            metaSize, ordered, numBlocks = self.noncasInfo[name]
+            metaSection=pack(">I",metaSize)+pack(">I",(0<<28)|metaSize)
+            payloadSection=bytearray()
+            for entry, entryBlocks in zip(ordered,numBlocks):
+                if self.rng.random()<0.5:
+                    payloadSection+=pack(">I",(0<<28)|entryBlocks)
+                else:
+                    newBlocks=fb3Blocks(self.patchedData(entry,0,entry.size),self.codecs,self.rng)
+                    payloadSection+=pack(">I",(4<<28)|entryBlocks)
+                    payloadSection+=pack(">I",(3<<28)|len(newBlocks))+b"".join(newBlocks)
+
+            data=b"\0\0\0\x01\0\0\0\0"+pack(">II",len(metaSection),len(payloadSection))+metaSection+bytes(payloadSection)
+            tocBundles.append(OrderedDict([("id",name),("offset",Long(sb.tell())),("size",len(data)),("delta",True)]))
+            sb.write(data)
+
+        toc=OrderedDict([("bundles",tocBundles),("chunks",[]),("cas",False),("name",os.path.basename(tocPath)[:-4])])
+        sb.close()
+        writeFile(tocPath,signedFile(dbObject(toc),self.rng,self.args.encrypt))
+
+    #Frostbite 2
+    def generateFb2(self,outDir,superbundles):
+        args=self.args
+        dataDir=os.path.join(outDir,"Data")
+        patchDir=os.path.join(outDir,"Update","Patch","Data")
+        writeFile(os.path.join(dataDir,"layout.toc"),signedFile(dbObject(OrderedDict([("superbundles",[OrderedDict([("name",sb[0])]) for sb in superbundles])])),self.rng,args.encrypt))
+
+        cas=CasWriter(dataDir,1)
+        self.commonDat=io.BytesIO()
+        for index, (localName, bundles, tocChunks) in enumerate(superbundles):
+            isCas=self.pickCas(index)
+            tocPath=os.path.join(dataDir,localName+".toc")
+            if isCas:
+                self.writeFb2CasSb(tocPath,bundles,tocChunks,cas)
+            else:
+                self.writeFb2NoncasSb(tocPath,bundles,tocChunks)
+                if args.patch and index%3==1:
+                    self.writeFb2NoncasPatch(os.path.join(patchDir,localName+".toc"),bundles)
+
+        cas.close(self.rng,args.encrypt)
+        if self.commonDat.tell(): writeFile(os.path.join(patchDir,"common.dat"),self.commonDat.getvalue())
+        if args.x360: compressSbs(outDir)
+
+    def fb2Compressed(self,entry):
+        if entry.kind=="ebx": return self.rng.random()<0.5 #uncompressed in BF3, compressed in MOH:WF
+        if entry.kind=="res": return True
+        return bool(entry.name.val[3]&1)
+
+    def writeFb2CasSb(self,tocPath,bundles,tocChunks,cas):
+        sb=openFile(tocPath[:-3]+"sb")
+        tocBundles=list()
+        for name, entries in bundles:
+            ebx,res,chunks=list(),list(),list()
+            for entry in entries:
+                stored=fb2Payload(entry.getData(),self.fb2Compressed(entry))
+                sha1=cas.add(stored)
+                if entry.kind=="chunk":
+                    chunks.append(OrderedDict([("id",entry.name),("sha1",Sha1(sha1)),("size",len(stored))]))
+                    continue
+                item=OrderedDict([("name",entry.name),("sha1",Sha1(sha1)),("size",len(stored)),("originalSize",entry.size)])
+                if entry.kind=="res":
+                    item["resType"]=entry.resType
+                    item["resMeta"]=Blob(entry.resMeta)
+                    res.append(item)
+                else:
+                    ebx.append(item)
+            manifest=OrderedDict([("path",name),("ebx",ebx),("dbx",[]),("res",res),("chunks",chunks),
+                                  ("chunkMeta",[OrderedDict([("h32",0),("meta",Blob(b""))]) for chunk in chunks])])
+            data=dbObject(manifest)
+            tocBundles.append(OrderedDict([("id",name),("offset",Long(sb.tell())),("size",len(data))]))
+            sb.write(data)
+
+        chunkItems=list()
+        for entry in tocChunks:
+            sha1=cas.add(fb2Payload(entry.getData(),self.fb2Compressed(entry)))
+            chunkItems.append(OrderedDict([("id",entry.name),("sha1",Sha1(sha1))]))
+
+        toc=OrderedDict([("bundles",tocBundles),("chunks",chunkItems),("cas",True)])
+        sb.close()
+        writeFile(tocPath,signedFile(dbObject(toc),self.rng,self.args.encrypt))
+
+    def fb2NoncasBundle(self,entries):
+        ebx=[entry for entry in entries if entry.kind=="ebx"]
+        res=[entry for entry in entries if entry.kind=="res"]
+        chunks=[entry for entry in entries if entry.kind=="chunk"]
+        ordered=ebx+res+chunks
+        payloads=[fb2Payload(entry.getData(),self.fb2Compressed(entry)) for entry in ordered]
+
+        strings=io.BytesIO()
+        nameOffsets=dict()
+        for entry in ebx+res:
+            nameOffsets[id(entry)]=strings.tell()
+            strings.write(entry.name.encode()+b"\x00")
+
+        body=io.BytesIO()
+        for payload in payloads: body.write(hashlib.sha1(payload).digest())
+        for entry, payload in zip(ebx+res,payloads): body.write(pack(">3I",nameOffsets[id(entry)],len(payload),entry.size))
+        for entry in res: body.write(pack(">I",entry.resType))
+        for entry in res: body.write(entry.resMeta)
+        for entry, payload in zip(chunks,payloads[len(ebx)+len(res):]):
+            body.write(entry.name.encode(True)+pack(">III",0,len(payload),0))
+        chunkMetaOffset=32+body.tell()
+        if chunks: body.write(dbObject([OrderedDict([("h32",0),("meta",Blob(b""))]) for chunk in chunks]))
+        chunkMetaSize=32+body.tell()-chunkMetaOffset
+        stringOffset=32+body.tell()
+        body.write(strings.getvalue())
+
+        meta=pack(">8I",0x970d1c13,len(ordered),len(ebx),len(res),len(chunks),stringOffset,chunkMetaOffset,chunkMetaSize)+body.getvalue()
+        data=bytearray(pack(">I",len(meta))+meta)
+        for payload in payloads:
+            while len(data)%16: data.append(0)
+            data+=payload
+        return bytes(data)
+
+    def writeFb2NoncasSb(self,tocPath,bundles,tocChunks):
+        sb=openFile(tocPath[:-3]+"sb")
+        tocBundles=list()
+        self.noncasInfo=dict()
+        for name, entries in bundles:
+            while sb.tell()%16: sb.write(b"\x00")
+            data=self.fb2NoncasBundle(entries)
+            self.noncasInfo[name]=(sb.tell(),data)
+            tocBundles.append(OrderedDict([("id",name),("offset",Long(sb.tell())),("size",len(data))]))
+            sb.write(data)
+
+        chunkItems=list()
+        for entry in tocChunks:
+            data=fb2Payload(entry.getData(),self.fb2Compressed(entry))
+            chunkItems.append(OrderedDict([("id",entry.name),("offset",Long(sb.tell())),("size",len(data))]))
+            sb.write(data)
+
+        toc=OrderedDict([("bundles",tocBundles),("chunks",chunkItems),("cas",False)])
+        sb.close()
+        writeFile(tocPath,signedFile(dbObject(toc),self.rng,self.args.encrypt))
+
+    def writeFb2NoncasPatch(self,tocPath,bundles):
+        #Spliced bundles: the patched bundle is glued together from the unpatched sb (type 1), the patch sb (type 0) and common.dat (type -1).
+        #The result is the base bundle with its last payload byte range replaced, so it stays parseable with the same metadata.
+        sb=openFile(tocPath[:-3]+"sb")
+        tocBundles=list()
+        for i, (name, entries) in enumerate(bundles):
+            if i%2:
+                tocBundles.append(OrderedDict([("id",name),("offset",Long(0)),("size",0),("base",True)]))
+                continue
+
+            baseOffset, data = self.noncasInfo[name]
+            third=len(data)//3
+            commonOffset=self.commonDat.tell()
+            self.commonDat.write(data[third:2*third])
+            replaced=data[2*third:]
+            segments=[(third,1,baseOffset),(third,-1,commonOffset),(len(replaced),0,0)]
+
+            bundle=pack(">IIQ",len(segments)*16,0,0)+b"".join(pack(">IiQ",*segment) for segment in segments)+replaced
+            tocBundles.append(OrderedDict([("id",name),("offset",Long(sb.tell())),("size",len(bundle)),("delta",True)]))
+            sb.write(bundle)
+
+        toc=OrderedDict([("bundles",tocBundles),("chunks",[]),("cas",False)])
+        sb.close()
+        writeFile(tocPath,signedFile(dbObject(toc),self.rng,self.args.encrypt))
+
+
+
+def compressSbs(outDir):
+    #X360 sb files: magic followed by the compressed sb.
+    for dir0, dirs, ff in os.walk(outDir):
+        for fname in ff:
+            if fname[-3:]!=".sb": continue
+            path=os.path.join(dir0,fname)
+            f=open(path,"rb")
+            data=f.read()
+            f.close()
+            writeFile(path,b"\x0F\xF5\x12\xED"+zlib.compress(data))
+
+
+
+def makeParser():
+    parser=argparse.ArgumentParser(description="Write a synthetic Frostbite game install.")
+    parser.add_argument("outDir",help="folder to create the install in")
+    parser.add_argument("--engine",choices=("fb3","fb2"),default="fb3")
+    parser.add_argument("--layout",choices=("v1","v2","v3","v4"),default="v1",help="fb3 layout/cat version")
+    parser.add_argument("--flavor",choices=("cas","noncas","mixed"),default="mixed")
+    parser.add_argument("--size",type=parseSize,default=None,help="stop after this many uncompressed payload bytes, e.g. 1G")
+    parser.add_argument("--entries",type=int,default=None,help="stop after this many bundle entries")
+    parser.add_argument("--bundles",type=int,default=16,help="bundles per superbundle")
+    parser.add_argument("--bundleEntries",type=int,default=40,help="entries per bundle")
+    parser.add_argument("--codecs",default="lz4,zstd,zlib,stored",help="fb3 block codecs to pick from")
+    parser.add_argument("--patch",action="store_true",help="add patched tocs with delta bundles")
+    parser.add_argument("--encrypt",action="store_true",help="XOR encrypt toc and cat files")
+    parser.add_argument("--x360",action="store_true",help="fb2: compress the sb files like on the X360 (decompress them with xbstandin.py)")
+    parser.add_argument("--assets",action="store_true",help="fb3: add sound assets and ebx linking to them in other files (see checkassets.py)")
+    parser.add_argument("--seed",type=int,default=1)
+    return parser
+
+def generate(outDir,**options):
+    #Library entry point, options are the command line arguments.
+    args=makeParser().parse_args([outDir])
+    for key, val in options.items(): setattr(args,key,val)
+    if not args.size and not args.entries: args.entries=1000
+    return Generator(args).generate(outDir)
+
+if __name__=="__main__":
+    parser=makeParser()
+    args=parser.parse_args()
+    if args.assets and args.engine!="fb3": parser.error("--assets needs --engine fb3")
+    if not args.size and not args.entries: args.entries=1000
+    summary=Generator(args).generate(args.outDir)
+    print("%d superbundles, %d bundles, %d entries, %.1f MB of payload" % (summary["superbundles"],summary["bundles"],summary["entries"],summary["bytes"]/1048576))
@@ -0,0 +1,343 @@
+#Microbenchmarks for the Frostbite 3 parser and codec hot paths on fixed synthetic inputs.
+#
+#    python microbench.py run --output base.json            run everything and save the results
+#    python microbench.py run --filter ebx                   only run benchmarks with "ebx" in the name
+#    python microbench.py compare base.json new.json         exit code 1 if throughput dropped more than --threshold percent
+#
+#Inputs are built from a fixed seed with the encoders from geninstall.py, so results from different runs are comparable.
+#payload.decompressBlock needs the LZ4/Zstd libraries from the thirdparty folder; if they can't be loaded, the codec benchmarks are skipped.
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from struct import pack
+
+import geninstall
+
+engineDirectory=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"frostbite3")
+sys.path.insert(0,engineDirectory)
+import context
+import dbo
+import ebx
+import mapped
+import noncas
+import pipeline
+import sbr
+
+#The libraries are loaded with paths relative to the script folder.
+currentDirectory=os.getcwd()
+os.chdir(engineDirectory)
+try:
+    import payload
+except OSError as e:
+    payload=None
+    payloadError=str(e)
+os.chdir(currentDirectory)
+
+seed=1
+benchmarks=OrderedDict() #name -> function(workDir) returning (run function, bytes processed per run)
+
+def benchmark(name):
+    def register(func):
+        benchmarks[name]=func
+        return func
+    return register
+
+def manifestObject(rng,numEntries):
+    #Roughly what a cas bundle manifest looks like.
+    def entry(i):
+        return OrderedDict([("name","generated/bench/asset_%05d" % i),("sha1",geninstall.Sha1(rng.randbytes(20))),
+                            ("size",rng.getrandbits(20)),("originalSize",rng.getrandbits(20))])
+    res=list()
+    for i in range(numEntries):
+        item=entry(i)
+        item["resType"]=rng.getrandbits(32)
+        item["resMeta"]=geninstall.Blob(rng.randbytes(16))
+        item["resRid"]=geninstall.Long(rng.getrandbits(63))
+        res.append(item)
+    chunks=[OrderedDict([("id",geninstall.Guid.random(rng)),("sha1",geninstall.Sha1(rng.randbytes(20))),("size",rng.getrandbits(20)),
+                         ("logicalOffset",0),("logicalSize",rng.getrandbits(20))]) for i in range(numEntries)]
+    return OrderedDict([("path","win32/bench/bundle"),("ebx",[entry(i) for i in range(numEntries)]),("res",res),("chunks",chunks),
+                        ("alignMembers",True),("totalSize",geninstall.Long(1<<33))])
+
+def writeFile(path,data):
+    f=open(path,"wb")
+    f.write(data)
+    f.close()
+    return path
+
+@benchmark("dbo.DbObject")
+def benchDbObject(workDir):
+    data=geninstall.dbObject(manifestObject(random.Random(seed),2000))
+    def run(): dbo.DbObject(io.BytesIO(data))
+    return run, len(data)
+
+@benchmark("dbo.unXor")
+def benchUnXor(workDir):
+    rng=random.Random(seed)
+    data=geninstall.dbObject(manifestObject(rng,1000))
+    path=writeFile(os.path.join(workDir,"bench.toc"),geninstall.signedFile(data,rng,True))
+    def run(): dbo.unXor(path)
+    return run, len(data)
+
+@benchmark("dbo.decode7bit")
+def benchDecode7bit(workDir):
+    rng=random.Random(seed)
+    values=[rng.getrandbits(rng.choice((6,13,20,27))) for i in range(100000)]
+    data=b"".join(geninstall.encode7bit(val) for val in values)
+    def run():
+        f=io.BytesIO(data)
+        for i in range(len(values)): dbo.decode7bit(f)
+    return run, len(data)
+
+def blockBenchmark(codec):
+    def bench(workDir):
+        if not payload: raise Unavailable(payloadError)
+        if codec=="lz4" and not geninstall.liblz4 or codec=="zstd" and not geninstall.libzstd:
+            raise Unavailable("no %s library to compress the input" % codec)
+        #64 kB blocks like the game uses, a few hundred of them so the per-block overhead shows up.
+        rng=random.Random(seed)
+        blocks=[geninstall.fb3Block(geninstall.makeData(rng,geninstall.blockSize),codec) for i in range(64)]
+        data=b"".join(blocks)
+        def run():
+            f=io.BytesIO(data)
+            f2=io.BytesIO()
+            for i in range(len(blocks)): payload.decompressBlock(f,f2)
+        return run, len(blocks)*geninstall.blockSize
+    return bench
+
+for codec in ("lz4","zstd","zlib","stored"):
+    benchmark("payload.decompressBlock:"+codec)(blockBenchmark(codec))
+
+@benchmark("payload.decompressPayload:parallel")
+def benchParallelPayload(workDir):
+    #A large zlib payload with its blocks spread over one block pool thread per core.
+    if not payload: raise Unavailable(payloadError)
+    rng=random.Random(seed)
+    numBlocks=max(pipeline.parallelSize//geninstall.blockSize,256)
+    data=b"".join(geninstall.fb3Block(geninstall.makeData(rng,geninstall.blockSize),"zlib") for i in range(numBlocks))
+    path=os.path.join(workDir,"payload.cas")
+    with open(path,"wb") as f: f.write(data)
+    def run():
+        pipeline.blockPool=concurrent.futures.ThreadPoolExecutor(os.cpu_count() or 1)
+        try: payload.decompressPayload(io.BytesIO(),path,0,len(data),None)
+        finally:
+            pipeline.blockPool.shutdown()
+            pipeline.blockPool=None
+    return run, numBlocks*geninstall.blockSize
+
+def payloadBenchmark(mapFiles):
+    def bench(workDir):
+        #A mix of zstd and stored blocks in a cas file, read block by block or taken from the mapped file.
+        if not payload: raise Unavailable(payloadError)
+        if not geninstall.libzstd: raise Unavailable("no zstd library to compress the input")
+        rng=random.Random(seed)
+        data=b"".join(geninstall.fb3Block(geninstall.makeData(rng,geninstall.blockSize),"zstd" if i%4 else "stored") for i in range(64))
+        path=writeFile(os.path.join(workDir,"payload%d.cas" % mapFiles),data)
+        def run():
+            mapped.enabled=mapFiles
+            try: payload.decompressPayload(io.BytesIO(),path,0,len(data),None)
+            finally: mapped.enabled=True
+        return run, 64*geninstall.blockSize
+    return bench
+
+benchmark("payload.decompressPayload:read")(payloadBenchmark(False))
+benchmark("payload.decompressPayload:mapped")(payloadBenchmark(True))
+
+@benchmark("noncas.Bundle")
+def benchNoncasBundle(workDir):
+    rng=random.Random(seed)
+    args=geninstall.makeParser().parse_args([workDir])
+    generator=geninstall.Generator(args)
+    entries=list()
+    for i in range(3000):
+        kind=("ebx","res","chunk")[i%3]
+        if kind=="chunk": entry=geninstall.Entry(kind,geninstall.Guid.random(rng),64)
+        else: entry=geninstall.Entry(kind,"generated/bench/%s_%05d" % (kind,i),64)
+        entry.seed=i
+        entry.resType=rng.getrandbits(32)
+        entry.resMeta=rng.randbytes(16)
+        entry.resRid=rng.getrandbits(63)
+        entries.append(entry)
+    data, metaSize, ordered, numBlocks = generator.noncasBundle(entries)
+    meta=data[:metaSize+4]
+    def run(): noncas.Bundle(io.BytesIO(meta))
+    return run, len(meta)
+
+def ebxFile(workDir):
+    path=os.path.join(workDir,"bench.ebx")
+    if not os.path.isfile(path):
+        rng=random.Random(seed)
+        fileGuid, guid, data = geninstall.EbxBuilder("fb3").build(rng,"generated/bench/asset",4000,1)
+        writeFile(path,data)
+    return path
+
+@benchmark("ebx.Dbx")
+def benchDbx(workDir):
+    path=ebxFile(workDir)
+    def run(): ebx.Dbx(context.DumpContext(),path,workDir)
+    return run, os.path.getsize(path)
+
+@benchmark("ebx.Dbx:primOnly")
+def benchDbxPrimOnly(workDir):
+    path=ebxFile(workDir)
+    def run(): ebx.Dbx(None,path,workDir,True)
+    return run, os.path.getsize(path)
+
+@benchmark("ebx.Dbx.dump")
+def benchDbxDump(workDir):
+    path=ebxFile(workDir)
+    dbx=ebx.Dbx(context.DumpContext(),path,workDir)
+    outPath=os.path.join(workDir,"dump","bench.txt")
+    def run(): dbx.dump(outPath)
+    return run, os.path.getsize(path)
+
+def sbrFile(rng,numSets,numElems):
+    #Harmony sample bank with one field of every storage type per data set.
+    out=io.BytesIO()
+    out.write(b"SBle"+bytes(0x40))
+    tableOffset=out.tell()
+    out.write(bytes(8*numSets))
+    dsetOffsets=list()
+    for i in range(numSets):
+        dsetOffsets.append(out.tell())
+        fields=list()
+        tables=io.BytesIO()
+        tablesBase=out.tell()+0x48+0x18*5
+        def table(data):
+            offset=tablesBase+tables.tell()
+            tables.write(data)
+            while tables.tell()%8: tables.write(b"\x00")
+            return offset
+        fields.append((sbr.FieldType.UInt32,0,0,rng.getrandbits(32),0)) #constant
+        fields.append((sbr.FieldType.Int64,1,3,rng.getrandbits(16),0)) #increment
+        fields.append((sbr.FieldType.UInt32,2,(2<<8)|2,rng.getrandbits(16),
+                       table(b"".join(pack("<H",rng.getrandbits(16)) for e in range(numElems)))))
+        uniques=[rng.getrandbits(32) for e in range(16)]
+        indices=bytes((rng.getrandbits(4)|(rng.getrandbits(4)<<4)) for e in range((numElems+1)//2))
+        fields.append((sbr.FieldType.Float32,3,(4<<8)|4,len(uniques),table(b"".join(pack("<I",val) for val in uniques)+indices)))
+        fields.append((sbr.FieldType.UInt64,4,0,0,table(b"".join(pack("<Q",rng.getrandbits(64)) for e in range(numElems)))))
+
+        header=bytearray(0x48)
+        header[0x00:0x04]=pack("<I",0x44534554)
+        header[0x08:0x0C]=pack("<I",rng.getrandbits(32))
+        header[0x38:0x3C]=pack("<I",numElems)
+        header[0x3C:0x3E]=pack("<H",len(fields))
+        out.write(header)
+        for num, (dataType, storeType, param1, param2, tableOffsetField) in enumerate(fields):
+            out.write(pack("<IBBHQII",rng.getrandbits(32),dataType,storeType,param1,param2,tableOffsetField,0))
+        out.write(tables.getvalue())
+
+    data=bytearray(out.getvalue())
+    data[0x0A:0x0C]=pack("<H",numSets)
+    data[0x18:0x1C]=pack("<I",tableOffset)
+    for i, offset in enumerate(dsetOffsets):
+        data[tableOffset+8*i:tableOffset+8*i+4]=pack("<I",offset)
+    return bytes(data)
+
+@benchmark("sbr.Bank")
+def benchBank(workDir):
+    data=sbrFile(random.Random(seed),8,500)
+    path=writeFile(os.path.join(workDir,"bench.sbr"),data)
+    def run(): sbr.Bank(path)
+    return run, len(data)
+
+class Unavailable(Exception): pass
+
+def measure(run,minTime,repeat):
+    #Calibrate the number of loops so one measurement takes at least minTime, then keep the best of several measurements.
+    start=time.perf_counter()
+    run()
+    once=time.perf_counter()-start
+    loops=max(1,int(minTime/once)) if once>0 else 1000
+    best=None
+    for i in range(repeat):
+        start=time.perf_counter()
+        for j in range(loops): run()
+        seconds=(time.perf_counter()-start)/loops
+        if best is None or seconds<best: best=seconds
+    return best, loops
+
+def runBenchmarks(args):
+    workDir=tempfile.mkdtemp(prefix="microbench")
+    devnull=open(os.devnull,"w")
+    results=OrderedDict()
+    try:
+        for name, setup in benchmarks.items():
+            if args.filter and args.filter not in name: continue
+            try:
+                run, numBytes = setup(workDir)
+            except Unavailable as e:
+                print("%-32s skipped (%s)" % (name,e))
+                continue
+            #Some functions print progress; keep that out of the console but in the measurement.
+            with contextlib.redirect_stdout(devnull):
+                seconds, loops = measure(run,args.minTime,args.repeat)
+            results[name]={"seconds":seconds,"bytes":numBytes,"mbps":numBytes/1048576/seconds,"loops":loops}
+            print("%-32s %10.3f ms %10.1f MB/s" % (name,seconds*1000,results[name]["mbps"]))
+    finally:
+        devnull.close()
+        mapped.closeFiles()
+        shutil.rmtree(workDir)
+
+    report={"python":sys.version,"platform":platform.platform(),"time":time.strftime("%Y-%m-%d %H:%M:%S"),"results":results}
+    if args.output:
+        f=open(args.output,"w")
+        json.dump(report,f,indent=1)
+        f.close()
+
+def compareResults(args):
+    f=open(args.base,"r")
+    base=json.load(f)["results"]
+    f.close()
+    f=open(args.new,"r")
+    new=json.load(f)["results"]
+    f.close()
+
+    regressions=list()
+    for name in base:
+        if name not in new:
+            print("%-32s missing" % name)
+            continue
+        change=(new[name]["mbps"]/base[name]["mbps"]-1)*100
+        flag=""
+        if change<-args.threshold:
+            flag=" REGRESSION"
+            regressions.append(name)
+        print("%-32s %10.1f -> %10.1f MB/s %+7.1f%%%s" % (name,base[name]["mbps"],new[name]["mbps"],change,flag))
+
+    if regressions:
+        print("%d benchmarks regressed by more than %.1f%%" % (len(regressions),args.threshold))
+        sys.exit(1)
+
+def main():
+    parser=argparse.ArgumentParser(description="Microbenchmarks for the parser and codec hot paths.")
+    commands=parser.add_subparsers(dest="command")
+    commands.required=True
+
+    run=commands.add_parser("run",help="run the benchmarks")
+    run.add_argument("--output",default=None,help="write the results to this JSON file")
+    run.add_argument("--filter",default=None,help="only run benchmarks whose name contains this")
+    run.add_argument("--repeat",type=int,default=5,help="measurements per benchmark, the best one is kept")
+    run.add_argument("--minTime",type=float,default=0.2,help="minimum seconds per measurement")
+
+    compare=commands.add_parser("compare",help="compare two result files")
+    compare.add_argument("base")
+    compare.add_argument("new")
+    compare.add_argument("--threshold",type=float,default=10.0,help="allowed throughput drop in percent")
+
+    args=parser.parse_args()
+    if args.command=="run": runBenchmarks(args)
+    else: compareResults(args)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,27 @@
+#Stand-in for xbdecompress.exe, for installs written by geninstall.py --x360. Their sb files are the X360 magic followed by a zlib stream.
+#Point xbdecompressCommand in the frostbite2 dumper at it: xbdecompressCommand = ["python",r"..\tools\xbstandin.py"]
+#
+#    python xbstandin.py [/options] compressed decompressed
+import sys
+import zlib
+
+magic=b"\x0F\xF5\x12\xED"
+
+def main(argv):
+    if len(argv)<2:
+        print("usage: xbstandin.py [/options] compressed decompressed")
+        return 1
+    src, dst = argv[-2:] #xbdecompress options like /T /Y come first and don't matter here
+    f=open(src,"rb")
+    data=f.read()
+    f.close()
+    if data[:4]!=magic:
+        print("%s is not a compressed X360 file" % src)
+        return 1
+    f=open(dst,"wb")
+    f.write(zlib.decompress(data[4:]))
+    f.close()
+    return 0
+
+if __name__=="__main__":
+    sys.exit(main(sys.argv[1:]))